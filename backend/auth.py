@@ -1,13 +1,16 @@
 import hmac
 import hashlib
 import json
+import time
 from urllib.parse import parse_qs, unquote
-from typing import Optional, Dict
-from fastapi import HTTPException, Security
+from typing import Optional, Dict, Tuple
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from database.shards import get_user_read_session
 from backend.config import BOT_TOKEN
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 def validate_telegram_webapp_data(init_data: str) -> Optional[Dict]:
@@ -78,6 +81,47 @@ def validate_telegram_webapp_data(init_data: str) -> Optional[Dict]:
         return None
 
 
+def authenticate_init_data(init_data: Optional[str]) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Validate initData and its age.
+    
+    Returns:
+        Tuple of (user_data, error_message)
+    """
+    user_data = validate_telegram_webapp_data(init_data) if init_data else None
+    
+    if not user_data:
+        return None, "Invalid authentication credentials"
+    
+    # Check if auth_date is not too old (e.g., 24 hours)
+    current_time = int(time.time())
+    if current_time - user_data['auth_date'] > 86400:  # 24 hours
+        return None, "Authentication expired"
+    
+    return user_data, None
+
+
+_SCOPE_USER_ID = "nanocoin.user_id"
+
+
+def authenticated_user_id(scope) -> Optional[int]:
+    """
+    The user id of a request's valid Bearer initData, or None, for ASGI
+    middleware that runs before the route's dependencies. The check needs no
+    database and is done once per request (the result is kept in the scope).
+    """
+    if _SCOPE_USER_ID not in scope:
+        user_data = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, init_data = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer":
+                    user_data, _ = authenticate_init_data(init_data)
+                break
+        scope[_SCOPE_USER_ID] = user_data['user_id'] if user_data else None
+    return scope[_SCOPE_USER_ID]
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> Dict:
     """
     FastAPI dependency to get current authenticated user from Telegram Web App.
@@ -88,30 +132,18 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Security(securi
             user_id = user['user_id']
             ...
     """
-    token = credentials.credentials
-    
-    # Validate Telegram initData
-    user_data = validate_telegram_webapp_data(token)
-    
-    if not user_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid authentication credentials"
-        )
+    user_data, error = authenticate_init_data(credentials.credentials)
     
-    # Check if auth_date is not too old (e.g., 24 hours)
-    import time
-    current_time = int(time.time())
-    if current_time - user_data['auth_date'] > 86400:  # 24 hours
+    if error:
         raise HTTPException(
             status_code=401,
-            detail="Authentication expired"
+            detail=error
         )
     
     return user_data
 
 
-def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Security(security, auto_error=False)) -> Optional[Dict]:
+def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Security(optional_security)) -> Optional[Dict]:
     """
     Optional authentication - returns None if no credentials provided.
     """
@@ -124,6 +156,18 @@ def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials
         return None
 
 
+def get_player_read_db(user: Dict = Depends(get_current_user)):
+    """
+    FastAPI dependency: a read-only session on the authenticated player's shard
+    (the main database unless sharded), closed when the response is done.
+    """
+    session = get_user_read_session(user['user_id'])
+    try:
+        yield session
+    finally:
+        session.close()
+
+
 def is_admin(user: Dict) -> bool:
     """Check if user is admin."""
     from backend.config import ADMIN_IDS
@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import orjson
+from fastapi import Request, Response
+from database.connection import ReadSessionLocal
+from utils.settings_store import CATALOG_VERSION_KEY, read_version
+from backend.config import CATALOG_VERSION_CHECK_SECONDS
+from backend import payloads
+
+logger = logging.getLogger(__name__)
+
+
+class EncodedPayload:
+    """A response body encoded once, gzipped once, with a strong ETag per encoding."""
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag")
+
+    def __init__(self, content: Any, version: int):
+        self.body = orjson.dumps(content)
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"c{version}-{digest}"'
+        self.gzip_etag = f'"c{version}-{digest}-gz"'
+
+    def matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        return self.etag in tags or self.gzip_etag in tags
+
+
+class CatalogCache:
+    """
+    Slow-changing responses served from memory as pre-encoded bytes.
+
+    Payloads are built on first use and kept until the catalog version changes.
+    Every change to shop items, achievements or join requirements bumps that
+    version with bump_catalog_version. The version row is read at most every
+    `check_interval` seconds, so a conditional request inside that window is
+    answered with 304 without touching the database.
+    """
+
+    def __init__(self, check_interval: float = CATALOG_VERSION_CHECK_SECONDS):
+        self._builders: Dict[str, Callable] = {}
+        self._payloads: Dict[str, EncodedPayload] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+
+    def register(self, name: str, builder: Callable):
+        """`builder(session)` returns the JSON-ready content for `name`."""
+        self._builders[name] = builder
+
+    def invalidate(self):
+        with self._lock:
+            self._payloads.clear()
+            self._checked_at = 0.0
+
+    def get(self, name: str) -> EncodedPayload:
+        self._ensure_fresh()
+        payload = self._payloads.get(name)
+        if payload is not None:
+            return payload
+
+        with self._lock:
+            payload = self._payloads.get(name)
+            if payload is None:
+                session = ReadSessionLocal()
+                try:
+                    payload = EncodedPayload(self._builders[name](session), self._version or 0)
+                finally:
+                    session.close()
+                self._payloads[name] = payload
+        return payload
+
+    def response(self, request: Request, name: str) -> Response:
+        """200 with the cached bytes (gzipped if accepted), or 304 if the client's copy is current."""
+        payload = self.get(name)
+        use_gzip = (
+            "gzip" in request.headers.get("accept-encoding", "")
+            and len(payload.gzip_body) < len(payload.body)
+        )
+        headers = {
+            "ETag": payload.gzip_etag if use_gzip else payload.etag,
+            "Cache-Control": "no-cache",  # always revalidate; a 304 costs no DB work
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and payload.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(payload.gzip_body, media_type="application/json", headers=headers)
+        return Response(payload.body, media_type="application/json", headers=headers)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self._check_interval:
+            return
+
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self._check_interval:
+                return
+            session = ReadSessionLocal()
+            try:
+                version = read_version(session, CATALOG_VERSION_KEY)
+            except Exception as e:
+                logger.error(f"Error checking catalog version: {e}")
+                if self._version is None:
+                    raise
+                self._checked_at = now
+                return
+            finally:
+                session.close()
+
+            self._checked_at = now
+            if version != self._version:
+                if self._version is not None:
+                    logger.info(f"Catalog version {self._version} -> {version}, rebuilding cached responses")
+                self._payloads.clear()
+                self._version = version
+
+
+catalog_cache = CatalogCache()
+catalog_cache.register("shop_items", payloads.shop_items)
+catalog_cache.register("achievements", payloads.achievements)
+catalog_cache.register("join_requirements", payloads.join_requirements)
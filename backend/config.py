@@ -14,9 +14,36 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///nanocoin.db")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+API_RELOAD = os.getenv("API_RELOAD", "false").lower() == "true"
 
 # Web App URL
 WEBAPP_URL = os.getenv("WEBAPP_URL", "http://localhost:8000/webapp")
+# Serve webapp/ as minified, content-hashed bundles (false = the raw files, for development)
+WEBAPP_BUNDLE = os.getenv("WEBAPP_BUNDLE", "true").lower() == "true"
+
+# Telegram bot webhook mode (bot served from the backend process)
+BOT_WEBHOOK_MODE = os.getenv("BOT_WEBHOOK_MODE", "false").lower() == "true"
+BOT_APPLICATION_FACTORY = os.getenv("BOT_APPLICATION_FACTORY", "bot.main:build_application")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public base URL Telegram posts to; empty = don't register
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+
+# Metrics (/metrics); when set, scrapers must send "Authorization: Bearer <token>",
+# when empty only clients on this host (no proxy headers) are answered
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Catalog responses (shop items, achievements, join requirements) are cached
+# in memory; the shared catalog version is re-read at most this often (seconds)
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "5"))
+
+# Game WebSocket (/api/game/ws): seconds a client has to send its auth message,
+# and the most taps one message may carry
+WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+WS_MAX_TAPS_PER_MESSAGE = int(os.getenv("WS_MAX_TAPS_PER_MESSAGE", "50"))
+
+# /api/user/sync remembers the last state it sent to this many players,
+# so the next sync can return just the fields that changed since then
+SYNC_SNAPSHOT_CACHE_SIZE = int(os.getenv("SYNC_SNAPSHOT_CACHE_SIZE", "10000"))
 
 # Security
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
@@ -49,9 +76,16 @@ XP_PER_CLICK = 1
 XP_PER_LEVEL_BASE = 100
 XP_MULTIPLIER = 1.2
 
-# Rate Limiting
-RATE_LIMIT_CLICKS_PER_SECOND = 10
-RATE_LIMIT_API_CALLS_PER_MINUTE = 60
+# Rate Limiting (per user, per process; see backend/rate_limit.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_CLICKS_PER_SECOND = float(os.getenv("RATE_LIMIT_CLICKS_PER_SECOND", "10"))
+RATE_LIMIT_API_CALLS_PER_MINUTE = float(os.getenv("RATE_LIMIT_API_CALLS_PER_MINUTE", "60"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "300"))  # idle buckets are dropped after this
+
+# POSTs with an Idempotency-Key: how long a response is kept for replay, and how many are kept
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "50000"))
 
 # Strings (Farsi)
 MSG_START = "به نانوکوین خوش آمدید! 🚀\nیک بازی مهیج برای استخراج و جمع‌آوری سکه و الماس."
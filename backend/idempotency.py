@@ -0,0 +1,189 @@
+"""
+Idempotency-Key support for POST requests.
+
+A client that may retry a POST sends an `Idempotency-Key` header (a fresh random
+value per action, reused on every retry of it). The first request with a key
+runs normally and its response is kept for IDEMPOTENCY_TTL_SECONDS. Any repeat
+of that key by the same caller on the same route gets the stored response back
+with `Idempotent-Replayed: true`, and the route doesn't run again. A repeat that
+arrives while the first is still running waits for it.
+
+Entries are scoped by the user id of the request's verified initData, so only
+the player who made the request can replay it, also after their initData is
+refreshed; requests without valid initData are passed through (and rejected
+by the route). A digest of the query string and body is stored with the
+response, and a repeat of the key with different ones gets 422 instead of the
+stored result.
+Server errors and 429s are not stored, because the action didn't happen. The store is per process, bounded to
+IDEMPOTENCY_MAX_ENTRIES; the oldest entries go first.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from fastapi.responses import ORJSONResponse
+from backend.auth import authenticated_user_id
+from backend.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES
+from utils.metrics import registry
+
+IDEMPOTENCY_REQUESTS = registry.counter(
+    "idempotency_requests_total", "POST requests carrying an Idempotency-Key, by outcome.", ("outcome",)
+)
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+MAX_KEY_LENGTH = 255
+
+Key = Tuple[int, str, bytes]
+
+
+class StoredResponse(NamedTuple):
+    expires_at: float
+    request_digest: bytes
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyStore:
+    """Responses by (user id, path, key), oldest first. Used from the event loop only."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._responses: "OrderedDict[Key, StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[Key, asyncio.Event] = {}
+
+    def pending(self, key: Key) -> Optional[asyncio.Event]:
+        """Set when the request currently running with this key finishes."""
+        return self._in_flight.get(key)
+
+    def begin(self, key: Key) -> asyncio.Event:
+        event = self._in_flight[key] = asyncio.Event()
+        return event
+
+    def finish(self, key: Key):
+        self._in_flight.pop(key).set()
+
+    def get(self, key: Key) -> Optional[StoredResponse]:
+        self._expire()
+        return self._responses.get(key)
+
+    def put(self, key: Key, request_digest: bytes, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self._responses[key] = StoredResponse(time.monotonic() + self.ttl, request_digest, status, headers, body)
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._responses:
+            oldest = next(iter(self._responses.values()))
+            if oldest.expires_at > now:
+                break
+            self._responses.popitem(last=False)
+
+    def __len__(self):
+        return len(self._responses)
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+async def _read_body(receive) -> Tuple[bytes, list]:
+    """The whole request body, and the messages it came in, to be passed on to the app."""
+    messages = []
+    chunks = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks), messages
+
+
+class IdempotencyMiddleware:
+    """Replay stored responses for repeated POSTs under `prefix` that carry an Idempotency-Key."""
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None, prefix: str = "/api/"):
+        self.app = app
+        self.store = store or idempotency_store
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        raw_key = _header(scope, HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            response = ORJSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        user_id = authenticated_user_id(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+        key = (user_id, scope["path"], raw_key)
+
+        body, messages = await _read_body(receive)
+        request_digest = hashlib.sha256(scope["query_string"] + b"\0" + body).digest()
+
+        async def replay_receive():
+            return messages.pop(0) if messages else await receive()
+
+        pending = self.store.pending(key)
+        while pending is not None:
+            IDEMPOTENCY_REQUESTS.inc(("waited",))
+            await pending.wait()
+            pending = self.store.pending(key)
+
+        stored = self.store.get(key)
+        if stored is not None and stored.request_digest != request_digest:
+            IDEMPOTENCY_REQUESTS.inc(("mismatched",))
+            response = ORJSONResponse(
+                {"detail": "Idempotency-Key was already used with different request parameters or body"}, status_code=422
+            )
+            await response(scope, receive, send)
+            return
+        if stored is not None:
+            IDEMPOTENCY_REQUESTS.inc(("replayed",))
+            await send({"type": "http.response.start", "status": stored.status,
+                        "headers": stored.headers + [REPLAYED_HEADER]})
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        IDEMPOTENCY_REQUESTS.inc(("executed",))
+        self.store.begin(key)
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+            if status < 500 and status != 429:
+                self.store.put(key, request_digest, status, headers, b"".join(chunks))
+        finally:
+            self.store.finish(key)
+
+
+idempotency_store = IdempotencyStore()
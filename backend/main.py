@@ -2,11 +2,15 @@ import logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from contextlib import asynccontextmanager
-from backend.config import API_HOST, API_PORT
+from backend.config import API_HOST, API_PORT, API_RELOAD, BOT_WEBHOOK_MODE, WEBAPP_BUNDLE
 from database.connection import init_db
-from backend.routers import user, game, shop
+from backend.metrics import MetricsMiddleware
+from backend.rate_limit import RateLimitMiddleware
+from backend.idempotency import IdempotencyMiddleware
+from backend.routers import user, game, shop, bootstrap, telegram, metrics, webapp
+from backend.static_assets import webapp_bundle
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +26,20 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Initializing database...")
     init_db()
+    if WEBAPP_BUNDLE:
+        webapp_bundle.build()
+    if BOT_WEBHOOK_MODE:
+        from bot.webhook import start_webhook_application
+        await start_webhook_application()
+        logger.info("Telegram bot running in webhook mode")
     logger.info("Backend API started")
     
     yield
     
     # Shutdown
+    if BOT_WEBHOOK_MODE:
+        from bot.webhook import stop_webhook_application
+        await stop_webhook_application()
     logger.info("Backend API shutdown")
 
 
@@ -35,10 +48,22 @@ app = FastAPI(
     title="NanoCoin Game API",
     description="Backend API for NanoCoin Telegram Web App Game",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# CORS middleware
+# Middleware added later wraps the earlier ones.
+
+# Per-user API budget, checked before any DB work. Clicks have their own
+# per-second budget (rate_limit("click") on the route).
+app.add_middleware(RateLimitMiddleware, exempt_paths=("/api/game/click",))
+
+# Retried POSTs with the same Idempotency-Key get the first response back instead of
+# running again (outside the rate limiter, so a replay doesn't spend a token)
+app.add_middleware(IdempotencyMiddleware)
+
+# CORS middleware (outside the limiter: preflights are answered here, and 429s
+# and replayed responses get CORS headers too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify your webapp domain
@@ -47,10 +72,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, status codes and DB work (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(user.router)
 app.include_router(game.router)
 app.include_router(shop.router)
+app.include_router(bootstrap.router)
+app.include_router(telegram.router)
+app.include_router(metrics.router)
+
+# Web app: bundled index.html and hashed assets first; the mount serves anything else
+if WEBAPP_BUNDLE:
+    app.include_router(webapp.router)
 
 # Mount static files for webapp
 app.mount("/webapp", StaticFiles(directory="webapp", html=True), name="webapp")
@@ -78,5 +113,5 @@ if __name__ == "__main__":
         "backend.main:app",
         host=API_HOST,
         port=API_PORT,
-        reload=True
+        reload=API_RELOAD
     )
@@ -0,0 +1,100 @@
+import time
+from starlette.routing import Match
+from database.metrics import RequestDBStats, request_db_stats
+from utils.metrics import registry
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "SQL statements per HTTP request.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+HTTP_REQUEST_DB_DURATION = registry.histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per HTTP request.", ("method", "route")
+)
+
+WS_CONNECTIONS = registry.gauge("ws_game_connections", "Open game WebSocket sessions.")
+WS_MESSAGES = registry.counter(
+    "ws_game_messages_total", "Game WebSocket messages by type and result.", ("type", "result")
+)
+WS_MESSAGE_DURATION = registry.histogram(
+    "ws_game_message_duration_seconds", "Time to handle a game WebSocket message.", ("type",)
+)
+
+UNMATCHED_ROUTE = "unmatched"
+_MAX_CACHED_PATHS = 1024
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status code and DB work per route template.
+
+    Plain ASGI so it adds no per-request task or body buffering. Requests are
+    labelled with the route's path template (``/api/shop/sell/{inventory_id}``),
+    never the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_cache = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        db_stats = RequestDBStats(f"{method} {route}")
+        token = request_db_stats.set(db_stats)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            request_db_stats.reset(token)
+
+            labels = (method, route)
+            HTTP_REQUESTS.inc((method, route, str(status_code)))
+            HTTP_REQUEST_DURATION.observe(elapsed, labels)
+            HTTP_REQUEST_DB_QUERIES.observe(db_stats.queries, labels)
+            HTTP_REQUEST_DB_DURATION.observe(db_stats.seconds, labels)
+
+    def _route_template(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._route_cache.get(key)
+        if template is not None:
+            return template
+
+        template = UNMATCHED_ROUTE
+        partial = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path  # right path, wrong method (405)
+        else:
+            if partial is not None:
+                template = partial
+
+        if len(self._route_cache) >= _MAX_CACHED_PATHS:
+            self._route_cache.clear()
+        self._route_cache[key] = template
+        return template
@@ -0,0 +1,160 @@
+"""
+Response payloads for the read-heavy endpoints, built straight from column tuples.
+
+Routes that use these still declare their response_model (for the OpenAPI docs),
+but they return an ORJSONResponse. FastAPI passes a returned Response through
+untouched, so no ORM objects are loaded and nothing is validated a second time.
+The statements are built once with bind parameters, so a request only executes
+them. The selected columns come from the schemas' own field lists, so the
+payloads keep the documented shape.
+"""
+from operator import itemgetter
+from typing import Dict, List, Optional
+from sqlalchemy import select, bindparam
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database.executor import run_user_db
+from database.shards import scatter, merge_top
+from database.models import User, GameItem, Inventory, Achievement, UserQuest
+from database.admin_models import JoinRequirement
+from backend.schemas.game import AchievementSchema, QuestSchema
+from backend.schemas.shop import GameItemSchema, InventoryRowSchema
+from backend.schemas.user import UserProfile, LeaderboardEntry, JoinRequirementSchema
+
+GAME_ITEM_FIELDS = tuple(GameItemSchema.model_fields)
+GAME_ITEM_COLUMNS = tuple(getattr(GameItem, name) for name in GAME_ITEM_FIELDS)
+INVENTORY_FIELDS = tuple(InventoryRowSchema.model_fields)
+INVENTORY_COLUMNS = tuple(getattr(Inventory, name) for name in INVENTORY_FIELDS)
+PROFILE_COLUMNS = tuple(getattr(User, name) for name in UserProfile.model_fields)
+LEADERBOARD_COLUMNS = tuple(getattr(User, name) for name in LeaderboardEntry.model_fields if name != "rank")
+# The live game state a client keeps in sync (also what the game socket sends as deltas)
+SYNC_FIELDS = (
+    "coins", "diamonds", "energy", "max_energy", "electricity", "max_electricity",
+    "click_level", "click_xp", "boost_multiplier", "active_boost_until",
+)
+SYNC_COLUMNS = tuple(getattr(User, name) for name in SYNC_FIELDS) + (User.state_version,)
+
+SHOP_ITEMS_QUERY = select(*GAME_ITEM_COLUMNS)
+LEADERBOARD_QUERY = select(*LEADERBOARD_COLUMNS).order_by(User.coins.desc()).limit(bindparam("limit"))
+PROFILE_QUERY = select(*PROFILE_COLUMNS).where(User.user_id == bindparam("user_id"))
+SYNC_QUERY = select(*SYNC_COLUMNS).where(User.user_id == bindparam("user_id"))
+STATE_VERSION_QUERY = select(User.state_version).where(User.user_id == bindparam("user_id"))
+ACHIEVEMENTS_QUERY = select(
+    *(getattr(Achievement, name) for name in AchievementSchema.model_fields)
+).order_by(Achievement.id)
+JOIN_REQUIREMENTS_QUERY = select(
+    *(getattr(JoinRequirement, name) for name in JoinRequirementSchema.model_fields)
+).where(JoinRequirement.is_active == True).order_by(JoinRequirement.id)
+QUESTS_QUERY = select(
+    *(getattr(UserQuest, name) for name in QuestSchema.model_fields)
+).where(UserQuest.user_id == bindparam("user_id")).order_by(UserQuest.id)
+INVENTORY_QUERY = (
+    select(*INVENTORY_COLUMNS, *GAME_ITEM_COLUMNS)
+    .join(GameItem, GameItem.id == Inventory.item_id)
+    .where(Inventory.user_id == bindparam("user_id"))
+    .order_by(Inventory.id)
+)
+
+
+def game_item_payload(values) -> Dict:
+    """A GameItemSchema-shaped dict from GAME_ITEM_COLUMNS values."""
+    payload = dict(zip(GAME_ITEM_FIELDS, values))
+    payload["item_type"] = payload["item_type"].value
+    return payload
+
+
+def shop_items(session: Session) -> List[Dict]:
+    """Every shop item, shaped like GameItemSchema."""
+    return [game_item_payload(row) for row in session.execute(SHOP_ITEMS_QUERY)]
+
+
+def achievements(session: Session) -> List[Dict]:
+    """Achievement definitions, shaped like AchievementSchema."""
+    return [row._asdict() for row in session.execute(ACHIEVEMENTS_QUERY)]
+
+
+def join_requirements(session: Session) -> List[Dict]:
+    """Active join requirements, shaped like JoinRequirementSchema."""
+    return [row._asdict() for row in session.execute(JOIN_REQUIREMENTS_QUERY)]
+
+
+def inventory(session: Session, user_id: int) -> Dict:
+    """
+    The player's inventory shaped like InventoryResponse, in one joined query.
+
+    Rows carry only an item_id; each distinct item is sent once in `items`.
+    Keys are strings because JSON object keys are.
+    """
+    split = len(INVENTORY_FIELDS)
+    rows = []
+    items = {}
+    for row in session.execute(INVENTORY_QUERY, {"user_id": user_id}):
+        entry = dict(zip(INVENTORY_FIELDS, row[:split]))
+        rows.append(entry)
+        key = str(entry["item_id"])
+        if key not in items:
+            items[key] = game_item_payload(row[split:])
+    return {"items": items, "inventory": rows}
+
+
+def leaderboard(session: Session, limit: int) -> List[Dict]:
+    """Top players by coins, shaped like LeaderboardEntry."""
+    rows = session.execute(LEADERBOARD_QUERY, {"limit": limit})
+    return [dict(row._asdict(), rank=rank) for rank, row in enumerate(rows, start=1)]
+
+
+def global_leaderboard(limit: int) -> List[Dict]:
+    """leaderboard() over every shard (database/shards.py), merged and ranked again."""
+    rows = merge_top(scatter(leaderboard, limit), key=itemgetter("coins"), limit=limit)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+
+def user_profile(session: Session, user_id: int) -> Optional[Dict]:
+    """The player's profile shaped like UserProfile, or None if they don't exist yet."""
+    row = session.execute(PROFILE_QUERY, {"user_id": user_id}).first()
+    return row._asdict() if row else None
+
+
+def register_user(session: Session, auth_user: Dict):
+    """Unit of work (run_user_db): add the authenticated player unless they already exist."""
+    if session.get(User, auth_user['user_id']) is None:
+        session.add(User(
+            user_id=auth_user['user_id'],
+            username=auth_user.get('username'),
+            first_name=auth_user.get('first_name')
+        ))
+
+
+async def get_or_create_profile(session: Session, auth_user: Dict) -> Dict:
+    """
+    The profile of the authenticated player, read on `session` (which may be
+    read-only), registering them through run_user_db on their first visit.
+    """
+    profile = await run_in_threadpool(user_profile, session, auth_user['user_id'])
+    if not profile:
+        await run_user_db(auth_user['user_id'], register_user, auth_user)
+        profile = await run_in_threadpool(user_profile, session, auth_user['user_id'])
+    return profile
+
+
+def quests(session: Session, user_id: int) -> List[Dict]:
+    """The player's quests, shaped like QuestSchema."""
+    payload = []
+    for row in session.execute(QUESTS_QUERY, {"user_id": user_id}):
+        quest = row._asdict()
+        quest["quest_type"] = row.quest_type.value
+        payload.append(quest)
+    return payload
+
+
+def user_sync(session: Session, user_id: int) -> Optional[Dict]:
+    """SYNC_FIELDS plus state_version, or None if the player doesn't exist."""
+    row = session.execute(SYNC_QUERY, {"user_id": user_id}).first()
+    return row._asdict() if row else None
+
+
+def state_version(session: Session, user_id: int) -> Optional[int]:
+    """Just the player's state_version: one integer by primary key."""
+    return session.execute(STATE_VERSION_QUERY, {"user_id": user_id}).scalar()
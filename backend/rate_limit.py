@@ -0,0 +1,206 @@
+"""
+Per-user token buckets for the API and the game socket.
+
+Every /api/ request takes a token from the caller's "api" bucket in
+RateLimitMiddleware, before any database work: the bucket of the user whose
+initData signature checks out, or of the client address otherwise, so nobody
+can spend another player's budget. A rejected request is answered with 429 and
+Retry-After right there. CORS preflights (OPTIONS) are not counted. Routes with a budget
+of their own (clicks) are exempt from the middleware and check their bucket with
+the `rate_limit(rule)` dependency, keyed by the authenticated user.
+
+Buckets live in a sharded in-memory table. Each shard has its own lock, and a
+shard drops buckets that have been idle long enough to be full again, since a
+full bucket and a missing one behave the same. Limits are per process.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+from fastapi import Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from backend.auth import get_current_user, authenticated_user_id
+from backend.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_CLICKS_PER_SECOND, RATE_LIMIT_API_CALLS_PER_MINUTE,
+    RATE_LIMIT_SHARDS, RATE_LIMIT_IDLE_SECONDS
+)
+from utils.metrics import registry
+
+RATE_LIMIT_DECISIONS = registry.counter(
+    "rate_limit_decisions_total", "Rate limiter decisions by rule.", ("rule", "result")
+)
+RATE_LIMIT_BUCKETS = registry.gauge("rate_limit_buckets", "Token buckets currently held in memory.")
+
+TOO_MANY_REQUESTS = "Too many requests"
+
+
+class Rule(NamedTuple):
+    rate: float   # tokens added per second
+    burst: float  # bucket size
+
+
+RULES = {
+    "click": Rule(RATE_LIMIT_CLICKS_PER_SECOND, RATE_LIMIT_CLICKS_PER_SECOND),
+    "api": Rule(RATE_LIMIT_API_CALLS_PER_MINUTE / 60.0, RATE_LIMIT_API_CALLS_PER_MINUTE),
+}
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "swept_at")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: Dict[Tuple[str, Any], _Bucket] = {}
+        self.swept_at = time.monotonic()
+
+
+class RateLimiter:
+    """Token buckets keyed by (rule, key), e.g. ("click", user_id)."""
+
+    def __init__(self, rules: Dict[str, Rule] = RULES, shards: int = RATE_LIMIT_SHARDS,
+                 idle_seconds: float = RATE_LIMIT_IDLE_SECONDS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.rules = rules
+        self.enabled = enabled
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._idle_seconds = idle_seconds
+        self._counts = {name: [0, 0] for name in rules}  # rule -> [allowed, rejected]
+        self._counts_lock = threading.Lock()
+
+    def take(self, rule: str, key: Any, cost: int = 1, partial: bool = False) -> Tuple[int, float]:
+        """
+        Take `cost` tokens; returns (tokens granted, seconds until one more is available).
+
+        All or nothing unless `partial`, which grants as many whole tokens as the
+        bucket holds.
+        """
+        if not self.enabled:
+            return cost, 0.0
+
+        rate, burst = self.rules[rule]
+        now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            if now - shard.swept_at > self._idle_seconds:
+                self._sweep(shard, now)
+            bucket = shard.buckets.get((rule, key))
+            if bucket is None:
+                bucket = shard.buckets[(rule, key)] = _Bucket(burst, now)
+                RATE_LIMIT_BUCKETS.inc()
+            else:
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+                bucket.updated_at = now
+
+            granted = cost if bucket.tokens >= cost else (int(bucket.tokens) if partial else 0)
+            bucket.tokens -= granted
+            retry_after = 0.0 if bucket.tokens >= 1 else (1 - bucket.tokens) / rate
+
+        counts = self._counts[rule]
+        with self._counts_lock:
+            counts[0] += granted
+            counts[1] += cost - granted
+        if granted:
+            RATE_LIMIT_DECISIONS.inc((rule, "allowed"), granted)
+        if granted < cost:
+            RATE_LIMIT_DECISIONS.inc((rule, "rejected"), cost - granted)
+        return granted, retry_after
+
+    def allow(self, rule: str, key: Any) -> Optional[float]:
+        """None if allowed, otherwise seconds to wait before retrying."""
+        granted, retry_after = self.take(rule, key)
+        return None if granted else retry_after
+
+    def _sweep(self, shard: _Shard, now: float):
+        idle = [key for key, bucket in shard.buckets.items() if now - bucket.updated_at > self._idle_seconds]
+        for key in idle:
+            del shard.buckets[key]
+        shard.swept_at = now
+        if idle:
+            RATE_LIMIT_BUCKETS.dec(amount=len(idle))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "buckets": sum(len(shard.buckets) for shard in self._shards),
+            "rules": {
+                name: {
+                    "rate_per_second": rule.rate,
+                    "burst": rule.burst,
+                    "allowed": self._counts[name][0],
+                    "rejected": self._counts[name][1],
+                }
+                for name, rule in self.rules.items()
+            },
+        }
+
+
+def too_many_requests(retry_after: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, round(retry_after)))}
+
+
+def client_key(scope) -> Any:
+    """
+    The Telegram user id from verified initData (an HMAC check, no database), or
+    the client address when there is none or it doesn't verify.
+    """
+    user_id = authenticated_user_id(scope)
+    if user_id is not None:
+        return user_id
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RateLimitMiddleware:
+    """Apply `rule` per caller to every request under `prefix`, except `exempt_paths`."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, rule: str = "api",
+                 prefix: str = "/api/", exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+        self.rule = rule
+        self.prefix = prefix
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or not self.limiter.enabled
+            or not scope["path"].startswith(self.prefix)
+            or scope["path"] in self.exempt_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = self.limiter.allow(self.rule, client_key(scope))
+        if retry_after is None:
+            await self.app(scope, receive, send)
+            return
+        response = ORJSONResponse(
+            {"detail": TOO_MANY_REQUESTS}, status_code=429, headers=too_many_requests(retry_after)
+        )
+        await response(scope, receive, send)
+
+
+def rate_limit(rule: str):
+    """
+    Dependency: the authenticated user, after taking a token from their `rule` bucket.
+
+        async def click(user: Dict = Depends(rate_limit("click")), ...)
+    """
+    def check(user: Dict = Depends(get_current_user)) -> Dict:
+        retry_after = rate_limiter.allow(rule, user['user_id'])
+        if retry_after is not None:
+            raise HTTPException(status_code=429, detail=TOO_MANY_REQUESTS, headers=too_many_requests(retry_after))
+        return user
+
+    return check
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,45 @@
+import asyncio
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Dict
+import orjson
+from backend.auth import get_current_user, get_player_read_db
+from backend import payloads
+from backend.catalog_cache import catalog_cache
+from backend.schemas.bootstrap import BootstrapResponse
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+
+def _player_sections(session: Session, user: Dict, leaderboard_limit: int) -> Dict:
+    """Inventory and quests on the request's session, then the leaderboard over all players."""
+    user_id = user['user_id']
+    return {
+        "inventory": payloads.inventory(session, user_id),
+        "quests": payloads.quests(session, user_id),
+        "leaderboard": payloads.global_leaderboard(leaderboard_limit),
+    }
+
+
+@router.get("/bootstrap", response_model=BootstrapResponse)
+async def bootstrap(
+    leaderboard_limit: int = Query(10, ge=1, le=100),
+    user: Dict = Depends(get_current_user),
+    session: Session = Depends(get_player_read_db)
+):
+    """
+    Everything the web app needs on open, in one round trip.
+
+    The player's sections share one read-only session on their shard; the profile comes first,
+    since a new player is registered there. The shop catalog comes from the
+    catalog cache at the same time and is spliced in as already-encoded bytes.
+    """
+    profile = await payloads.get_or_create_profile(session, user)
+    sections, shop_items = await asyncio.gather(
+        run_in_threadpool(_player_sections, session, user, leaderboard_limit),
+        run_in_threadpool(catalog_cache.get, "shop_items"),
+    )
+    sections = {"profile": profile, **sections, "shop_items_etag": shop_items.etag}
+    body = orjson.dumps(sections)
+    return Response(body[:-1] + b',"shop_items":' + shop_items.body + b'}', media_type="application/json")
@@ -1,34 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket
 from sqlalchemy.orm import Session
-from typing import Dict
-from database.connection import get_session
+from typing import Callable, Dict, List, Optional, Tuple
+from database.executor import run_user_db
 from database.models import User
 from backend.auth import get_current_user
+from backend.rate_limit import rate_limit
 from backend.services.game_service import GameService
-from backend.schemas.game import ClickResponse, MineResponse, RefillEnergyRequest, ActivateBoostRequest
+from backend.services.game_session import serve_game_socket
+from backend.schemas.game import (
+    ClickResponse, MineResponse, RefillEnergyRequest, ActivateBoostRequest, AchievementSchema
+)
+from backend.catalog_cache import catalog_cache
 
 router = APIRouter(prefix="/api/game", tags=["game"])
 
 
-@router.post("/click", response_model=ClickResponse)
-async def click(
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
-    """Process a click action."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
+USER_NOT_FOUND = "User not found"
+
+
+def _player_action(session: Session, user_id: int, action: Callable, *args) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Unit of work: `action(db_user, session, *args)` for the player.
+
+    The action returns (result, error); on an error its changes are rolled back.
+    """
+    db_user = session.get(User, user_id)
     
     if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
+        return None, USER_NOT_FOUND
+    
+    result, error = action(db_user, session, *args)
     
-    result, error = GameService.process_click(db_user, session)
+    if error:
+        session.rollback()
+        return None, error
+    
+    return result, None
+
+
+async def _run_player_action(user_id: int, action: Callable, *args) -> Dict:
+    result, error = await run_user_db(user_id, _player_action, user_id, action, *args)
+    
+    if error == USER_NOT_FOUND:
+        raise HTTPException(status_code=404, detail=error)
     
     if error:
         raise HTTPException(status_code=400, detail=error)
     
-    session.commit()
+    return result
+
+
+def _refill(db_user: User, session: Session, amount: int):
+    success, error = GameService.refill_energy(db_user, amount)
+    return {"new_energy": db_user.energy, "new_diamonds": db_user.diamonds}, error
+
+
+def _boost(db_user: User, session: Session, duration_minutes: int):
+    success, error = GameService.activate_boost(db_user, duration_minutes)
+    return {"active_until": db_user.active_boost_until, "new_diamonds": db_user.diamonds}, error
+
+
+@router.post("/click", response_model=ClickResponse)
+async def click(user: Dict = Depends(rate_limit("click"))):
+    """Process a click action."""
+    result = await _run_player_action(user['user_id'], GameService.process_click)
     
     return ClickResponse(
         success=True,
@@ -37,24 +72,9 @@ async def click(
 
 
 @router.post("/mine", response_model=MineResponse)
-async def mine(
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
+async def mine(user: Dict = Depends(get_current_user)):
     """Claim mining rewards."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    result, error = GameService.claim_mining_rewards(db_user, session)
-    
-    if error:
-        raise HTTPException(status_code=400, detail=error)
-    
-    session.commit()
+    result = await _run_player_action(user['user_id'], GameService.claim_mining_rewards)
     
     return MineResponse(
         success=True,
@@ -65,80 +85,49 @@ async def mine(
 @router.post("/refill-energy")
 async def refill_energy(
     request: RefillEnergyRequest,
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    user: Dict = Depends(get_current_user)
 ):
     """Refill energy using diamonds."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    success, error = GameService.refill_energy(db_user, request.amount)
-    
-    if error:
-        raise HTTPException(status_code=400, detail=error)
-    
-    session.commit()
+    result = await _run_player_action(user['user_id'], _refill, request.amount)
     
     return {
         "success": True,
-        "new_energy": db_user.energy,
-        "new_diamonds": db_user.diamonds
+        **result
     }
 
 
 @router.post("/activate-boost")
 async def activate_boost(
     request: ActivateBoostRequest,
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    user: Dict = Depends(get_current_user)
 ):
     """Activate click boost."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    success, error = GameService.activate_boost(db_user, request.duration_minutes)
-    
-    if error:
-        raise HTTPException(status_code=400, detail=error)
-    
-    session.commit()
+    result = await _run_player_action(user['user_id'], _boost, request.duration_minutes)
     
     return {
         "success": True,
-        "active_until": db_user.active_boost_until,
-        "new_diamonds": db_user.diamonds
+        **result
     }
 
 
 @router.post("/daily-reward")
-async def claim_daily_reward(
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
+async def claim_daily_reward(user: Dict = Depends(get_current_user)):
     """Claim daily reward."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    result, error = GameService.claim_daily_reward(db_user, session)
-    
-    if error:
-        raise HTTPException(status_code=400, detail=error)
-    
-    session.commit()
+    result = await _run_player_action(user['user_id'], GameService.claim_daily_reward)
     
     return {
         "success": True,
         **result
     }
+
+
+@router.get("/achievements", response_model=List[AchievementSchema])
+async def get_achievements(request: Request):
+    """Achievement definitions (ETag / If-None-Match aware)."""
+    return catalog_cache.response(request, "achievements")
+
+
+@router.websocket("/ws")
+async def game_socket(websocket: WebSocket):
+    """Taps and game actions over one connection; state changes are pushed back as deltas."""
+    await serve_game_socket(websocket)
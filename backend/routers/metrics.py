@@ -0,0 +1,58 @@
+import hmac
+import ipaddress
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response
+from backend.config import METRICS_TOKEN
+from database.query_log import query_log
+from backend.rate_limit import rate_limiter
+from utils.metrics import registry, CONTENT_TYPE
+
+router = APIRouter(tags=["metrics"])
+
+
+def _is_local(request: Request) -> bool:
+    # A reverse proxy on this host would pass on public requests from loopback
+    if any(name in request.headers for name in ("forwarded", "x-forwarded-for", "x-real-ip")):
+        return False
+    try:
+        return request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        return False
+
+
+def _check_token(request: Request, authorization: Optional[str]):
+    """With METRICS_TOKEN set, require it; without, only answer clients on this host."""
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=403, detail="Invalid metrics token")
+    elif not _is_local(request):
+        raise HTTPException(status_code=403, detail="Metrics are only served to localhost without METRICS_TOKEN")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request, authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of this process's metrics."""
+    _check_token(request, authorization)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/metrics/queries", include_in_schema=False)
+async def query_log_entries(
+    request: Request,
+    kind: Optional[str] = Query(None, pattern="^(slow|n_plus_one)$"),
+    authorization: Optional[str] = Header(None)
+):
+    """Slow query log and N+1 suspects as JSON lines, oldest first."""
+    # SQL text and call sites: never served without the token, not even locally
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to read the query log")
+    _check_token(request, authorization)
+    return Response(query_log.to_jsonl(kind), media_type="application/x-ndjson")
+
+
+@router.get("/metrics/rate-limits", include_in_schema=False)
+async def rate_limit_stats(request: Request, authorization: Optional[str] = Header(None)):
+    """Rate limiter rules with allowed/rejected counts and live bucket count."""
+    _check_token(request, authorization)
+    return rate_limiter.stats()
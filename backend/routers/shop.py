@@ -1,72 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import Dict, List
-from database.connection import get_session
-from backend.auth import get_current_user
+from typing import Callable, Dict, List, Optional
+from database.executor import run_user_db
+from backend.auth import get_current_user, get_player_read_db
 from backend.services.shop_service import ShopService
-from backend.schemas.shop import GameItemSchema, InventoryItemSchema, BuyItemRequest, ToggleItemRequest
+from backend import payloads
+from backend.catalog_cache import catalog_cache
+from backend.schemas.shop import GameItemSchema, InventoryResponse, BuyItemRequest, ToggleItemRequest
 
 router = APIRouter(prefix="/api/shop", tags=["shop"])
 
 
+def _shop_action(session: Session, action: Callable, *args) -> Optional[str]:
+    """Unit of work: a ShopService action; its error, with its changes rolled back, or None."""
+    success, error = action(session, *args)
+    
+    if error:
+        session.rollback()
+    
+    return error
+
+
 @router.get("/items", response_model=List[GameItemSchema])
-async def get_shop_items(
-    session: Session = Depends(get_session)
-):
-    """Get all items available in shop."""
-    items = ShopService.get_all_items(session)
-    return items
+async def get_shop_items(request: Request):
+    """Get all items available in shop (ETag / If-None-Match aware)."""
+    return catalog_cache.response(request, "shop_items")
 
 
 @router.post("/buy")
 async def buy_item(
     request: BuyItemRequest,
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    user: Dict = Depends(get_current_user)
 ):
     """Buy an item from shop."""
     user_id = user['user_id']
     
-    success, error = ShopService.buy_item(session, user_id, request.item_id, request.quantity)
+    error = await run_user_db(user_id, _shop_action, ShopService.buy_item, user_id, request.item_id, request.quantity)
     
     if error:
         raise HTTPException(status_code=400, detail=error)
     
-    session.commit()
-    
     return {"success": True, "message": "آیتم با موفقیت خریداری شد"}
 
 
-@router.get("/inventory", response_model=List[InventoryItemSchema])
+@router.get("/inventory", response_model=InventoryResponse)
 async def get_inventory(
     user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_player_read_db)
 ):
-    """Get user's inventory."""
+    """Get user's inventory: rows by item id, plus each owned item once."""
     user_id = user['user_id']
     
-    inventory = ShopService.get_user_inventory(session, user_id)
-    return inventory
+    return ORJSONResponse(payloads.inventory(session, user_id))
 
 
 @router.post("/toggle-item")
 async def toggle_item(
     request: ToggleItemRequest,
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    user: Dict = Depends(get_current_user)
 ):
     """Toggle item active/inactive in inventory."""
     user_id = user['user_id']
     
-    success, error = ShopService.toggle_item_active(
-        session, user_id, request.inventory_id, request.active
+    error = await run_user_db(
+        user_id, _shop_action, ShopService.toggle_item_active, user_id, request.inventory_id, request.active
     )
     
     if error:
         raise HTTPException(status_code=400, detail=error)
     
-    session.commit()
-    
     return {"success": True}
 
 
@@ -74,17 +77,14 @@ async def toggle_item(
 async def sell_item(
     inventory_id: int,
     quantity: int = 1,
-    user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    user: Dict = Depends(get_current_user)
 ):
     """Sell an item from inventory."""
     user_id = user['user_id']
     
-    success, error = ShopService.sell_item(session, user_id, inventory_id, quantity)
+    error = await run_user_db(user_id, _shop_action, ShopService.sell_item, user_id, inventory_id, quantity)
     
     if error:
         raise HTTPException(status_code=400, detail=error)
     
-    session.commit()
-    
     return {"success": True, "message": "آیتم با موفقیت فروخته شد"}
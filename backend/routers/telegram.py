@@ -0,0 +1,30 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from backend.config import WEBHOOK_PATH
+from bot.webhook import get_application, get_webhook_secret, feed_update
+
+router = APIRouter(tags=["telegram"])
+
+
+@router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """Receive a Telegram update and queue it for the bot Application."""
+    if get_application() is None:
+        raise HTTPException(status_code=503, detail="Bot webhook mode is not enabled")
+    
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or "", get_webhook_secret()):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed update")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Malformed update")
+    await feed_update(data)
+    
+    return {"ok": True}
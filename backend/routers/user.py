@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import Dict, List
-from database.connection import get_session
-from database.models import User
-from backend.auth import get_current_user
-from backend.schemas.user import UserProfile, LeaderboardEntry
+from typing import Dict, List, Optional
+from backend.auth import get_current_user, get_player_read_db
+from backend.schemas.user import UserProfile, LeaderboardEntry, JoinRequirementSchema, SyncRequest, SyncResponse
+from backend import payloads
+from backend.catalog_cache import catalog_cache
+from backend.state_sync import sync_state
 
 router = APIRouter(prefix="/api/user", tags=["user"])
 
@@ -12,68 +14,40 @@ router = APIRouter(prefix="/api/user", tags=["user"])
 @router.get("/profile", response_model=UserProfile)
 async def get_profile(
     user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_player_read_db)
 ):
-    """Get current user's profile."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
-    
-    if not db_user:
-        # Create new user
-        db_user = User(
-            user_id=user_id,
-            username=user.get('username'),
-            first_name=user.get('first_name')
-        )
-        session.add(db_user)
-        session.commit()
-        session.refresh(db_user)
-    
-    return db_user
+    """Get current user's profile (creates the user on their first visit)."""
+    return ORJSONResponse(await payloads.get_or_create_profile(session, user))
 
 
 @router.get("/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(
-    limit: int = 100,
-    session: Session = Depends(get_session)
-):
+async def get_leaderboard(limit: int = 100):
     """Get top players leaderboard."""
-    users = session.query(User).order_by(User.coins.desc()).limit(limit).all()
-    
-    leaderboard = []
-    for idx, user in enumerate(users, start=1):
-        leaderboard.append(LeaderboardEntry(
-            user_id=user.user_id,
-            username=user.username,
-            first_name=user.first_name,
-            coins=user.coins,
-            click_level=user.click_level,
-            rank=idx
-        ))
-    
-    return leaderboard
+    return ORJSONResponse(payloads.global_leaderboard(limit))
 
 
-@router.post("/sync")
+@router.get("/join-requirements", response_model=List[JoinRequirementSchema])
+async def get_join_requirements(request: Request):
+    """Groups/channels players must join (ETag / If-None-Match aware)."""
+    return catalog_cache.response(request, "join_requirements")
+
+
+@router.post("/sync", response_model=SyncResponse)
 async def sync_user(
+    request: Optional[SyncRequest] = None,
     user: Dict = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_player_read_db)
 ):
-    """Sync user data (useful for energy regeneration, etc)."""
-    user_id = user['user_id']
-    
-    db_user = session.query(User).filter(User.user_id == user_id).first()
+    """
+    Sync live game state since the client's last state_version.
+
+    Returns `unchanged` when nothing changed, otherwise only the changed fields
+    (or the full state when `full` is set).
+    """
+    client_version = request.state_version if request else None
+    state = sync_state(session, user['user_id'], client_version)
     
-    if not db_user:
+    if not state:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Here you could add energy regeneration over time
-    # For now just return current state
-    
-    return {
-        "energy": db_user.energy,
-        "electricity": db_user.electricity,
-        "coins": db_user.coins,
-        "diamonds": db_user.diamonds
-    }
+    return ORJSONResponse(state)
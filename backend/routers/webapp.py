@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request
+from backend.static_assets import webapp_bundle
+
+router = APIRouter(prefix="/webapp", include_in_schema=False)
+
+
+@router.get("")
+@router.get("/")
+@router.get("/index.html")
+async def index(request: Request):
+    """index.html pointing at the hashed bundles; revalidated with its ETag."""
+    return webapp_bundle.index_response(request)
+
+
+@router.get("/assets/{name}")
+async def asset(name: str, request: Request):
+    """Content-hashed bundle, cached by the browser forever."""
+    return webapp_bundle.asset_response(request, name)
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List
+from backend.schemas.game import QuestSchema
+from backend.schemas.shop import GameItemSchema, InventoryResponse
+from backend.schemas.user import UserProfile, LeaderboardEntry
+
+
+class BootstrapResponse(BaseModel):
+    """Everything the web app needs on open, in one response."""
+    profile: UserProfile
+    inventory: InventoryResponse
+    quests: List[QuestSchema]
+    leaderboard: List[LeaderboardEntry]
+    shop_items: List[GameItemSchema]
+    shop_items_etag: str  # ETag of GET /api/shop/items for the same catalog
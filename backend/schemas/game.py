@@ -29,3 +29,35 @@ class RefillEnergyRequest(BaseModel):
 
 class ActivateBoostRequest(BaseModel):
     duration_minutes: int = 15
+
+
+class AchievementSchema(BaseModel):
+    id: int
+    code: str
+    title: str
+    description: Optional[str]
+    emoji: str
+    target_coins: int
+    target_diamonds: int
+    target_miners: int
+    reward_coins: int
+    reward_diamonds: int
+
+    class Config:
+        from_attributes = True
+
+
+class QuestSchema(BaseModel):
+    id: int
+    code: str
+    title: str
+    quest_type: str
+    goal: int
+    progress: int
+    reward_coins: int
+    reward_diamonds: int
+    reward_xp: int
+    completed: bool
+
+    class Config:
+        from_attributes = True
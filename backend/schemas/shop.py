@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -22,9 +22,9 @@ class GameItemSchema(BaseModel):
         from_attributes = True
 
 
-class InventoryItemSchema(BaseModel):
+class InventoryRowSchema(BaseModel):
     id: int
-    item: GameItemSchema
+    item_id: int
     quantity: int
     is_active: bool
     created_at: datetime
@@ -33,6 +33,12 @@ class InventoryItemSchema(BaseModel):
         from_attributes = True
 
 
+class InventoryResponse(BaseModel):
+    """Inventory rows reference `items`, which holds each owned item once (keyed by id)."""
+    items: Dict[int, GameItemSchema]
+    inventory: List[InventoryRowSchema]
+
+
 class BuyItemRequest(BaseModel):
     item_id: int
     quantity: int = 1
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime
 
 
@@ -19,6 +19,7 @@ class UserProfile(BaseModel):
     boost_multiplier: float
     daily_streak: int
     created_at: datetime
+    state_version: int
 
     class Config:
         from_attributes = True
@@ -34,3 +35,26 @@ class LeaderboardEntry(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class JoinRequirementSchema(BaseModel):
+    id: int
+    chat_id: str
+    chat_name: Optional[str]
+    chat_type: Optional[str]
+    invite_link: Optional[str]
+    message: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+
+class SyncRequest(BaseModel):
+    state_version: Optional[int] = None  # the last version the client has seen
+
+
+class SyncResponse(BaseModel):
+    state_version: int
+    unchanged: bool = False
+    full: bool = False  # changes holds the whole state, not a diff against the client's version
+    changes: Dict[str, Any] = {}
@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
 import random
 from typing import Tuple, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import case
+from sqlalchemy.orm import Session, joinedload, object_session
 from database.models import User, GameItem, ItemType, Inventory
+from database.queries import change_balance, credit
+from database import ledger
 from backend.config import (
     BASE_CLICK_COINS, XP_PER_CLICK, XP_PER_LEVEL_BASE, XP_MULTIPLIER,
     MAX_ENERGY, MAX_ELECTRICITY, DIAMOND_DROP_CHANCE,
@@ -46,7 +49,6 @@ class GameService:
             return None, "انرژی شما تمام شده است! ⚡️"
         
         reward = GameService.calculate_click_reward(user, session)
-        user.coins += reward
         user.energy -= 1
         user.click_xp += XP_PER_CLICK
         
@@ -59,10 +61,8 @@ class GameService:
             leveled_up = True
         
         # Diamond drop
-        diamond_found = False
-        if random.random() < DIAMOND_DROP_CHANCE:
-            diamond_found = True
-            user.diamonds += 1
+        diamond_found = random.random() < DIAMOND_DROP_CHANCE
+        credit(session, user, coins=reward, diamonds=int(diamond_found), reason=ledger.CLICK)
         
         # Update quest progress
         from backend.services.quest_service import QuestService
@@ -146,7 +146,7 @@ class GameService:
         Returns:
             Tuple of (result_dict, error_message)
         """
-        inventory = session.query(Inventory).filter(
+        inventory = session.query(Inventory).options(joinedload(Inventory.item)).filter(
             Inventory.user_id == user.user_id
         ).all()
         
@@ -157,10 +157,9 @@ class GameService:
         if error:
             return None, error
         
-        user.coins += coins
         user.electricity -= electricity
-        user.diamonds += diamonds
         user.last_mined_at = datetime.now()
+        credit(session, user, coins=coins, diamonds=diamonds, reason=ledger.MINE)
         
         # Update quest progress
         from backend.services.quest_service import QuestService
@@ -180,15 +179,19 @@ class GameService:
         """
         Refill user energy using diamonds.
         
+        One conditional UPDATE; `user` is refreshed from its result.
+        
         Returns:
             Tuple of (success, error_message)
         """
-        if user.diamonds < ENERGY_REFILL_COST_DIAMONDS:
+        refilled = User.energy + amount
+        charged = change_balance(
+            object_session(user), user.user_id, diamonds=-ENERGY_REFILL_COST_DIAMONDS, reason=ledger.ENERGY_REFILL,
+            energy=case((refilled > User.max_energy, User.max_energy), else_=refilled)
+        )
+        if charged is None:
             return False, "الماس کافی ندارید! 💎"
         
-        user.diamonds -= ENERGY_REFILL_COST_DIAMONDS
-        user.energy = min(user.energy + amount, user.max_energy)
-        
         return True, None
     
     @staticmethod
@@ -199,13 +202,14 @@ class GameService:
         Returns:
             Tuple of (success, error_message)
         """
-        if user.diamonds < BOOST_COST_DIAMONDS:
+        charged = change_balance(
+            object_session(user), user.user_id, diamonds=-BOOST_COST_DIAMONDS, reason=ledger.BOOST,
+            boost_multiplier=BOOST_MULTIPLIER,
+            active_boost_until=datetime.now() + timedelta(minutes=duration_minutes)
+        )
+        if charged is None:
             return False, "الماس کافی ندارید! 💎"
         
-        user.diamonds -= BOOST_COST_DIAMONDS
-        user.boost_multiplier = BOOST_MULTIPLIER
-        user.active_boost_until = datetime.now() + timedelta(minutes=duration_minutes)
-        
         return True, None
     
     @staticmethod
@@ -240,9 +244,8 @@ class GameService:
         coins_reward = DAILY_REWARDS_COINS[day_index]
         diamonds_reward = DAILY_REWARDS_DIAMONDS[day_index]
         
-        user.coins += coins_reward
-        user.diamonds += diamonds_reward
         user.last_daily_claim = now
+        credit(session, user, coins=coins_reward, diamonds=diamonds_reward, reason=ledger.DAILY)
         
         return {
             "coins": coins_reward,
@@ -0,0 +1,252 @@
+"""
+Game actions over a persistent WebSocket.
+
+The client authenticates once, then sends compact JSON messages:
+
+    {"t": "auth", "d": "<initData>"}           first message, within WS_AUTH_TIMEOUT_SECONDS
+    {"t": "tap", "n": 3}                       taps batched on the client (at most WS_MAX_TAPS_PER_MESSAGE)
+    {"t": "mine"} {"t": "refill"} {"t": "boost"} {"t": "daily"}
+    {"t": "ping"}
+
+Any message may carry an "id", which is echoed back on its reply. The server answers with:
+
+    {"t": "hello", "s": {...full profile...}}
+    {"t": "delta", "s": {...changed fields only...}, "ev": {...what happened...}}
+    {"t": "err", "m": "<message>"}
+    {"t": "pong"}
+
+It also pushes a delta by itself when a boost runs out. Each message is one
+short unit of work (run_user_db), and messages from one connection are handled in
+order.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from database.executor import run_user_db
+from database.shards import get_user_read_session
+from database.models import User
+from backend.auth import authenticate_init_data
+from backend.config import WS_AUTH_TIMEOUT_SECONDS, WS_MAX_TAPS_PER_MESSAGE
+from backend.metrics import WS_CONNECTIONS, WS_MESSAGES, WS_MESSAGE_DURATION
+from backend.rate_limit import rate_limiter, TOO_MANY_REQUESTS
+from backend.services.game_service import GameService
+from backend import payloads
+
+logger = logging.getLogger(__name__)
+
+# Fields a delta can carry
+STATE_FIELDS = payloads.SYNC_FIELDS + ("state_version",)
+
+CLOSE_UNAUTHORIZED = 4401
+
+Events = Dict[str, Any]
+
+
+def snapshot(user: User) -> Dict[str, Any]:
+    return {field: getattr(user, field) for field in STATE_FIELDS}
+
+
+def state_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: value for field, value in after.items() if before.get(field) != value}
+
+
+def _tap_count(message: Dict) -> Optional[int]:
+    try:
+        return min(max(int(message.get("n", 1)), 1), WS_MAX_TAPS_PER_MESSAGE)
+    except (TypeError, ValueError):
+        return None
+
+
+def _tap(session: Session, user: User, message: Dict) -> Tuple[Events, Optional[str]]:
+    taps = _tap_count(message)
+    if taps is None:
+        return {}, "Invalid tap count"
+
+    events = {"taps": 0, "coins_earned": 0}
+    error = None
+    for _ in range(taps):
+        result, error = GameService.process_click(user, session)
+        if error:
+            break
+        events["taps"] += 1
+        events["coins_earned"] += result["coins_earned"]
+        if result["diamond_found"]:
+            events["diamonds_found"] = events.get("diamonds_found", 0) + 1
+        if result["leveled_up"]:
+            events["level_up"] = result["new_level"]
+
+    if not events["taps"]:
+        return {}, error
+    return events, None
+
+
+def _mine(session: Session, user: User, message: Dict) -> Tuple[Events, Optional[str]]:
+    result, error = GameService.claim_mining_rewards(user, session)
+    if error:
+        return {}, error
+    return {key: result[key] for key in ("coins_earned", "electricity_spent", "diamonds_earned")}, None
+
+
+def _refill(session: Session, user: User, message: Dict) -> Tuple[Events, Optional[str]]:
+    success, error = GameService.refill_energy(user)
+    return ({"refilled": True}, None) if success else ({}, error)
+
+
+def _boost(session: Session, user: User, message: Dict) -> Tuple[Events, Optional[str]]:
+    success, error = GameService.activate_boost(user)
+    return ({"boost_activated": True}, None) if success else ({}, error)
+
+
+def _daily(session: Session, user: User, message: Dict) -> Tuple[Events, Optional[str]]:
+    result, error = GameService.claim_daily_reward(user, session)
+    if error:
+        return {}, error
+    return {"daily_reward": result}, None
+
+
+HANDLERS: Dict[str, Callable[[Session, User, Dict], Tuple[Events, Optional[str]]]] = {
+    "tap": _tap,
+    "mine": _mine,
+    "refill": _refill,
+    "boost": _boost,
+    "daily": _daily,
+}
+
+
+class GameSession:
+    """One authenticated player's WebSocket connection."""
+
+    def __init__(self, websocket: WebSocket, auth_user: Dict):
+        self.websocket = websocket
+        self.auth_user = auth_user
+        self.user_id = auth_user['user_id']
+        self._boost_timer: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: Dict):
+        async with self._send_lock:
+            await self.websocket.send_text(orjson.dumps(message).decode())
+
+    async def _hello(self) -> Dict:
+        session = get_user_read_session(self.user_id)
+        try:
+            return await payloads.get_or_create_profile(session, self.auth_user)
+        finally:
+            session.close()
+
+    def apply(self, session: Session, kind: str, message: Dict) -> Dict:
+        """Unit of work (run_user_db): one action, and a description of the outcome."""
+        user = session.get(User, self.user_id)
+        if user is None:
+            return {"t": "err", "m": "User not found"}
+        before = snapshot(user)
+        events, error = HANDLERS[kind](session, user, message)
+        if error:
+            session.rollback()
+            return {"t": "err", "m": error}
+        # Flushed, state_version and anything set in SQL reload with what will be committed
+        session.flush()
+        return {"t": "delta", "s": state_delta(before, snapshot(user)), "ev": events}
+
+    async def run(self):
+        profile = await self._hello()
+        self._schedule_boost_expiry(profile.get("active_boost_until"))
+        await self.send({"t": "hello", "s": profile})
+
+        while True:
+            raw = await self.websocket.receive_text()
+            try:
+                message = orjson.loads(raw)
+                kind = message.get("t")
+            except (orjson.JSONDecodeError, AttributeError):
+                WS_MESSAGES.inc(("invalid", "error"))
+                await self.send({"t": "err", "m": "Invalid message"})
+                continue
+
+            if kind == "ping":
+                reply = {"t": "pong"}
+            elif kind in HANDLERS and self._over_limit(kind, message):
+                WS_MESSAGES.inc((kind, "limited"))
+                reply = {"t": "err", "m": TOO_MANY_REQUESTS}
+            elif kind in HANDLERS:
+                started = time.perf_counter()
+                try:
+                    reply = await run_user_db(self.user_id, self.apply, kind, message)
+                except Exception as e:
+                    logger.error(f"Game socket action {kind} failed for {self.user_id}: {e}")
+                    reply = {"t": "err", "m": "Server error"}
+                WS_MESSAGE_DURATION.observe(time.perf_counter() - started, (kind,))
+                WS_MESSAGES.inc((kind, "ok" if reply["t"] == "delta" else "error"))
+                if reply["t"] == "delta" and "active_boost_until" in reply["s"]:
+                    self._schedule_boost_expiry(reply["s"]["active_boost_until"])
+            else:
+                WS_MESSAGES.inc(("unknown", "error"))
+                reply = {"t": "err", "m": "Unknown message type"}
+
+            if "id" in message:
+                reply["id"] = message["id"]
+            await self.send(reply)
+
+    def _over_limit(self, kind: str, message: Dict) -> bool:
+        """
+        Taps draw on the same per-second budget as HTTP clicks, other actions on
+        the API budget. A tap batch larger than what's left is cut down to it.
+        """
+        if kind != "tap":
+            return rate_limiter.allow("api", self.user_id) is not None
+        taps = _tap_count(message)
+        if taps is None:
+            return False  # the handler reports it
+        granted, _ = rate_limiter.take("click", self.user_id, taps, partial=True)
+        message["n"] = granted
+        return granted == 0
+
+    def _schedule_boost_expiry(self, until: Optional[datetime]):
+        if self._boost_timer:
+            self._boost_timer.cancel()
+            self._boost_timer = None
+        if until and until > datetime.now():
+            self._boost_timer = asyncio.create_task(self._push_boost_expiry(until))
+
+    async def _push_boost_expiry(self, until: datetime):
+        await asyncio.sleep((until - datetime.now()).total_seconds())
+        try:
+            await self.send({"t": "delta", "s": {"active_boost_until": None}, "ev": {"boost_expired": True}})
+        except Exception:
+            pass  # connection already gone
+
+    def close(self):
+        if self._boost_timer:
+            self._boost_timer.cancel()
+
+
+async def serve_game_socket(websocket: WebSocket):
+    """Accept, authenticate from the first message, then run the session until the client leaves."""
+    await websocket.accept()
+    try:
+        first = orjson.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT_SECONDS))
+        init_data = first.get("d") if first.get("t") == "auth" else None
+    except (asyncio.TimeoutError, orjson.JSONDecodeError, AttributeError):
+        init_data = None
+    except WebSocketDisconnect:
+        return
+
+    auth_user, error = authenticate_init_data(init_data)
+    if error:
+        await websocket.close(code=CLOSE_UNAUTHORIZED, reason=error)
+        return
+
+    session = GameSession(websocket, auth_user)
+    WS_CONNECTIONS.inc()
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
+        WS_CONNECTIONS.dec()
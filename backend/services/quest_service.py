@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from database.models import UserQuest, QuestType
+from database import ledger
+from database.queries import credit
 
 
 class QuestService:
@@ -27,9 +29,11 @@ class QuestService:
                 from database.models import User
                 user = session.query(User).filter(User.user_id == user_id).first()
                 if user:
-                    user.coins += quest.reward_coins
-                    user.diamonds += quest.reward_diamonds
                     user.click_xp += quest.reward_xp
+                    credit(
+                        session, user, coins=quest.reward_coins or 0, diamonds=quest.reward_diamonds or 0,
+                        reason=ledger.QUEST, ref_id=quest.id
+                    )
     
     @staticmethod
     def get_user_quests(session: Session, user_id: int):
@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from database.models import User, GameItem, Inventory, ItemType
 from typing import Tuple, Optional
+from database.queries import (
+    change_balance, take_stock, return_stock, add_inventory_quantity, take_inventory_quantity
+)
+from database import ledger
+from utils.settings_store import bump_catalog_version
 
 
 class ShopService:
@@ -21,57 +26,44 @@ class ShopService:
         """
         Buy an item from the shop.
         
+        Stock and diamonds are each taken with one conditional UPDATE, so two
+        concurrent purchases can't both spend the same diamonds or the last item.
+        
         Returns:
             Tuple of (success, error_message)
         """
-        user = session.query(User).filter(User.user_id == user_id).first()
         item = session.query(GameItem).filter(GameItem.id == item_id).first()
         
-        if not user:
-            return False, "User not found"
-        
         if not item:
             return False, "Item not found"
         
         total_cost = item.price_diamonds * quantity
+        limited_stock = item.stock != -1
         
-        if user.diamonds < total_cost:
-            return False, "الماس کافی ندارید! 💎"
-        
-        # Check stock
-        if item.stock != -1 and item.stock < quantity:
+        # Take stock first (part of the cached shop catalog)
+        if limited_stock and not take_stock(session, item_id, quantity):
             return False, "موجودی کافی نیست"
         
         # Deduct cost
-        user.diamonds -= total_cost
+        if change_balance(session, user_id, diamonds=-total_cost, reason=ledger.SHOP_BUY, ref_id=item_id) is None:
+            if limited_stock:
+                return_stock(session, item_id, quantity)
+            if session.get(User, user_id) is None:
+                return False, "User not found"
+            return False, "الماس کافی ندارید! 💎"
         
-        # Update stock
-        if item.stock != -1:
-            item.stock -= quantity
+        if limited_stock:
+            bump_catalog_version(session)
         
         # Add to inventory
-        existing_inv = session.query(Inventory).filter(
-            Inventory.user_id == user_id,
-            Inventory.item_id == item_id
-        ).first()
-        
-        if existing_inv:
-            existing_inv.quantity += quantity
-        else:
-            new_inv = Inventory(
-                user_id=user_id,
-                item_id=item_id,
-                quantity=quantity,
-                is_active=False
-            )
-            session.add(new_inv)
+        add_inventory_quantity(session, user_id, item_id, quantity, is_active=False)
         
         return True, None
     
     @staticmethod
     def get_user_inventory(session: Session, user_id: int):
         """Get user's inventory."""
-        return session.query(Inventory).filter(
+        return session.query(Inventory).options(joinedload(Inventory.item)).filter(
             Inventory.user_id == user_id
         ).all()
     
@@ -100,34 +92,29 @@ class ShopService:
         """
         Sell an item from inventory back to shop.
         
+        The quantity is taken with a conditional UPDATE before any coins are paid,
+        so the same items can't be sold twice.
+        
         Returns:
             Tuple of (success, error_message)
         """
-        user = session.query(User).filter(User.user_id == user_id).first()
-        inv_item = session.query(Inventory).filter(
+        inv_item = session.query(Inventory).options(joinedload(Inventory.item)).filter(
             Inventory.id == inventory_id,
             Inventory.user_id == user_id
         ).first()
         
-        if not user:
-            return False, "User not found"
-        
         if not inv_item:
             return False, "Item not found in inventory"
         
-        if inv_item.quantity < quantity:
-            return False, "تعداد کافی ندارید"
-        
         # Calculate sell price
         sell_price = inv_item.item.sell_price * quantity
         
-        # Add coins
-        user.coins += sell_price
-        
         # Remove from inventory
-        inv_item.quantity -= quantity
+        if take_inventory_quantity(session, user_id, inventory_id, quantity) is None:
+            return False, "تعداد کافی ندارید"
         
-        if inv_item.quantity <= 0:
-            session.delete(inv_item)
+        # Add coins
+        if change_balance(session, user_id, coins=sell_price, reason=ledger.SHOP_SELL, ref_id=inv_item.item_id) is None:
+            return False, "User not found"
         
         return True, None
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from backend.config import SYNC_SNAPSHOT_CACHE_SIZE
+from backend import payloads
+from database.state_versions import state_versions
+
+
+class SyncSnapshots:
+    """
+    The last state sent to each player, keyed by the state_version it had.
+
+    Least recently synced players are dropped past `max_entries`. A miss (new
+    process, another worker, evicted entry) only means a full state is sent.
+    """
+
+    def __init__(self, max_entries: int = SYNC_SNAPSHOT_CACHE_SIZE):
+        self._entries: "OrderedDict[int, Tuple[int, Dict]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, version: int, state: Dict):
+        with self._lock:
+            self._entries[user_id] = (version, state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+def sync_state(session: Session, user_id: int, client_version: Optional[int]) -> Optional[Dict]:
+    """
+    A SyncResponse-shaped dict for a client that last saw `client_version`, or
+    None if the player doesn't exist.
+
+    If nothing changed since then, the answer usually comes from the versions
+    kept in memory (database/state_versions.py), else only the version is read.
+    Otherwise the changed fields are returned, or the whole state if the
+    version the client has is not the one we last sent it.
+    """
+    if client_version is not None:
+        version = state_versions.get(user_id)
+        if version is None:
+            read_at = state_versions.clock()
+            version = payloads.state_version(session, user_id)
+            if version is None:
+                return None
+            state_versions.put(user_id, version, read_at)
+        if version == client_version:
+            return {"state_version": version, "unchanged": True}
+
+    read_at = state_versions.clock()
+    state = payloads.user_sync(session, user_id)
+    if state is None:
+        return None
+    version = state.pop("state_version")
+    state_versions.put(user_id, version, read_at)
+
+    previous = sync_snapshots.get(user_id, client_version) if client_version is not None else None
+    sync_snapshots.put(user_id, version, state)
+    if previous is None:
+        return {"state_version": version, "full": True, "changes": state}
+    changes = {field: value for field, value in state.items() if previous.get(field) != value}
+    return {"state_version": version, "changes": changes}
+
+
+sync_snapshots = SyncSnapshots()
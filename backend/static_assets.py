@@ -0,0 +1,322 @@
+"""
+Web app asset pipeline: bundled, minified, content-hashed, precompressed.
+
+The local scripts and stylesheets that webapp/index.html references are
+concatenated in page order, minified, and named after a hash of their content
+(app.<hash>.js, app.<hash>.css). index.html is rewritten to load just those two
+files. Bundles are served from memory with `immutable` cache headers, so the
+browser never asks for them again. index.html itself is revalidated with an
+ETag, so a repeat open of the app costs one 304 and no asset bytes.
+
+Built once at startup. `python -m backend.static_assets --out DIR` writes the
+same files (with .gz/.br variants) for serving from nginx or a CDN instead.
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+WEBAPP_DIR = "webapp"
+URL_PREFIX = "/webapp"
+ASSET_PATH = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_SCRIPT_TAG = re.compile(r'[ \t]*<script\s+src="(?P<src>/webapp/[^"]+\.js)"\s*>\s*</script>[ \t]*\n?')
+_STYLE_TAG = re.compile(r'[ \t]*<link\s+rel="stylesheet"\s+href="(?P<src>/webapp/[^"]+\.css)"\s*/?>[ \t]*\n?')
+
+# After these characters a "/" starts a regex literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+
+
+def _skip_quoted(source: str, i: int) -> int:
+    """Index just past the string or template literal starting at i."""
+    quote = source[i]
+    i += 1
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if quote == "`" and source.startswith("${", i):
+            i = _skip_code_block(source, i + 2)
+            continue
+        i += 1
+    return n
+
+
+def _skip_code_block(source: str, i: int) -> int:
+    """Index just past the "}" closing a template literal's ${ ... }."""
+    depth = 1
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c in "'\"`":
+            i = _skip_quoted(source, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _skip_regex(source: str, i: int) -> int:
+    i += 1
+    in_class = False
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return i
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            i += 1
+            while i < n and source[i].isalpha():  # flags
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def minify_js(source: str) -> str:
+    """
+    Drop comments, indentation and blank lines.
+
+    Line breaks are kept, so automatic semicolon insertion behaves exactly as in
+    the source. Strings, template literals and regex literals are copied verbatim.
+    """
+    out: List[str] = []
+    line_has_code = False
+    last = ""  # last significant character emitted
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in "'\"`":
+            end = _skip_quoted(source, i)
+            out.append(source[i:end])
+            line_has_code, last, i = True, c, end
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end == -1 else end
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif c == "/" and last in _REGEX_PRECEDERS:
+            end = _skip_regex(source, i)
+            out.append(source[i:end])
+            line_has_code, last, i = True, "/", end
+        elif c == "\n":
+            while out and out[-1] in (" ", "\t", "\r"):
+                out.pop()
+            if line_has_code:
+                out.append("\n")
+            line_has_code = False
+            i += 1
+        elif c in " \t\r" and not line_has_code:
+            i += 1
+        else:
+            out.append(c)
+            line_has_code = True
+            if not c.isspace():
+                last = c
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+def minify_css(source: str) -> str:
+    """Drop comments and collapse whitespace; quoted strings are left alone."""
+    parts: List[str] = []
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in "'\"":
+            end = _skip_quoted(source, i)
+            parts.append(source[i:end])
+            i = end
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif c.isspace():
+            while i < n and source[i].isspace():
+                i += 1
+            parts.append(" ")
+        else:
+            parts.append(c)
+            i += 1
+    css = "".join(parts)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)  # only after ":"; "a :hover" is a different selector
+    css = css.replace(";}", "}")
+    return css.strip() + "\n"
+
+
+class Asset:
+    """One response body in every encoding we serve."""
+    __slots__ = ("name", "media_type", "body", "gzip_body", "br_body", "etag", "_etags")
+
+    def __init__(self, name: str, media_type: str, body: bytes):
+        self.name = name
+        self.media_type = media_type
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.br_body = brotli.compress(body, quality=11) if brotli else None
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        # a strong ETag names one representation, so each encoding gets its own
+        self._etags = {None: self.etag, "gzip": f'"{digest}-gz"', "br": f'"{digest}-br"'}
+
+    def encoded(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        if self.br_body is not None and "br" in accept_encoding and len(self.br_body) < len(self.body):
+            return self.br_body, "br"
+        if "gzip" in accept_encoding and len(self.gzip_body) < len(self.body):
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        body, encoding = self.encoded(request.headers.get("accept-encoding", ""))
+        headers = {"ETag": self._etags[encoding], "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and {tag.strip() for tag in if_none_match.split(",")} & set(self._etags.values()):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+def _hashed_name(stem: str, ext: str, body: bytes) -> str:
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+
+
+class WebAppBundle:
+    """The rewritten index.html plus its bundles, built once from `root`."""
+
+    def __init__(self, root: str = WEBAPP_DIR, url_prefix: str = URL_PREFIX):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.index: Optional[Asset] = None
+        self.assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, url: str) -> str:
+        path = os.path.join(self.root, url[len(self.url_prefix):].lstrip("/"))
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def build(self):
+        with open(os.path.join(self.root, "index.html"), encoding="utf-8") as f:
+            html = f.read()
+
+        scripts = [m.group("src") for m in _SCRIPT_TAG.finditer(html)]
+        styles = [m.group("src") for m in _STYLE_TAG.finditer(html)]
+        sources = {src: self._read(src) for src in scripts + styles}
+        assets = {}
+
+        if scripts:
+            # ";" between files so one file can't run into the next
+            js = ";\n".join(minify_js(sources[src]) for src in scripts).encode()
+            name = _hashed_name("app", ".js", js)
+            assets[name] = Asset(name, "application/javascript; charset=utf-8", js)
+            html = self._replace_tags(html, _SCRIPT_TAG, f'<script src="{self.url_prefix}{ASSET_PATH}{name}"></script>')
+        if styles:
+            css = "".join(minify_css(sources[src]) for src in styles).encode()
+            name = _hashed_name("app", ".css", css)
+            assets[name] = Asset(name, "text/css; charset=utf-8", css)
+            html = self._replace_tags(html, _STYLE_TAG, f'<link rel="stylesheet" href="{self.url_prefix}{ASSET_PATH}{name}">')
+
+        self.assets = assets
+        self.index = Asset("index.html", "text/html; charset=utf-8", html.encode())
+        source_bytes = sum(len(text.encode()) for text in sources.values())
+        bundle_bytes = sum(len(a.body) for a in assets.values())
+        logger.info(
+            f"Web app bundled: {len(scripts)} scripts + {len(styles)} stylesheets, "
+            f"{source_bytes} -> {bundle_bytes} bytes ({sum(len(a.gzip_body) for a in assets.values())} gzipped)"
+        )
+
+    @staticmethod
+    def _replace_tags(html: str, pattern, replacement: str) -> str:
+        """Put `replacement` where the first matching tag was and drop the rest."""
+        first = True
+
+        def substitute(match):
+            nonlocal first
+            if first:
+                first = False
+                indent = match.group(0)[:len(match.group(0)) - len(match.group(0).lstrip())]
+                return f"{indent}{replacement}\n"
+            return ""
+
+        return pattern.sub(substitute, html)
+
+    def ensure_built(self):
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self.build()
+
+    def index_response(self, request: Request) -> Response:
+        self.ensure_built()
+        return self.index.response(request, "no-cache")
+
+    def asset_response(self, request: Request, name: str) -> Response:
+        self.ensure_built()
+        asset = self.assets.get(name)
+        if asset is None:
+            return Response(status_code=404)
+        return asset.response(request, IMMUTABLE)
+
+    def write(self, out_dir: str):
+        """Write index.html and the bundles, each with .gz (and .br) siblings."""
+        self.ensure_built()
+        os.makedirs(os.path.join(out_dir, ASSET_PATH.strip("/")), exist_ok=True)
+        files = [("index.html", self.index)] + [
+            (os.path.join(ASSET_PATH.strip("/"), name), asset) for name, asset in self.assets.items()
+        ]
+        for relpath, asset in files:
+            path = os.path.join(out_dir, relpath)
+            for suffix, body in (("", asset.body), (".gz", asset.gzip_body), (".br", asset.br_body)):
+                if body is not None:
+                    with open(path + suffix, "wb") as f:
+                        f.write(body)
+        return [relpath for relpath, _ in files]
+
+
+webapp_bundle = WebAppBundle()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the web app bundles.")
+    parser.add_argument("--root", default=WEBAPP_DIR, help="web app source directory")
+    parser.add_argument("--out", default=os.path.join(WEBAPP_DIR, "dist"), help="output directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for relpath in WebAppBundle(args.root).write(args.out):
+        print(os.path.join(args.out, relpath))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Load tests and benchmarks for the game backend (not imported by the app)."""
@@ -0,0 +1,251 @@
+"""
+End-to-end load test for the game API.
+
+Runs backend.main:app in process (through httpx's ASGI transport, so no server
+or network is involved) against a throwaway SQLite database, or any database you
+point it at. Virtual players authenticate with Telegram initData forged for a test
+bot token, signed exactly the way validate_telegram_webapp_data checks it, and
+play a weighted mix of actions until the time is up.
+
+    python -m benchmarks.loadtest --players 2000 --duration 60
+    python -m benchmarks.loadtest --players 500 --think-time 0 --json results.json
+    python -m benchmarks.loadtest --mix click=80,sync=20 --database-url postgresql://localhost/nanocoin_load
+
+Reports throughput, p50/p95/p99 latency and error rates per endpoint. 4xx answers
+are the game saying no (out of energy, nothing to mine yet) and are counted apart
+from errors (5xx and exceptions).
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+TEST_BOT_TOKEN = "123456:LOADTEST-not-a-real-token"
+
+# name -> (method, path, weight)
+ACTIONS = {
+    "click": ("POST", "/api/game/click", 60),
+    "sync": ("POST", "/api/user/sync", 10),
+    "mine": ("POST", "/api/game/mine", 8),
+    "profile": ("GET", "/api/user/profile", 8),
+    "leaderboard": ("GET", "/api/user/leaderboard", 6),
+    "shop": ("GET", "/api/shop/items", 4),
+    "buy": ("POST", "/api/shop/buy", 2),
+    "inventory": ("GET", "/api/shop/inventory", 2),
+}
+
+
+def forge_init_data(user_id: int, bot_token: str = TEST_BOT_TOKEN, auth_date: Optional[int] = None) -> str:
+    """Telegram Web App initData for `user_id`, signed with `bot_token`."""
+    fields = {
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": f"LOADTEST{user_id}",
+        "user": json.dumps(
+            {"id": user_id, "first_name": f"Player {user_id}", "username": f"player{user_id}"},
+            separators=(",", ":")
+        ),
+    }
+    data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret_key = hmac.new(key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256).digest()
+    fields["hash"] = hmac.new(key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r} (choose from {', '.join(ACTIONS)})")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Results:
+    """Latencies and outcomes per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, action: str, elapsed: float, outcome: str):
+        self.latencies[action].append(elapsed)
+        self.outcomes[action][outcome] += 1
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        endpoints = {}
+        for action in sorted(self.latencies, key=lambda a: -len(self.latencies[a])):
+            latencies = sorted(self.latencies[action])
+            outcomes = self.outcomes[action]
+            count = len(latencies)
+            errors = outcomes["5xx"] + outcomes["exception"]
+            method, path, _ = ACTIONS[action]
+            endpoints[action] = {
+                "endpoint": f"{method} {path}",
+                "requests": count,
+                "rps": round(count / duration, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+                "rejected_4xx": outcomes["4xx"],
+                "errors": errors,
+                "error_rate": round(errors / count * 100, 2) if count else 0.0,
+            }
+
+        total = sum(len(v) for v in self.latencies.values())
+        all_latencies = sorted(x for v in self.latencies.values() for x in v)
+        total_errors = sum(e["errors"] for e in endpoints.values())
+        return {
+            "duration_s": round(duration, 2),
+            "requests": total,
+            "rps": round(total / duration, 1) if duration else 0.0,
+            "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(all_latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 2),
+            "errors": total_errors,
+            "error_rate": round(total_errors / total * 100, 2) if total else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+async def player(client, user_id: int, item_ids: List[int], mix: Dict[str, int], deadline: float,
+                 think_time: float, rng: random.Random, results: Results):
+    headers = {"Authorization": f"Bearer {forge_init_data(user_id)}"}
+    names, weights = list(mix), list(mix.values())
+
+    while time.perf_counter() < deadline:
+        action = rng.choices(names, weights)[0]
+        method, path, _ = ACTIONS[action]
+        kwargs: Dict[str, Any] = {"headers": headers}
+        if action == "buy":
+            kwargs["json"] = {"item_id": rng.choice(item_ids), "quantity": 1}
+
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+            outcome = "5xx" if status >= 500 else "4xx" if status >= 400 else "ok"
+        except Exception:
+            outcome = "exception"
+        results.record(action, time.perf_counter() - started, outcome)
+
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+
+
+async def run(players: int, duration: float, think_time: float, ramp_up: float,
+              mix: Dict[str, int], inventory_size: int, seed: int) -> Dict[str, Any]:
+    import httpx
+    from backend.main import app
+    from database.connection import get_session, init_db
+    from benchmarks.seed import seed_catalog, seed_players
+
+    init_db()
+    session = get_session()
+    try:
+        item_ids = seed_catalog(session)
+        user_ids = seed_players(session, players, item_ids, inventory_size=inventory_size, seed=seed)
+    finally:
+        session.close()
+
+    results = Results()
+    rng = random.Random(seed)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            started = time.perf_counter()
+            deadline = started + duration
+
+            async def staggered(index: int, user_id: int):
+                if ramp_up:
+                    await asyncio.sleep(ramp_up * index / players)
+                await player(client, user_id, item_ids, mix, deadline, think_time,
+                             random.Random(rng.random()), results)
+
+            await asyncio.gather(*(staggered(i, uid) for i, uid in enumerate(user_ids)))
+            elapsed = time.perf_counter() - started
+
+    summary = results.summary(elapsed)
+    summary["config"] = {
+        "players": players, "duration_s": duration, "think_time_s": think_time,
+        "ramp_up_s": ramp_up, "mix": mix, "inventory_size": inventory_size, "seed": seed,
+    }
+    return summary
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        f"{summary['requests']} requests in {summary['duration_s']}s: {summary['rps']} req/s, "
+        f"p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms, "
+        f"errors {summary['errors']} ({summary['error_rate']}%)",
+        "",
+        f"{'endpoint':<28}{'reqs':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'4xx':>7}{'err %':>7}",
+    ]
+    for row in summary["endpoints"].values():
+        lines.append(
+            f"{row['endpoint']:<28}{row['requests']:>8}{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+            f"{row['p99_ms']:>9}{row['max_ms']:>9}{row['rejected_4xx']:>7}{row['error_rate']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test for the game API.")
+    parser.add_argument("--players", type=int, default=1000, help="virtual players")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between a player's actions (0 = none)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which players join")
+    parser.add_argument("--mix", type=parse_mix, default={name: w for name, (_, _, w) in ACTIONS.items()},
+                        help="action weights, e.g. click=60,sync=10,mine=8")
+    parser.add_argument("--inventory-size", type=int, default=2, help="items per seeded player")
+    parser.add_argument("--database-url", help="database to use (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the per-user API rate limits on")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if not args.database_url:
+        temp_dir = tempfile.TemporaryDirectory(prefix="nanocoin-loadtest-")
+        args.database_url = f"sqlite:///{os.path.join(temp_dir.name, 'loadtest.db')}"
+
+    # Must be set before config is imported; load_dotenv() doesn't override them
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["BOT_TOKEN"] = TEST_BOT_TOKEN
+    os.environ["BOT_WEBHOOK_MODE"] = "false"
+    # Off by default: virtual players would mostly measure the limiter, not the server
+    os.environ["RATE_LIMIT_ENABLED"] = "true" if args.rate_limit else "false"
+
+    try:
+        summary = asyncio.run(run(
+            args.players, args.duration, args.think_time, args.ramp_up,
+            args.mix, args.inventory_size, args.seed
+        ))
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    print(format_summary(summary))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Microbenchmarks for the game's hot functions.
+
+Each case is timed against seeded in-memory SQLite databases of several sizes,
+one call at a time. Every call gets a fresh session with the player already
+loaded, like a request would. Only the call itself is timed, and any changes are
+rolled back so every call sees the same state. Queries per call are counted with
+the same engine hooks that feed the /metrics endpoint.
+
+    python -m benchmarks.micro run --sizes 1000,10000,100000 --json before.json
+    python -m benchmarks.micro run --cases game_service.process_click --iterations 2000
+    python -m benchmarks.micro compare before.json after.json --threshold 10
+    python -m benchmarks.micro run --cases responses.leaderboard.orm,responses.leaderboard.payload
+
+compare prints the change per case and size. It exits with status 1 if any case
+got slower by more than the threshold, or now makes more queries per call.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import sqlalchemy
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import joinedload, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.metrics import RequestDBStats, install_query_metrics, request_db_stats
+from database.models import Base, Inventory, User
+from benchmarks.seed import CATALOG, seed_catalog, seed_players
+
+
+class Case(NamedTuple):
+    description: str
+    run: Callable  # (session, user, ctx) -> None; the only timed part
+
+
+def _game_process_click(session, user, ctx):
+    from backend.services.game_service import GameService
+    GameService.process_click(user, session)
+
+
+def _calculate_mining_rewards(session, user, ctx):
+    from backend.services.game_service import GameService
+    inventory = session.query(Inventory).options(joinedload(Inventory.item)).filter(
+        Inventory.user_id == user.user_id
+    ).all()
+    GameService.calculate_mining_rewards(user, inventory, session, datetime.now())
+
+
+def _claim_daily_reward(session, user, ctx):
+    from backend.services.game_service import GameService
+    GameService.claim_daily_reward(user, session)
+    session.flush()  # the UPDATE, as the purchase cases' change_balance runs it
+
+
+def _buy_item(session, user, ctx):
+    from backend.services.shop_service import ShopService
+    ShopService.buy_item(session, user.user_id, ctx["rng"].choice(ctx["item_ids"]), 1)
+
+
+def _logic_process_click(session, user, ctx):
+    from utils.game_logic import process_click
+    process_click(user, session)
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema):
+    from pydantic import TypeAdapter
+    return TypeAdapter(schema)  # FastAPI also builds the response field once per route
+
+
+def _validated_body(schema, content) -> bytes:
+    """What a route returning ORM objects costs: validate against response_model, dump, render."""
+    from fastapi.responses import JSONResponse
+    adapter = _adapter(schema)
+    value = adapter.validate_python(content, from_attributes=True)
+    return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+
+def _shop_items_orm(session, user, ctx):
+    from backend.schemas.shop import GameItemSchema
+    from backend.services.shop_service import ShopService
+    _validated_body(List[GameItemSchema], ShopService.get_all_items(session))
+
+
+def _shop_items_payload(session, user, ctx):
+    from fastapi.responses import ORJSONResponse
+    from backend import payloads
+    ORJSONResponse(payloads.shop_items(session)).body
+
+
+def _leaderboard_orm(session, user, ctx):
+    from backend.schemas.user import LeaderboardEntry
+    users = session.query(User).order_by(User.coins.desc()).limit(100).all()
+    entries = [
+        LeaderboardEntry(user_id=u.user_id, username=u.username, first_name=u.first_name,
+                         coins=u.coins, click_level=u.click_level, rank=rank)
+        for rank, u in enumerate(users, start=1)
+    ]
+    _validated_body(List[LeaderboardEntry], entries)
+
+
+def _leaderboard_payload(session, user, ctx):
+    from fastapi.responses import ORJSONResponse
+    from backend import payloads
+    ORJSONResponse(payloads.leaderboard(session, 100)).body
+
+
+def _inventory_payload(session, user, ctx):
+    from fastapi.responses import ORJSONResponse
+    from backend import payloads
+    ORJSONResponse(payloads.inventory(session, user.user_id)).body
+
+
+def _profile_orm(session, user, ctx):
+    from backend.schemas.user import UserProfile
+    session.expunge(user)  # the route starts from an empty session
+    _validated_body(UserProfile, session.query(User).filter(User.user_id == user.user_id).first())
+
+
+def _profile_payload(session, user, ctx):
+    from fastapi.responses import ORJSONResponse
+    from backend import payloads
+    session.expunge(user)
+    ORJSONResponse(payloads.user_profile(session, user.user_id)).body
+
+
+CASES: Dict[str, Case] = {
+    "game_service.process_click": Case("GameService.process_click", _game_process_click),
+    "game_service.calculate_mining_rewards": Case(
+        "inventory query + GameService.calculate_mining_rewards", _calculate_mining_rewards
+    ),
+    "game_service.claim_daily_reward": Case("GameService.claim_daily_reward", _claim_daily_reward),
+    "shop_service.buy_item": Case("ShopService.buy_item", _buy_item),
+    "game_logic.process_click": Case("utils.game_logic.process_click (bot)", _logic_process_click),
+    # GET endpoints: ORM objects + response_model validation vs column-tuple payloads + orjson
+    "responses.shop_items.orm": Case("GET /api/shop/items via ORM + response_model", _shop_items_orm),
+    "responses.shop_items.payload": Case("GET /api/shop/items via payloads.shop_items", _shop_items_payload),
+    "responses.leaderboard.orm": Case("GET /api/user/leaderboard via ORM + response_model", _leaderboard_orm),
+    "responses.leaderboard.payload": Case("GET /api/user/leaderboard via payloads.leaderboard",
+                                          _leaderboard_payload),
+    "responses.inventory.payload": Case("GET /api/shop/inventory via payloads.inventory", _inventory_payload),
+    "responses.profile.orm": Case("GET /api/user/profile via ORM + response_model", _profile_orm),
+    "responses.profile.payload": Case("GET /api/user/profile via payloads.user_profile", _profile_payload),
+}
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def build_database(players: int, inventory_size: int, seed: int):
+    """A seeded in-memory database; every player has two buff items equipped."""
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    install_query_metrics(engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    session = Session()
+    try:
+        item_ids = seed_catalog(session)
+        user_ids = seed_players(session, players, item_ids, inventory_size=inventory_size, seed=seed)
+        buffs = [item_id for item_id, item in zip(item_ids, CATALOG) if item["item_code"].startswith("BENCH_BUFF")]
+        session.execute(update(User).values(slot_1_id=buffs[0], slot_2_id=buffs[1]))
+        session.commit()
+    finally:
+        session.close()
+    return engine, Session, user_ids, item_ids
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def time_case(Session, case: Case, user_ids: List[int], item_ids: List[int],
+              iterations: int, warmup: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    ctx = {"rng": rng, "item_ids": item_ids}
+    timings = []
+    queries = 0
+
+    gc.collect()
+    for i in range(warmup + iterations):
+        session = Session()
+        try:
+            user = session.get(User, rng.choice(user_ids))
+            stats = RequestDBStats("benchmark")
+            token = request_db_stats.set(stats)
+            started = time.perf_counter_ns()
+            try:
+                case.run(session, user, ctx)
+            finally:
+                elapsed = time.perf_counter_ns() - started
+                request_db_stats.reset(token)
+            if i >= warmup:
+                timings.append(elapsed / 1000)
+                queries += stats.queries
+            session.rollback()
+        finally:
+            session.close()
+
+    timings.sort()
+    return {
+        "calls": iterations,
+        "mean_us": round(sum(timings) / iterations, 2),
+        "p50_us": round(_percentile(timings, 0.50), 2),
+        "p95_us": round(_percentile(timings, 0.95), 2),
+        "min_us": round(timings[0], 2),
+        "queries_per_call": round(queries / iterations, 2),
+    }
+
+
+def run(sizes, case_names, iterations: int, warmup: int, inventory_size: int, seed: int,
+        log=print) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Any]] = {name: {} for name in case_names}
+    for size in sizes:
+        started = time.perf_counter()
+        engine, Session, user_ids, item_ids = build_database(size, inventory_size, seed)
+        log(f"seeded {size} players in {time.perf_counter() - started:.1f}s")
+        try:
+            for name in case_names:
+                results[name][str(size)] = time_case(
+                    Session, CASES[name], user_ids, item_ids, iterations, warmup, seed
+                )
+        finally:
+            engine.dispose()
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "warmup": warmup,
+            "inventory_size": inventory_size,
+            "seed": seed,
+        },
+        "cases": {name: CASES[name].description for name in case_names},
+        "results": results,
+    }
+
+
+def format_results(report: Dict[str, Any]) -> str:
+    lines = [f"{'case':<40}{'players':>9}{'mean us':>11}{'p50 us':>11}{'p95 us':>11}{'queries':>9}"]
+    for name, by_size in report["results"].items():
+        for size, row in by_size.items():
+            lines.append(
+                f"{name:<40}{size:>9}{row['mean_us']:>11}{row['p50_us']:>11}{row['p95_us']:>11}"
+                f"{row['queries_per_call']:>9}"
+            )
+    return "\n".join(lines)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> Tuple[str, bool]:
+    """Side-by-side p50 and queries per call; returns (table, regressed)."""
+    lines = [
+        f"{'case':<40}{'players':>9}{'p50 before':>12}{'p50 after':>11}{'change':>9}"
+        f"{'queries':>13}"
+    ]
+    regressed = False
+    for name, by_size in current["results"].items():
+        for size, after in by_size.items():
+            before = baseline["results"].get(name, {}).get(size)
+            if before is None:
+                lines.append(f"{name:<40}{size:>9}{'-':>12}{after['p50_us']:>11}{'new':>9}")
+                continue
+            change = (after["p50_us"] - before["p50_us"]) / before["p50_us"] * 100 if before["p50_us"] else 0.0
+            queries = f"{before['queries_per_call']:g} -> {after['queries_per_call']:g}"
+            flag = ""
+            if change > threshold or after["queries_per_call"] > before["queries_per_call"]:
+                regressed = True
+                flag = "  REGRESSION"
+            lines.append(
+                f"{name:<40}{size:>9}{before['p50_us']:>12}{after['p50_us']:>11}{change:>+8.1f}%"
+                f"{queries:>13}{flag}"
+            )
+    return "\n".join(lines), regressed
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the game's hot functions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                            help="comma-separated player counts, one database each")
+    run_parser.add_argument("--cases", default=",".join(CASES),
+                            help=f"comma-separated subset of: {', '.join(CASES)}")
+    run_parser.add_argument("--iterations", type=int, default=1000, help="timed calls per case and size")
+    run_parser.add_argument("--warmup", type=int, default=50, help="untimed calls before measuring")
+    run_parser.add_argument("--inventory-size", type=int, default=2, help="items per seeded player")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="percent p50 slowdown counted as a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        table, regressed = compare(_load(args.baseline), _load(args.current), args.threshold)
+        print(table)
+        sys.exit(1 if regressed else 0)
+
+    case_names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in case_names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    report = run(sizes, case_names, args.iterations, args.warmup, args.inventory_size, args.seed)
+    print(format_results(report))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Synthetic game data for load tests and benchmarks.
+
+Everything is inserted in bulk with a seeded RNG, so the same arguments always
+produce the same database.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import insert
+from database.models import User, GameItem, Inventory, ItemType
+
+FIRST_PLAYER_ID = 10_000_000
+
+CATALOG = [
+    dict(name="Mini Miner", item_code="BENCH_MINER_1", item_type=ItemType.MINER, emoji="⛏", price_diamonds=5,
+         sell_price=2, mining_rate=10, electricity_consumption=1, miner_diamond_chance=0.01),
+    dict(name="GPU Rig", item_code="BENCH_MINER_2", item_type=ItemType.MINER, emoji="🖥", price_diamonds=20,
+         sell_price=8, mining_rate=50, electricity_consumption=4, miner_diamond_chance=0.02),
+    dict(name="ASIC Farm", item_code="BENCH_MINER_3", item_type=ItemType.MINER, emoji="🏭", price_diamonds=80,
+         sell_price=30, mining_rate=250, electricity_consumption=15, miner_diamond_chance=0.05),
+    dict(name="Lucky Charm", item_code="BENCH_BUFF_1", item_type=ItemType.BUFF, emoji="🍀", price_diamonds=15,
+         sell_price=5, buff_click_coins=1, buff_luck=0.01),
+    dict(name="Overclock", item_code="BENCH_BUFF_2", item_type=ItemType.BUFF, emoji="⚡", price_diamonds=30,
+         sell_price=10, buff_click_coins=3, buff_mining_speed=0.1),
+]
+
+
+def seed_catalog(session) -> List[int]:
+    """Add the benchmark shop items (once) and return their ids."""
+    codes = [item["item_code"] for item in CATALOG]
+    existing = {i.item_code: i.id for i in session.query(GameItem).filter(GameItem.item_code.in_(codes))}
+    missing = [item for item in CATALOG if item["item_code"] not in existing]
+    if missing:
+        session.execute(insert(GameItem), missing)
+        session.commit()
+        existing = {i.item_code: i.id for i in session.query(GameItem).filter(GameItem.item_code.in_(codes))}
+    return [existing[code] for code in codes]
+
+
+def seed_players(
+    session,
+    count: int,
+    item_ids: List[int],
+    inventory_size: int = 2,
+    diamonds: int = 1000,
+    first_id: int = FIRST_PLAYER_ID,
+    seed: int = 1,
+    batch_size: int = 5000,
+) -> List[int]:
+    """Insert `count` players with `inventory_size` items each; returns their user ids."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    user_ids = list(range(first_id, first_id + count))
+
+    if session.query(User.user_id).filter(User.user_id == first_id).first():
+        return user_ids  # seeded by an earlier run against the same database
+
+    for start in range(0, count, batch_size):
+        batch = user_ids[start:start + batch_size]
+        session.execute(insert(User), [
+            dict(
+                user_id=user_id,
+                username=f"player{user_id}",
+                first_name=f"Player {user_id}",
+                coins=int(rng.paretovariate(1.2) * 1000),
+                diamonds=diamonds,
+                click_level=rng.randint(1, 20),
+                # mining is claimable right away
+                last_mined_at=now - timedelta(minutes=rng.randint(5, 600)),
+            )
+            for user_id in batch
+        ])
+        if inventory_size and item_ids:
+            session.execute(insert(Inventory), [
+                dict(user_id=user_id, item_id=rng.choice(item_ids), quantity=1, is_active=True)
+                for user_id in batch
+                for _ in range(inventory_size)
+            ])
+        session.commit()
+
+    return user_ids
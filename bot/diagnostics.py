@@ -0,0 +1,114 @@
+"""
+Startup diagnostics: where the bot's cold-start import time goes.
+
+Imports the entry module in a fresh interpreter with ``-X importtime`` and
+summarizes the result:
+
+    python -m bot.diagnostics                       # the full bot (main)
+    python -m bot.diagnostics --module backend.main --top 30
+    python -m bot.diagnostics --json > startup.json # for tracking over time
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from handlers.lazy import LAZY_MODULES
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PREFIX = "import time:"
+
+
+def measure_imports(module: str) -> List[Dict[str, Any]]:
+    """Import `module` in a new interpreter and return one entry per imported module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_ROOT
+    )
+    lines = result.stderr.splitlines()
+    if result.returncode != 0:
+        errors = [line for line in lines if not line.startswith(_PREFIX)]
+        raise RuntimeError(f"Importing {module} failed: {errors[-1] if errors else result.returncode}")
+
+    entries = []
+    for line in lines:
+        if not line.startswith(_PREFIX):
+            continue
+        parts = line[len(_PREFIX):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        entries.append({
+            "module": stripped,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+            # -X importtime indents nested imports by two spaces per level
+            "depth": (len(name) - len(stripped) - 1) // 2,
+        })
+    return entries
+
+
+def build_report(module: str, top: int = 20) -> Dict[str, Any]:
+    entries = measure_imports(module)
+    imported = {entry["module"] for entry in entries}
+
+    packages = defaultdict(int)
+    for entry in entries:
+        packages[entry["module"].split(".")[0]] += entry["self_us"]
+
+    return {
+        "module": module,
+        "total_ms": round(sum(entry["self_us"] for entry in entries) / 1000, 1),
+        "module_count": len(entries),
+        "slowest_cumulative": sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top],
+        "slowest_self": sorted(entries, key=lambda e: e["self_us"], reverse=True)[:top],
+        "packages_ms": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+        "deferred": {name: name not in imported for name in LAZY_MODULES},
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Import time for {report['module']}: {report['total_ms']} ms ({report['module_count']} modules)",
+        "",
+        "Slowest by cumulative time:",
+    ]
+    for entry in report["slowest_cumulative"]:
+        lines.append(f"  {entry['cumulative_us'] / 1000:9.1f} ms  {'  ' * entry['depth']}{entry['module']}")
+
+    lines += ["", "Slowest by self time:"]
+    for entry in report["slowest_self"]:
+        lines.append(f"  {entry['self_us'] / 1000:9.1f} ms  {entry['module']}")
+
+    lines += ["", "Self time by top-level package:"]
+    for name, ms in report["packages_ms"].items():
+        lines.append(f"  {ms:9.1f} ms  {name}")
+
+    lines += ["", "Handlers loaded on first use:"]
+    for name, deferred in report["deferred"].items():
+        lines.append(f"  {name}: {'deferred' if deferred else 'IMPORTED AT STARTUP'}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report where bot startup import time goes.")
+    parser.add_argument("--module", default="main", help="entry module to import (default: main)")
+    parser.add_argument("--top", type=int, default=20, help="rows per section")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = build_report(args.module, args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
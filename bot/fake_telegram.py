@@ -0,0 +1,146 @@
+"""
+Local stand-in for the Telegram Bot API, for driving webhook mode in tests.
+
+FakeTelegramRequest answers the bot's outgoing API calls without network access
+and records them; FakeTelegramSender POSTs updates to the webhook route the way
+Telegram would.
+
+Example:
+    request = FakeTelegramRequest()
+    application = build_application(
+        ApplicationBuilder().token(BOT_TOKEN).request(request).get_updates_request(FakeTelegramRequest())
+    )
+    with TestClient(app) as client:
+        client.portal.call(start_webhook_application, application)
+        sender = FakeTelegramSender(client)
+        sender.send_command(42, "/start")
+        ...
+        assert request.calls_to("sendMessage")
+"""
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from telegram.request import BaseRequest, RequestData
+from backend.config import WEBHOOK_PATH
+from bot.webhook import get_webhook_secret
+
+FAKE_BOT_USER = {
+    "id": 1000000001,
+    "is_bot": True,
+    "first_name": "NanoCoin",
+    "username": "nanocoin_test_bot",
+}
+
+
+class FakeTelegramRequest(BaseRequest):
+    """BaseRequest that fakes Bot API responses and records every call."""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def calls_to(self, api_method: str) -> List[Dict[str, Any]]:
+        """Parameters of every recorded call to `api_method`."""
+        return [params for name, params in self.calls if name == api_method]
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append((api_method, params))
+        return 200, json.dumps({"ok": True, "result": self._result_for(api_method, params)}).encode()
+
+    def _result_for(self, api_method: str, params: Dict[str, Any]) -> Any:
+        if api_method == "getMe":
+            return FAKE_BOT_USER
+        if api_method == "getUpdates":
+            return []
+        if api_method in ("sendMessage", "editMessageText"):
+            return {
+                "message_id": params.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id"), "type": "private"},
+                "from": FAKE_BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+class FakeTelegramSender:
+    """Builds Telegram update payloads and POSTs them to the webhook route."""
+
+    def __init__(self, client, path: str = WEBHOOK_PATH, secret_token: Optional[str] = None):
+        """
+        Args:
+            client: Any client with a requests-style post(), e.g. fastapi.testclient.TestClient
+            path: Webhook route
+            secret_token: Secret header value; defaults to the configured one
+        """
+        self.client = client
+        self.path = path
+        self.secret_token = secret_token or get_webhook_secret()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id: int, first_name: str, username: Optional[str]) -> Dict[str, Any]:
+        user = {"id": user_id, "is_bot": False, "first_name": first_name}
+        if username:
+            user["username"] = username
+        return user
+
+    def send(self, update: Dict[str, Any]):
+        """POST a raw update dict; update_id is filled in if missing."""
+        update.setdefault("update_id", next(self._update_ids))
+        return self.client.post(
+            self.path,
+            json=update,
+            headers={"X-Telegram-Bot-Api-Secret-Token": self.secret_token}
+        )
+
+    def send_command(self, user_id: int, text: str, first_name: str = "Tester", username: Optional[str] = None):
+        """Send a private text message such as "/start"."""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id, first_name, username),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return self.send({"message": message})
+
+    def send_callback(self, user_id: int, data: str, message_id: int = 1, first_name: str = "Tester",
+                      username: Optional[str] = None):
+        """Send an inline keyboard button press with callback `data`."""
+        user = self._user(user_id, first_name, username)
+        return self.send({
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": FAKE_BOT_USER,
+                    "text": "",
+                },
+            }
+        })
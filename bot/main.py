@@ -1,10 +1,12 @@
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
-from backend.config import BOT_TOKEN, WEBAPP_URL
+from backend.config import BOT_TOKEN, WEBAPP_URL, BOT_WEBHOOK_MODE
 from database.connection import init_db
 from database.models import User
-from database.connection import get_session
+from database.executor import run_user_db
+from bot.rate_limiter import PriorityRateLimiter
+from config import BOT_CONNECTION_POOL_SIZE
 
 # Logging
 logging.basicConfig(
@@ -14,6 +16,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _ensure_user(session, user_id: int, username: str, first_name: str):
+    """Register the user if this is their first /start."""
+    db_user = session.query(User).filter(User.user_id == user_id).first()
+    
+    if not db_user:
+        db_user = User(
+            user_id=user_id,
+            username=username,
+            first_name=first_name
+        )
+        session.add(db_user)
+        logger.info(f"New user registered: {user_id} (@{username})")
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle /start command.
@@ -24,21 +40,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     first_name = update.effective_user.first_name
     
     # Ensure user exists in database
-    session = get_session()
-    try:
-        db_user = session.query(User).filter(User.user_id == user_id).first()
-        
-        if not db_user:
-            db_user = User(
-                user_id=user_id,
-                username=username,
-                first_name=first_name
-            )
-            session.add(db_user)
-            session.commit()
-            logger.info(f"New user registered: {user_id} (@{username})")
-    finally:
-        session.close()
+    await run_user_db(user_id, _ensure_user, user_id, username, first_name)
     
     # Create Web App button
     keyboard = [
@@ -67,18 +69,35 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error(f"Exception while handling an update: {context.error}")
 
 
+def build_application(builder: ApplicationBuilder = None):
+    """
+    Create the bot Application with all handlers registered.
+    
+    Used both for polling (main) and by the backend in webhook mode.
+    """
+    if builder is None:
+        builder = ApplicationBuilder().token(BOT_TOKEN).connection_pool_size(BOT_CONNECTION_POOL_SIZE)
+    application = builder.rate_limiter(PriorityRateLimiter()).build()
+    
+    # Register handlers
+    application.add_handler(CommandHandler("start", start))
+    application.add_error_handler(error_handler)
+    
+    return application
+
+
 def main():
     """Start the bot."""
+    if BOT_WEBHOOK_MODE:
+        logger.info("BOT_WEBHOOK_MODE is enabled - updates are served by backend.main, not polling")
+        return
+    
     # Initialize Database
     init_db()
     logger.info("Database initialized")
     
     # Create application
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    
-    # Register handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_error_handler(error_handler)
+    application = build_application()
     
     # Run bot
     logger.info("Bot started - Telegram Web App launcher mode")
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    BOT_OUTBOUND_PER_SECOND, BOT_OUTBOUND_CHAT_PER_SECOND, BOT_OUTBOUND_GROUP_PER_MINUTE,
+    BOT_OUTBOUND_CHAT_BURST, BOT_OUTBOUND_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, passed to bot methods as ``rate_limit_args``. Lower goes first.
+PRIORITY_INTERACTIVE = 0  # replies to the user who is waiting on them (default)
+PRIORITY_ADMIN = 1        # notifications to admins
+PRIORITY_BROADCAST = 2    # broadcasts and other bulk jobs
+
+LANE_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_ADMIN: "admin",
+    PRIORITY_BROADCAST: "broadcast",
+}
+
+# Endpoints that post into a chat and count against Telegram's per-chat limits
+_CHAT_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+_MAX_TRACKED_CHATS = 10000
+
+
+class _LaneStats:
+    __slots__ = ("queued", "sent", "failed", "retries", "total_wait", "max_wait", "total_latency")
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_latency = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        done = self.sent + self.failed
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "avg_wait_ms": round(self.total_wait / done * 1000, 2) if done else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_latency_ms": round(self.total_latency / done * 1000, 2) if done else 0.0,
+        }
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """One outbound budget shared by every Bot API call of the application.
+
+    Requests first wait for their chat's own limit (sending/editing endpoints only),
+    then queue for the global budget, which is handed out strictly by lane:
+    interactive replies, then admin notifications, then broadcasts. A RetryAfter
+    pauses the whole queue for the requested time before the call is retried.
+    """
+
+    def __init__(
+        self,
+        overall_per_second: float = BOT_OUTBOUND_PER_SECOND,
+        chat_per_second: float = BOT_OUTBOUND_CHAT_PER_SECOND,
+        group_per_minute: float = BOT_OUTBOUND_GROUP_PER_MINUTE,
+        chat_burst: int = BOT_OUTBOUND_CHAT_BURST,
+        max_retries: int = BOT_OUTBOUND_MAX_RETRIES,
+    ):
+        self._overall_rate = overall_per_second
+        self._overall_burst = max(1.0, overall_per_second)
+        self._chat_interval = 1.0 / chat_per_second
+        self._group_interval = 60.0 / group_per_minute
+        self._chat_burst = max(1, chat_burst)
+        self._max_retries = max_retries
+
+        self._tokens = self._overall_burst
+        self._tokens_updated = time.monotonic()
+        self._paused_until = 0.0
+        # Theoretical arrival time per chat (GCRA)
+        self._chat_tat: Dict[Union[int, str], float] = {}
+
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._lanes = {priority: _LaneStats() for priority in LANE_NAMES}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ):
+        priority = rate_limit_args if rate_limit_args in self._lanes else PRIORITY_INTERACTIVE
+        lane = self._lanes[priority]
+        chat_id = data.get("chat_id") if endpoint.startswith(_CHAT_LIMITED_PREFIXES) else None
+        started = time.monotonic()
+
+        for attempt in itertools.count():
+            if chat_id is not None:
+                await self._wait_for_chat(chat_id)
+            await self._wait_for_global(priority)
+
+            if attempt == 0:
+                waited = time.monotonic() - started
+                lane.total_wait += waited
+                lane.max_wait = max(lane.max_wait, waited)
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= self._max_retries:
+                    self._finish(lane, started, failed=True)
+                    raise
+                lane.retries += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(
+                    f"Flood limit on {endpoint} ({LANE_NAMES[priority]}): "
+                    f"retrying in {e.retry_after}s (attempt {attempt + 1}/{self._max_retries})"
+                )
+            except Exception:
+                self._finish(lane, started, failed=True)
+                raise
+            else:
+                self._finish(lane, started)
+                return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and latency per lane."""
+        return {
+            "lanes": {LANE_NAMES[p]: lane.as_dict() for p, lane in self._lanes.items()},
+            "queue_depth": len(self._queue),
+            "tracked_chats": len(self._chat_tat),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+        }
+
+    @staticmethod
+    def _finish(lane: _LaneStats, started: float, failed: bool = False):
+        lane.total_latency += time.monotonic() - started
+        if failed:
+            lane.failed += 1
+        else:
+            lane.sent += 1
+
+    async def _wait_for_chat(self, chat_id: Union[int, str]):
+        # Negative ids and @usernames are groups/channels, which have a tighter limit
+        is_group = not isinstance(chat_id, int) or chat_id < 0
+        interval = self._group_interval if is_group else self._chat_interval
+
+        now = time.monotonic()
+        tat = max(self._chat_tat.get(chat_id, now), now)
+        self._chat_tat[chat_id] = tat + interval
+        if len(self._chat_tat) > _MAX_TRACKED_CHATS:
+            self._chat_tat = {k: v for k, v in self._chat_tat.items() if v > now}
+
+        delay = tat - (self._chat_burst - 1) * interval - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _wait_for_global(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._lanes[priority].queued += 1
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        finally:
+            self._lanes[priority].queued -= 1
+
+    async def _dispatch(self):
+        try:
+            while self._queue:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._overall_burst,
+                    self._tokens + (now - self._tokens_updated) * self._overall_rate
+                )
+                self._tokens_updated = now
+
+                delay = self._paused_until - now
+                if delay <= 0 and self._tokens < 1:
+                    delay = (1 - self._tokens) / self._overall_rate
+                if delay > 0:
+                    # Re-check afterwards: a higher-priority request may have arrived
+                    await asyncio.sleep(delay)
+                    continue
+
+                _, _, future = heapq.heappop(self._queue)
+                if future.done():
+                    continue
+                self._tokens -= 1
+                future.set_result(None)
+        finally:
+            self._dispatcher = None
@@ -0,0 +1,141 @@
+"""
+Per-user ordered, cross-user concurrent update processing.
+
+python-telegram-bot 20.3 handles updates one at a time unless concurrent_updates
+is enabled, and then it gives no ordering guarantee at all. This Application
+subclass keeps one FIFO per user: a user's updates run strictly in arrival
+order, while different users' updates run concurrently up to a global cap.
+
+Usage:
+    ApplicationBuilder().token(BOT_TOKEN).application_class(
+        PerUserOrderedApplication, kwargs={"max_concurrency": 32}
+    ).build()
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+from telegram import Update
+from telegram.ext import Application
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BOT_UPDATES = registry.counter("bot_updates_total", "Bot updates handled.", ("result",))
+BOT_UPDATE_WAIT = registry.histogram("bot_update_queue_wait_seconds", "Time a bot update waited for a processing slot.")
+BOT_UPDATE_DURATION = registry.histogram("bot_update_duration_seconds", "Time spent handling a bot update.")
+
+
+class UpdateProcessorStats:
+    """Counters describing the per-user update queues."""
+
+    def __init__(self):
+        self.pending = 0  # accepted but not yet started
+        self.active = 0  # currently inside handlers
+        self.processed = 0
+        self.failed = 0
+        self.max_pending = 0
+        self.max_user_depth = 0  # deepest backlog of a single user
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        started = self.processed + self.failed + self.active
+        return {
+            "pending": self.pending,
+            "active": self.active,
+            "processed": self.processed,
+            "failed": self.failed,
+            "max_pending": self.max_pending,
+            "max_user_depth": self.max_user_depth,
+            "avg_wait_ms": round(self.total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class PerUserOrderedApplication(Application):
+    """Application that serializes updates per user and runs users in parallel."""
+
+    def __init__(self, max_concurrency: int = 32, **kwargs):
+        super().__init__(**kwargs)
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.BoundedSemaphore(max_concurrency)
+        self._user_queues: Dict[Hashable, Deque[Tuple[object, float]]] = {}
+        self.processor_stats = UpdateProcessorStats()
+
+    @staticmethod
+    def ordering_key(update: object) -> Optional[Hashable]:
+        """Updates sharing a key are processed in order; None means unordered."""
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+            if update.effective_chat:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    def get_processor_stats(self) -> Dict[str, Any]:
+        """Queue depth and latency counters, including the incoming update_queue."""
+        stats = self.processor_stats.as_dict()
+        stats["queued_users"] = len(self._user_queues)
+        stats["update_queue"] = self.update_queue.qsize()
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+    async def process_update(self, update: object) -> None:
+        """
+        Schedule an update instead of running it inline.
+
+        Called by the update fetcher in arrival order; returns as soon as the
+        update is queued behind the same user's earlier updates.
+        """
+        stats = self.processor_stats
+        stats.pending += 1
+        stats.max_pending = max(stats.max_pending, stats.pending)
+        item = (update, time.monotonic())
+
+        key = self.ordering_key(update)
+        if key is None:
+            self.create_task(self._run_update(*item))
+            return
+
+        queue = self._user_queues.get(key)
+        if queue is not None:
+            queue.append(item)
+            stats.max_user_depth = max(stats.max_user_depth, len(queue))
+            return
+
+        self._user_queues[key] = deque([item])
+        self.create_task(self._drain_user_queue(key))
+
+    async def _drain_user_queue(self, key: Hashable) -> None:
+        queue = self._user_queues[key]
+        try:
+            while queue:
+                update, enqueued_at = queue.popleft()
+                await self._run_update(update, enqueued_at)
+        finally:
+            del self._user_queues[key]
+
+    async def _run_update(self, update: object, enqueued_at: float) -> None:
+        stats = self.processor_stats
+        async with self._slots:
+            wait = time.monotonic() - enqueued_at
+            stats.pending -= 1
+            stats.active += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            BOT_UPDATE_WAIT.observe(wait)
+            started = time.perf_counter()
+            try:
+                await super().process_update(update)
+                stats.processed += 1
+                BOT_UPDATES.inc(("ok",))
+            except Exception as e:
+                # process_update already routes handler errors to the error handlers
+                stats.failed += 1
+                BOT_UPDATES.inc(("failed",))
+                logger.error(f"Failed to process update: {e}")
+            finally:
+                stats.active -= 1
+                BOT_UPDATE_DURATION.observe(time.perf_counter() - started)
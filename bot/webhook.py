@@ -0,0 +1,109 @@
+"""
+Webhook runner for the Telegram bot.
+
+With BOT_WEBHOOK_MODE enabled the bot Application lives inside the FastAPI
+process: updates POSTed by Telegram to WEBHOOK_PATH are pushed straight into
+Application.update_queue, so HTTP and bot traffic share one DB pool and one
+set of in-process caches. The background jobs (jobs/background_jobs.py) run in
+this process too, as main.py's polling entry point runs them there.
+
+Webhook mode refuses to start without a secret: WEBHOOK_SECRET_TOKEN, or one
+derived from BOT_TOKEN.
+"""
+import hashlib
+import importlib
+import logging
+from typing import Callable, Dict, Optional
+from telegram import Update
+from telegram.ext import Application
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from jobs.background_jobs import setup_jobs
+from backend.config import (
+    BOT_TOKEN, BOT_APPLICATION_FACTORY, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+)
+
+logger = logging.getLogger(__name__)
+
+_application: Optional[Application] = None
+_scheduler: Optional[AsyncIOScheduler] = None
+
+
+def get_webhook_secret() -> str:
+    """Secret Telegram echoes back in X-Telegram-Bot-Api-Secret-Token."""
+    if WEBHOOK_SECRET_TOKEN:
+        return WEBHOOK_SECRET_TOKEN
+    if not BOT_TOKEN:
+        raise RuntimeError("Webhook mode needs WEBHOOK_SECRET_TOKEN or BOT_TOKEN to derive its secret from")
+    return hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()[:32]
+
+
+def load_application_factory() -> Callable[[], Application]:
+    """Resolve BOT_APPLICATION_FACTORY ("module:function")."""
+    module_name, _, attr = BOT_APPLICATION_FACTORY.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr or "build_application")
+
+
+def get_application() -> Optional[Application]:
+    """Return the running webhook Application, if any."""
+    return _application
+
+
+async def start_webhook_application(application: Optional[Application] = None) -> Application:
+    """
+    Initialize and start the bot Application without polling.
+
+    Args:
+        application: Prebuilt Application (e.g. one using a fake request in tests).
+            Defaults to the one built by BOT_APPLICATION_FACTORY.
+    """
+    global _application, _scheduler
+
+    secret = get_webhook_secret()
+
+    if application is None:
+        application = load_application_factory()()
+
+    await application.initialize()
+    await application.start()
+
+    if WEBHOOK_URL:
+        url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+        await application.bot.set_webhook(
+            url=url,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Telegram webhook registered: {url}")
+
+    # Background jobs, as main.py's polling entry point runs them
+    _scheduler = AsyncIOScheduler()
+    setup_jobs(_scheduler)
+    _scheduler.start()
+
+    _application = application
+    return application
+
+
+async def stop_webhook_application():
+    """Stop the webhook Application, letting queued updates drain first."""
+    global _application, _scheduler
+
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+
+    if _application is None:
+        return
+
+    application = _application
+    _application = None
+    await application.stop()
+    await application.shutdown()
+
+
+async def feed_update(data: Dict) -> Update:
+    """Decode a raw Telegram update and hand it to the Application."""
+    update = Update.de_json(data, _application.bot)
+    await _application.update_queue.put(update)
+    return update
@@ -7,6 +7,64 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_IDS = [int(id_.strip()) for id_ in os.getenv("ADMIN_IDS", "").split(",") if id_.strip()]
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///nanocoin.db")
+# true = updates reach the bot by webhook through the backend (backend.main), never by polling
+BOT_WEBHOOK_MODE = os.getenv("BOT_WEBHOOK_MODE", "false").lower() == "true"
+
+# Admin settings cache: how often other processes' changes are picked up
+SETTINGS_VERSION_CHECK_SECONDS = float(os.getenv("SETTINGS_VERSION_CHECK_SECONDS", "5"))
+
+# Bot update processing: max updates handled at once (each user's updates stay in order)
+BOT_MAX_CONCURRENT_UPDATES = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "32"))
+
+# Threads running blocking DB work for bot handlers
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "8"))
+
+# SQLite production profile: pragmas set on every connection (WAL and synchronous=NORMAL
+# always), and whether writes go through the single writer thread that group-commits them
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "true").lower() == "true"
+SQLITE_WRITE_BATCH_SIZE = int(os.getenv("SQLITE_WRITE_BATCH_SIZE", "128"))
+
+# SQLite only: split users, inventory and user_quests by user id across this many files
+# next to DATABASE_URL's (nanocoin.shard0.db, ...); 1 keeps everything in one file
+SQLITE_SHARDS = int(os.getenv("SQLITE_SHARDS", "1"))
+# Times a shard's write batch is run before giving up when it couldn't lock the shared file
+SQLITE_WRITE_RETRIES = int(os.getenv("SQLITE_WRITE_RETRIES", "3"))
+
+# Heavy admin statistics and reports read a copy of the database refreshed every this many
+# seconds (SQLite online backup, database/snapshot.py); 0 reads the live database instead.
+# Other databases read ANALYTICS_DATABASE_URL (e.g. a replica) if set, else the live one,
+# in read-only transactions.
+ANALYTICS_SNAPSHOT_INTERVAL = int(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "300"))
+ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL", "")
+
+# Players' state_version kept in memory by database/state_versions.py: how many, and how
+# long one read from the database is trusted (other processes' changes show up after that)
+STATE_VERSION_CACHE_SIZE = int(os.getenv("STATE_VERSION_CACHE_SIZE", "100000"))
+STATE_VERSION_CHECK_SECONDS = float(os.getenv("STATE_VERSION_CHECK_SECONDS", "5"))
+
+# Minimum seconds between profile re-renders of the same bot message
+BOT_PROFILE_EDIT_INTERVAL = float(os.getenv("BOT_PROFILE_EDIT_INTERVAL", "1.0"))
+
+# Outbound Telegram requests: one budget shared by handlers, admin notifications and broadcasts
+BOT_CONNECTION_POOL_SIZE = int(os.getenv("BOT_CONNECTION_POOL_SIZE", "32"))
+BOT_OUTBOUND_PER_SECOND = float(os.getenv("BOT_OUTBOUND_PER_SECOND", "30"))
+BOT_OUTBOUND_CHAT_PER_SECOND = float(os.getenv("BOT_OUTBOUND_CHAT_PER_SECOND", "1"))
+BOT_OUTBOUND_GROUP_PER_MINUTE = float(os.getenv("BOT_OUTBOUND_GROUP_PER_MINUTE", "20"))
+BOT_OUTBOUND_CHAT_BURST = int(os.getenv("BOT_OUTBOUND_CHAT_BURST", "3"))
+BOT_OUTBOUND_MAX_RETRIES = int(os.getenv("BOT_OUTBOUND_MAX_RETRIES", "3"))
+
+# Slow query log / N+1 detector: log statements slower than SLOW_QUERY_MS, flag a request
+# running the same statement shape more than N_PLUS_ONE_THRESHOLD times (0 disables)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Backend metrics read by the admin monitoring screens
+METRICS_URL = os.getenv("METRICS_URL", "http://127.0.0.1:8000/metrics")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 # Game Constants
 MAX_ENERGY = 1000
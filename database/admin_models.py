@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, Float
 from sqlalchemy.orm import relationship, DeclarativeBase
 from sqlalchemy.sql import func
 import datetime
@@ -213,7 +213,7 @@ class DailyStats(Base):
     __tablename__ = 'daily_stats'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    stat_date = Column(DateTime, default=func.now().date())
+    stat_date = Column(DateTime, default=func.current_date())
     new_users = Column(Integer, default=0)
     active_users = Column(Integer, default=0)
     total_messages = Column(BigInteger, default=0)
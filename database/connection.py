@@ -1,17 +1,179 @@
-from sqlalchemy import create_engine
+import logging
+from typing import Optional
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, scoped_session
 from database.models import Base
 from database.admin_models import Base as AdminBase
-from config import DATABASE_URL
+from database.metrics import install_query_metrics
+from config import (
+    DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_WRITE_QUEUE
+)
 
-engine = create_engine(DATABASE_URL)
+logger = logging.getLogger(__name__)
+
+
+def sqlite_file(url) -> Optional[str]:
+    """The database file of a SQLite URL, or None (another database, or in-memory)."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+def install_sqlite_pragmas(engine, read_only: bool = False):
+    """Production pragmas on every new connection of a SQLite engine."""
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.close()
+
+
+def install_explicit_transactions(engine, lock_table: Optional[str] = None):
+    """
+    Let SQLAlchemy, not pysqlite, start transactions, with BEGIN IMMEDIATE.
+
+    pysqlite only begins a transaction before DML, which breaks SAVEPOINTs and
+    lets a transaction that read first fail on upgrading to a write lock instead
+    of waiting busy_timeout for it.
+
+    BEGIN IMMEDIATE also takes the write lock of every attached file. With
+    `lock_table`, the transaction instead begins deferred and takes only the main
+    file's write lock, with an UPDATE of no rows of that table; an attached file
+    is then locked only once something is written to it. A connection with the
+    `lock_attached` execution option still begins IMMEDIATE.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        if lock_table is None or connection.get_execution_options().get("lock_attached"):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            connection.exec_driver_sql("BEGIN")
+            connection.exec_driver_sql(f"UPDATE main.{lock_table} SET rowid = rowid WHERE 0")
+
+
+def install_attached(engine, path: str, name: str, read_only: bool = False, immutable: bool = False):
+    """
+    ATTACH another SQLite file as `name` on every connection. Tables the main
+    file doesn't have resolve to it without a schema prefix. An `immutable` file
+    (one that is never written in place) is read without taking any locks.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_connection, connection_record):
+        if immutable:
+            target = f"file:{path}?mode=ro&immutable=1"
+        else:
+            target = f"file:{path}?mode=ro" if read_only else path
+        dbapi_connection.execute(f"ATTACH DATABASE ? AS {name}", (target,))
+        if not (read_only or immutable):
+            dbapi_connection.execute(f"PRAGMA {name}.synchronous=NORMAL")
+
+
+def create_sqlite_engines(url, attach: Optional[str] = None, lock_table: Optional[str] = None):
+    """
+    (engine, read_engine, writer_engine) for a SQLite file: WAL on every
+    connection, reads on their own read-only connections, and (SQLITE_WRITE_QUEUE)
+    the one connection that queued units of work are written through; see
+    database/writer.py. `attach` is another file attached as `shared`, and
+    `lock_table` a table of this file the writer locks it through (see
+    install_explicit_transactions).
+    """
+    url = make_url(url)
+    path = url.database
+
+    engine = create_engine(url)
+    install_sqlite_pragmas(engine)
+
+    read_engine = create_engine(url.set(database=f"file:{path}", query={"mode": "ro", "uri": "true"}))
+    install_sqlite_pragmas(read_engine, read_only=True)
+
+    writer_engine = None
+    if SQLITE_WRITE_QUEUE:
+        writer_engine = create_engine(url, pool_size=1, max_overflow=0)
+        install_explicit_transactions(writer_engine, lock_table=lock_table)
+        install_sqlite_pragmas(writer_engine)
+
+    for each in (engine, read_engine, writer_engine):
+        if each is None:
+            continue
+        if attach:
+            install_attached(each, attach, "shared", read_only=each is read_engine)
+        install_query_metrics(each)
+    return engine, read_engine, writer_engine
+
+
+DATABASE_FILE = sqlite_file(DATABASE_URL)
+
+if DATABASE_FILE is not None:
+    engine, read_engine, writer_engine = create_sqlite_engines(DATABASE_URL)
+else:
+    engine = create_engine(DATABASE_URL)
+    install_query_metrics(engine)
+    read_engine, writer_engine = engine, None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Columns added to tables that already exist in deployed databases.
+# create_all only creates missing tables, so these are added with ALTER TABLE.
+ADDED_COLUMNS = {
+    "users": {"state_version": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+def add_missing_columns(bind=engine):
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    logger.info(f"Adding column {table}.{name}")
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
 
 def init_db():
+    # The ledger first, so players already here get their opening balance in it
+    from database.ledger import open_ledger
+    open_ledger(engine)
     # Create all tables from models
     Base.metadata.create_all(bind=engine)
     # Create all tables from admin_models
     AdminBase.metadata.create_all(bind=engine)
+    add_missing_columns()
+    # Per-player tables in their shard files, if sharded
+    from database.shards import init_shards
+    init_shards()
 
 def get_session():
     return SessionLocal()
+
+def get_db():
+    """FastAPI dependency: one session per request, closed when the response is done."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def get_read_db():
+    """FastAPI dependency like get_db, on a read-only connection (writes go through run_db)."""
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from sqlalchemy.orm import Session
+from database.connection import get_session
+from database.metrics import unit_of_work_stats
+from database.shards import shard_for
+from database.writer import write_queue
+from config import DB_THREAD_POOL_SIZE
+
+# Bounded pool for blocking SQLAlchemy work, so the event loop only does network I/O
+_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+
+
+def _unit_of_work(fn: Callable, args: tuple, kwargs: dict, session_factory: Callable[[], Session] = get_session) -> Any:
+    # Scope for the query log's N+1 detector, like one HTTP request
+    with unit_of_work_stats(fn):
+        session = session_factory()
+        try:
+            result = fn(session, *args, **kwargs)
+            session.commit()
+            return result
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+async def run_in_db_thread(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking callable on the DB thread pool (in the caller's context, for its query stats)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run fn(session, *args, **kwargs) as one unit of work on the DB thread pool,
+    or on the SQLite writer thread when there is one (database/writer.py).
+
+    The session is committed when fn returns and rolled back if it raises; fn
+    may also roll back itself to discard its changes. fn must return plain data
+    (ids, dicts, formatted text), not ORM objects, since the session is closed
+    before the result reaches the caller.
+    """
+    if write_queue is not None:
+        return await asyncio.wrap_future(write_queue.submit(fn, *args, **kwargs))
+    return await run_in_db_thread(_unit_of_work, fn, args, kwargs)
+
+
+async def run_user_db(user_id: int, fn: Callable, *args, **kwargs) -> Any:
+    """
+    run_db on the shard holding `user_id`'s rows (database/shards.py); the same
+    as run_db without sharding. Use it for any unit of work on one player.
+    """
+    shard = shard_for(user_id)
+    if shard is None:
+        return await run_db(fn, *args, **kwargs)
+    if shard.write_queue is not None:
+        return await asyncio.wrap_future(shard.write_queue.submit(fn, *args, **kwargs))
+    return await run_in_db_thread(_unit_of_work, fn, args, kwargs, shard.SessionLocal)
@@ -0,0 +1,195 @@
+"""
+Append-only ledger of every change to a player's coins and diamonds.
+
+Code that changes a balance also calls record(session, user_id, reason, ...)
+with the same amounts (change_balance() in database/queries.py does it when
+given a reason). Entries are kept on the session, not written one by one:
+when the session commits, all of them go into economy_ledger with one
+executemany INSERT, in the same transaction as the balances. A rollback, or a
+SAVEPOINT rolled back around them, drops them with the changes they describe.
+Entries of one commit with the same player, reason and ref_id are added up
+into one row, so e.g. a batch of game-socket clicks is a single "click" row.
+
+The ledger lives next to the users table, so in each shard with sharding
+(database/shards.py). When it is first created, each player's balance at that
+moment is recorded as an "opening" entry, so the ledger accounts for all of it.
+
+    python -m database.ledger verify            # players whose balance the ledger doesn't add up to
+    python -m database.ledger replay USER_ID    # one player's entries with the running balance
+"""
+import logging
+import sys
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import event, func, inspect, literal, or_, select
+from sqlalchemy.orm import Session, SessionTransaction
+from database.models import User, LedgerEntry
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Reason codes
+OPENING = "opening"
+CLICK = "click"
+MINE = "mine"
+DAILY = "daily"
+QUEST = "quest"
+ENERGY_REFILL = "energy_refill"
+BOOST = "boost"
+SHOP_BUY = "shop_buy"
+SHOP_SELL = "shop_sell"
+MARKET_BUY = "market_buy"
+MARKET_REFUND = "market_refund"
+MARKET_SALE = "market_sale"
+CASINO = "casino"
+ADMIN = "admin"
+
+LEDGER_ROWS = registry.counter(
+    "economy_ledger_rows_total", "Rows written to the economy ledger, by reason.", ("reason",)
+)
+
+_PENDING = "ledger_pending"
+
+
+def record(session: Session, user_id: int, reason: str, coins: int = 0, diamonds: int = 0,
+           ref_id: Optional[int] = None):
+    """Note a balance change made in `session`; it is written when the session commits."""
+    if not coins and not diamonds:
+        return
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault(_PENDING, []).append(
+        (transaction, user_id, reason, ref_id, coins, diamonds, datetime.now())
+    )
+
+
+def _rows(pending: list) -> list:
+    rows = {}
+    for _, user_id, reason, ref_id, coins, diamonds, ts in pending:
+        row = rows.get((user_id, reason, ref_id))
+        if row is None:
+            rows[(user_id, reason, ref_id)] = {
+                "user_id": user_id, "delta_coins": coins, "delta_diamonds": diamonds,
+                "reason": reason, "ref_id": ref_id, "ts": ts
+            }
+        else:
+            row["delta_coins"] += coins
+            row["delta_diamonds"] += diamonds
+    return [row for row in rows.values() if row["delta_coins"] or row["delta_diamonds"]]
+
+
+def _within(transaction: Optional[SessionTransaction], ended: SessionTransaction) -> bool:
+    while transaction is not None:
+        if transaction is ended:
+            return True
+        transaction = transaction.parent
+    return ended.parent is None
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    rows = _rows(pending)
+    if rows:
+        session.execute(LedgerEntry.__table__.insert(), rows)
+        for row in rows:
+            LEDGER_ROWS.inc((row["reason"],))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back(session, previous_transaction):
+    pending = session.info.get(_PENDING)
+    if pending:
+        session.info[_PENDING] = [entry for entry in pending if not _within(entry[0], previous_transaction)]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_unwritten(session, transaction):
+    # A session closed without committing
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def open_ledger(bind):
+    """Create the ledger table if it is missing, with every player's balance as an opening entry."""
+    if inspect(bind).has_table(LedgerEntry.__tablename__):
+        return
+    with bind.begin() as connection:
+        LedgerEntry.__table__.create(connection)
+        if not inspect(connection).has_table(User.__tablename__):
+            return
+        result = connection.execute(LedgerEntry.__table__.insert().from_select(
+            ["user_id", "delta_coins", "delta_diamonds", "reason", "ts"],
+            select(
+                User.user_id, func.coalesce(User.coins, 0), func.coalesce(User.diamonds, 0),
+                literal(OPENING), func.now()
+            ).where(or_(User.coins != 0, User.diamonds != 0))
+        ))
+        logger.info(f"Economy ledger created with {result.rowcount} opening balances")
+
+
+def _differences(session) -> List[Tuple[int, int, int, int, int]]:
+    totals = select(
+        LedgerEntry.user_id,
+        func.sum(LedgerEntry.delta_coins).label("coins"),
+        func.sum(LedgerEntry.delta_diamonds).label("diamonds")
+    ).group_by(LedgerEntry.user_id).subquery()
+    balance_coins, balance_diamonds = func.coalesce(User.coins, 0), func.coalesce(User.diamonds, 0)
+    ledger_coins, ledger_diamonds = func.coalesce(totals.c.coins, 0), func.coalesce(totals.c.diamonds, 0)
+    return [tuple(row) for row in session.execute(
+        select(User.user_id, balance_coins, balance_diamonds, ledger_coins, ledger_diamonds)
+        .outerjoin(totals, totals.c.user_id == User.user_id)
+        .where(or_(balance_coins != ledger_coins, balance_diamonds != ledger_diamonds))
+        .order_by(User.user_id)
+    )]
+
+
+def verify() -> List[Tuple[int, int, int, int, int]]:
+    """(user_id, coins, diamonds, ledger coins, ledger diamonds) of every player whose balance differs from their ledger sum."""
+    from database.shards import scatter
+    return [row for rows in scatter(_differences) for row in rows]
+
+
+def replay(user_id: int) -> Tuple[List[Tuple[LedgerEntry, int, int]], Optional[User]]:
+    """The player's entries in order, each with the balance it leaves, and the player's row."""
+    from database.shards import get_user_read_session
+    session = get_user_read_session(user_id)
+    try:
+        coins = diamonds = 0
+        history = []
+        for entry in session.query(LedgerEntry).filter(LedgerEntry.user_id == user_id).order_by(LedgerEntry.id):
+            coins += entry.delta_coins
+            diamonds += entry.delta_diamonds
+            history.append((entry, coins, diamonds))
+        return history, session.get(User, user_id)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["verify"]:
+        differences = verify()
+        for user_id, coins, diamonds, ledger_coins, ledger_diamonds in differences:
+            print(f"{user_id}: coins {coins} (ledger {ledger_coins}), diamonds {diamonds} (ledger {ledger_diamonds})")
+        print(f"{len(differences)} players differ from the ledger")
+        sys.exit(1 if differences else 0)
+    elif len(sys.argv) == 3 and sys.argv[1] == "replay" and sys.argv[2].lstrip("-").isdigit():
+        history, user = replay(int(sys.argv[2]))
+        for entry, coins, diamonds in history:
+            flag = "  <- negative" if coins < 0 or diamonds < 0 else ""
+            print(
+                f"{entry.ts:%Y-%m-%d %H:%M:%S} {entry.reason:<14} ref={entry.ref_id} "
+                f"{entry.delta_coins:+} coins {entry.delta_diamonds:+} diamonds -> {coins} / {diamonds}{flag}"
+            )
+        if user is None:
+            print("player not found")
+            sys.exit(1)
+        coins, diamonds = (history[-1][1], history[-1][2]) if history else (0, 0)
+        ok = (user.coins or 0, user.diamonds or 0) == (coins, diamonds)
+        print(f"balance {user.coins} / {user.diamonds}: {'matches the ledger' if ok else 'DIFFERS from the ledger'}")
+        sys.exit(0 if ok else 1)
+    else:
+        print("usage: python -m database.ledger verify | replay USER_ID")
+        sys.exit(2)
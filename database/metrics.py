@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from database.query_log import query_log
+from utils.metrics import registry
+
+DB_QUERIES = registry.counter("db_queries_total", "SQL statements executed.", ("statement",))
+DB_QUERY_DURATION = registry.histogram("db_query_duration_seconds", "SQL statement execution time.", ("statement",))
+
+_STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+class RequestDBStats:
+    """DB work done on behalf of one HTTP request or bot unit of work."""
+    __slots__ = ("label", "queries", "seconds", "shapes", "suspects")
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = {}  # statement shape -> executions, for the N+1 detector
+        self.suspects = {}
+
+
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+
+@contextmanager
+def unit_of_work_stats(fn):
+    """Scope for the query log's N+1 detector around a unit of work, unless an HTTP request's is active."""
+    if request_db_stats.get() is not None:
+        yield
+        return
+    token = request_db_stats.set(RequestDBStats(f"bot:{getattr(fn, '__name__', 'unit_of_work')}"))
+    try:
+        yield
+    finally:
+        request_db_stats.reset(token)
+
+
+def statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].upper()
+    return kind if kind in _STATEMENT_KINDS else "OTHER"
+
+
+def install_query_metrics(engine):
+    """Count queries and DB time, globally and for the current request if any."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        kind = (statement_kind(statement),)
+        DB_QUERIES.inc(kind)
+        DB_QUERY_DURATION.observe(elapsed, kind)
+
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+        query_log.observe(statement, elapsed, stats)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Enum
-from sqlalchemy.orm import relationship, DeclarativeBase
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Enum, event
+from sqlalchemy.orm import relationship, DeclarativeBase, Session
 from sqlalchemy.sql import func
 import datetime
 import enum
+from database.state_versions import note_bump
 
 class Base(DeclarativeBase):
     pass
@@ -42,6 +43,8 @@ class User(Base):
     daily_streak = Column(Integer, default=0)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Bumped on every change to the row; lets clients ask "anything new since version N?"
+    state_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     inventory = relationship("Inventory", back_populates="user")
     achievements = relationship("UserAchievement", back_populates="user")
@@ -155,3 +158,25 @@ class UsedPromo(Base):
     user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
     code_id = Column(Integer, ForeignKey("promo_codes.id"), nullable=False)
     used_at = Column(DateTime, default=func.now())
+
+
+class LedgerEntry(Base):
+    # Append-only record of every coin/diamond change (database/ledger.py)
+    __tablename__ = "economy_ledger"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False, index=True)
+    delta_coins = Column(BigInteger, nullable=False, default=0)
+    delta_diamonds = Column(Integer, nullable=False, default=0)
+    reason = Column(String(16), nullable=False)
+    ref_id = Column(BigInteger, nullable=True)
+    ts = Column(DateTime, nullable=False, default=func.now())
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_state_version(session, flush_context, instances):
+    """Increment state_version of every modified User, in the UPDATE itself (and in database/state_versions.py)."""
+    for obj in session.dirty:
+        if isinstance(obj, User) and session.is_modified(obj, include_collections=False):
+            obj.state_version = User.state_version + 1
+            note_bump(session, obj.user_id)
@@ -1,7 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.orm.attributes import set_committed_value
 from database.models import User, GameItem, Inventory, MarketListing, Achievement, UserAchievement, UserQuest, PromoCode, UsedPromo, ItemType
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import event, func, update, delete, select
+from database import ledger
+from database.state_versions import note_bump
 
 def get_user(session: Session, user_id: int):
     return session.query(User).filter(User.user_id == user_id).first()
@@ -34,8 +37,156 @@ def add_to_inventory(session: Session, user_id: int, item_id: int, quantity: int
     session.commit()
     return inv_item
 
+# Atomic balance and stock changes: one conditional UPDATE each, so concurrent
+# requests can't both spend the same diamonds and no row lock is held across
+# Python code. Instances already in the session get the RETURNING values (ORM
+# "fetch" synchronization would cost as much again as the statement).
+_NO_SYNC = {"synchronize_session": False}
+
+def _apply_returned(session: Session, model, pk, row):
+    obj = session.identity_map.get(session.identity_key(model, pk))
+    if obj is not None and row is not None:
+        for key, value in row._mapping.items():
+            set_committed_value(obj, key, value)
+
+def _forget(session: Session, model, pk):
+    obj = session.identity_map.get(session.identity_key(model, pk))
+    if obj is not None:
+        session.expunge(obj)
+
+def change_balance(session: Session, user_id: int, diamonds: int = 0, coins: int = 0,
+                   min_diamonds: int = None, *, reason: str, ref_id: int = None, **values):
+    """
+    Add diamonds/coins (negative amounts spend) and set `values`, only if the
+    player can afford it: holds at least `min_diamonds` (default: what is spent).
+    Returns the row of new values, or None if they can't or don't exist.
+    A change made is recorded in the economy ledger under `reason`.
+    """
+    stmt = update(User).where(User.user_id == user_id)
+    if min_diamonds is None:
+        min_diamonds = -diamonds
+    if min_diamonds > 0:
+        stmt = stmt.where(User.diamonds >= min_diamonds)
+    if diamonds:
+        values["diamonds"] = User.diamonds + diamonds
+    if coins:
+        values["coins"] = User.coins + coins
+        if coins < 0:
+            stmt = stmt.where(User.coins >= -coins)
+    values["state_version"] = User.state_version + 1  # bulk UPDATEs skip the flush hook
+    session.flush()  # pending changes to this user go first
+    stmt = stmt.values(**values).returning(*(getattr(User, key) for key in values))
+    row = session.execute(stmt, execution_options=_NO_SYNC).first()
+    _apply_returned(session, User, user_id, row)
+    if row is not None:
+        note_bump(session, user_id)
+        ledger.record(session, user_id, reason, coins=coins, diamonds=diamonds, ref_id=ref_id)
+    return row
+
+_CREDITS = "balance_credits"
+
+def credit(session: Session, user: User, coins: int = 0, diamonds: int = 0, *, reason: str, ref_id: int = None):
+    """
+    Add coins/diamonds (negative amounts take them) to a loaded player, with no
+    condition. `user` shows the new amounts at once; the flush writes them as
+    coins = coins + n, so a change_balance() committed by another session since
+    `user` was loaded isn't overwritten. Recorded in the economy ledger under `reason`.
+    """
+    if not coins and not diamonds:
+        return
+    pending = session.info.setdefault(_CREDITS, {}).setdefault(user, [0, 0])
+    if coins:
+        user.coins = (user.coins or 0) + coins
+        pending[0] += coins
+    if diamonds:
+        user.diamonds = (user.diamonds or 0) + diamonds
+        pending[1] += diamonds
+    ledger.record(session, user.user_id, reason, coins=coins, diamonds=diamonds, ref_id=ref_id)
+
+@event.listens_for(Session, "before_flush")
+def _write_credits(session, flush_context, instances):
+    for user, (coins, diamonds) in session.info.pop(_CREDITS, {}).items():
+        if user in session:
+            if coins:
+                user.coins = User.coins + coins
+            if diamonds:
+                user.diamonds = User.diamonds + diamonds
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_credits(session, previous_transaction):
+    # Unflushed changes are gone with the rollback
+    session.info.pop(_CREDITS, None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_unflushed_credits(session, transaction):
+    # A session closed without committing
+    if transaction.parent is None:
+        session.info.pop(_CREDITS, None)
+
+def take_stock(session: Session, item_id: int, quantity: int) -> bool:
+    row = session.execute(
+        update(GameItem)
+        .where(GameItem.id == item_id, GameItem.stock >= quantity)
+        .values(stock=GameItem.stock - quantity)
+        .returning(GameItem.stock),
+        execution_options=_NO_SYNC
+    ).first()
+    _apply_returned(session, GameItem, item_id, row)
+    return row is not None
+
+def return_stock(session: Session, item_id: int, quantity: int):
+    row = session.execute(
+        update(GameItem).where(GameItem.id == item_id).values(stock=GameItem.stock + quantity).returning(GameItem.stock),
+        execution_options=_NO_SYNC
+    ).first()
+    _apply_returned(session, GameItem, item_id, row)
+
+def add_inventory_quantity(session: Session, user_id: int, item_id: int, quantity: int = 1, **new_row):
+    # Increment the player's stack of this item in place, or start one
+    first_stack = select(func.min(Inventory.id)).where(
+        Inventory.user_id == user_id, Inventory.item_id == item_id
+    ).scalar_subquery()
+    row = session.execute(
+        update(Inventory)
+        .where(Inventory.id == first_stack)
+        .values(quantity=Inventory.quantity + quantity)
+        .returning(Inventory.id, Inventory.quantity),
+        execution_options=_NO_SYNC
+    ).first()
+    if row is None:
+        session.add(Inventory(user_id=user_id, item_id=item_id, quantity=quantity, **new_row))
+    else:
+        _apply_returned(session, Inventory, row.id, row)
+
+def take_inventory_quantity(session: Session, user_id: int, inventory_id: int, quantity: int):
+    """Remove `quantity` from an inventory row if it holds that many; returns what's left, or None."""
+    row = session.execute(
+        update(Inventory)
+        .where(Inventory.id == inventory_id, Inventory.user_id == user_id, Inventory.quantity >= quantity)
+        .values(quantity=Inventory.quantity - quantity)
+        .returning(Inventory.quantity),
+        execution_options=_NO_SYNC
+    ).first()
+    if row is None:
+        return None
+    if row.quantity <= 0:
+        session.execute(
+            delete(Inventory).where(Inventory.id == inventory_id, Inventory.quantity <= 0),
+            execution_options=_NO_SYNC
+        )
+        _forget(session, Inventory, inventory_id)
+    else:
+        _apply_returned(session, Inventory, inventory_id, row)
+    return row.quantity
+
+def claim_listing(session: Session, listing_id: int) -> bool:
+    # Only one buyer's DELETE can remove the row
+    result = session.execute(delete(MarketListing).where(MarketListing.id == listing_id), execution_options=_NO_SYNC)
+    _forget(session, MarketListing, listing_id)
+    return result.rowcount == 1
+
 def get_user_inventory(session: Session, user_id: int):
-    return session.query(Inventory).join(GameItem).filter(Inventory.user_id == user_id).all()
+    return session.query(Inventory).join(GameItem).options(contains_eager(Inventory.item)).filter(Inventory.user_id == user_id).all()
 
 def get_market_listings(session: Session):
     return session.query(MarketListing).join(GameItem).all()
@@ -72,13 +223,14 @@ def unlock_achievement(session: Session, user_id: int, achievement_id: int):
 def get_user_quests(session: Session, user_id: int):
     return session.query(UserQuest).filter(UserQuest.user_id == user_id, UserQuest.completed == False).all()
 
-def update_quest_progress(session: Session, user_id: int, quest_type: str, amount: int):
+def update_quest_progress(session: Session, user_id: int, quest_type: str, amount: int, commit: bool = True):
     quests = session.query(UserQuest).filter(UserQuest.user_id == user_id, UserQuest.quest_type == quest_type, UserQuest.completed == False).all()
     for quest in quests:
         quest.progress += amount
         if quest.progress >= quest.goal:
             quest.completed = True
-    session.commit()
+    if commit:
+        session.commit()
 
 def get_promo_code(session: Session, code: str):
     return session.query(PromoCode).filter(PromoCode.code == code).first()
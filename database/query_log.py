@@ -0,0 +1,189 @@
+"""
+Slow query log and N+1 detector.
+
+Fed by the cursor-execute hooks in database.metrics. Two bounded ring buffers:
+
+- slow: statements that took at least SLOW_QUERY_MS
+- repeats: a request (or bot unit of work) that ran the same statement shape
+  more than N_PLUS_ONE_THRESHOLD times, the usual sign of a lazy load in a loop
+
+Each entry records where in our code the statement came from. The backend serves
+its log as JSON lines at /metrics/queries; to save it:
+
+    python -m database.query_log > queries.jsonl
+    python -m database.query_log --kind n_plus_one --url http://host:8000/metrics/queries
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, IO, List, Optional, Tuple
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE, N_PLUS_ONE_THRESHOLD, METRICS_URL, METRICS_TOKEN
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_OWN_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_ROOT, "database", "metrics.py")}
+_MAX_STATEMENT_CHARS = 1000
+_CALL_SITE_DEPTH = 3
+
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Statement with literals and expanded IN-lists collapsed, for grouping repeats."""
+    shape = _SPACE_RE.sub(" ", statement).strip()
+    shape = _IN_LIST_RE.sub("(?...)", shape)
+    return _NUMBER_RE.sub("?", shape)
+
+
+def call_site() -> str:
+    """The innermost frames of our own code that led to the current statement."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < _CALL_SITE_DEPTH:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(PROJECT_ROOT) and filename not in _OWN_FILES and "site-packages" not in filename:
+            frames.append(f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(frames) or "unknown"
+
+
+class QueryLog:
+    """Bounded, thread-safe record of slow statements and N+1 suspects."""
+
+    def __init__(
+        self,
+        slow_ms: float = SLOW_QUERY_MS,
+        size: int = SLOW_QUERY_LOG_SIZE,
+        repeat_threshold: int = N_PLUS_ONE_THRESHOLD,
+    ):
+        self.slow_seconds = slow_ms / 1000
+        self.repeat_threshold = repeat_threshold
+        self.slow: deque = deque(maxlen=size)
+        self.repeats: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, statement: str, elapsed: float, scope=None):
+        """Called after every statement; `scope` is the current RequestDBStats, if any."""
+        if elapsed >= self.slow_seconds:
+            entry = {
+                "kind": "slow",
+                "ts": time.time(),
+                "duration_ms": round(elapsed * 1000, 2),
+                "scope": scope.label if scope is not None else None,
+                "call_site": call_site(),
+                "statement": statement[:_MAX_STATEMENT_CHARS],
+            }
+            with self._lock:
+                self.slow.append(entry)
+            logger.warning(f"Slow query ({entry['duration_ms']}ms) at {entry['call_site']}: {statement[:200]}")
+
+        if scope is None or not self.repeat_threshold:
+            return
+
+        shape = statement_shape(statement)
+        count = scope.shapes.get(shape, 0) + 1
+        scope.shapes[shape] = count
+        if count <= self.repeat_threshold:
+            return
+
+        entry = scope.suspects.get(shape)
+        if entry is None:
+            entry = scope.suspects[shape] = {
+                "kind": "n_plus_one",
+                "ts": time.time(),
+                "scope": scope.label,
+                "count": count,
+                "call_site": call_site(),
+                "statement": shape[:_MAX_STATEMENT_CHARS],
+            }
+            with self._lock:
+                self.repeats.append(entry)
+            logger.warning(f"Possible N+1 in {scope.label} at {entry['call_site']}: {shape[:200]}")
+        else:
+            entry["count"] = count  # keeps counting until the request ends
+
+    def entries(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            slow, repeats = list(self.slow), list(self.repeats)
+        if kind == "slow":
+            return slow
+        if kind == "n_plus_one":
+            return repeats
+        return sorted(slow + repeats, key=lambda entry: entry["ts"])
+
+    def clear(self):
+        with self._lock:
+            self.slow.clear()
+            self.repeats.clear()
+
+    def dump_jsonl(self, fp: IO[str], kind: Optional[str] = None) -> int:
+        entries = self.entries(kind)
+        for entry in entries:
+            fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return len(entries)
+
+    def to_jsonl(self, kind: Optional[str] = None) -> str:
+        return "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self.entries(kind))
+
+
+def parse_jsonl(text: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def query_log_url(metrics_url: str = METRICS_URL) -> str:
+    return metrics_url.rstrip("/") + "/queries" if metrics_url else ""
+
+
+async def load_query_log(kind: Optional[str] = None, timeout: float = 3.0) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    This process's entries plus the backend's, when the API runs in another process.
+
+    Returns (entries oldest first, whether the backend's log could be read).
+    """
+    from utils.metrics import has_local_http_metrics
+
+    entries = query_log.entries(kind)
+    url = query_log_url()
+    if has_local_http_metrics() or not url:
+        return entries, True
+
+    import httpx
+    headers = {"Authorization": f"Bearer {METRICS_TOKEN}"} if METRICS_TOKEN else {}
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(url, params={"kind": kind} if kind else None, headers=headers)
+            response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not load query log from {url}: {e}")
+        return entries, False
+
+    return sorted(entries + parse_jsonl(response.text), key=lambda entry: entry["ts"]), True
+
+
+# Slow statements and N+1 suspects seen by this process
+query_log = QueryLog()
+
+
+if __name__ == "__main__":
+    import argparse
+    import httpx
+
+    parser = argparse.ArgumentParser(description="Dump the backend's slow query / N+1 log as JSON lines.")
+    parser.add_argument("--url", default=query_log_url())
+    parser.add_argument("--kind", choices=["slow", "n_plus_one"])
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {METRICS_TOKEN}"} if METRICS_TOKEN else {}
+    response = httpx.get(args.url, params={"kind": args.kind} if args.kind else None, headers=headers)
+    response.raise_for_status()
+    sys.stdout.write(response.text)
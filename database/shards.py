@@ -0,0 +1,190 @@
+"""
+Optional hash sharding of per-player tables across SQLite files (SQLITE_SHARDS > 1).
+
+users, inventory, user_quests and economy_ledger are split by a hash of
+user_id across nanocoin.shard0.db, nanocoin.shard1.db, ... next to the main
+database file.
+Everything else (catalog, market, admin tables) stays in the main file, which
+is attached to every shard connection as `shared`. A query on a shard session
+therefore still finds game_items, admin_settings and so on without a schema
+prefix, and a unit of work for one player can touch both.
+
+Per-player work goes to that player's shard: run_user_db (database/executor.py)
+for units of work, get_user_session / get_user_read_session otherwise. Each
+shard has its own engines and its own writer thread. Reads over all players
+(leaderboards, admin stats) run on every shard at once with scatter() and are
+merged by the caller, e.g. with merge_sums() or merge_top().
+
+A transaction that writes to both a shard and the shared file (a purchase
+taking stock) commits each file atomically, but not the two together.
+
+Without sharding, all of this falls back to the main database, so callers
+don't need to check.
+
+    python -m database.shards split    # copy the main file's players into empty shards
+"""
+import heapq
+import logging
+import os
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+from database.connection import (
+    DATABASE_FILE, SessionLocal, ReadSessionLocal, create_sqlite_engines, add_missing_columns
+)
+from database.models import Base, User, Inventory, UserQuest, LedgerEntry
+from database.ledger import open_ledger
+from database.writer import WriteQueue
+from config import SQLITE_SHARDS
+
+logger = logging.getLogger(__name__)
+
+SHARDED_TABLES = (User.__table__, Inventory.__table__, UserQuest.__table__, LedgerEntry.__table__)
+
+
+def shard_path(index: int, database_file: str = DATABASE_FILE) -> str:
+    root, ext = os.path.splitext(database_file)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+class Shard:
+    """One shard file: its engines, session factories and writer."""
+
+    def __init__(self, index: int, path: str, shared_path: str):
+        self.index = index
+        self.path = path
+        self.engine, self.read_engine, writer_engine = create_sqlite_engines(
+            f"sqlite:///{path}", attach=shared_path, lock_table=User.__tablename__
+        )
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+        self.write_queue = WriteQueue(writer_engine) if writer_engine is not None else None
+
+
+def shard_index(user_id: int, count: int = SQLITE_SHARDS) -> int:
+    """The shard holding `user_id`'s rows (stable across processes and restarts)."""
+    return zlib.crc32(str(user_id).encode()) % count
+
+
+# Empty unless SQLITE_SHARDS > 1 and the database is a SQLite file
+shards: List[Shard] = []
+if SQLITE_SHARDS > 1 and DATABASE_FILE is not None:
+    shards = [Shard(index, shard_path(index), DATABASE_FILE) for index in range(SQLITE_SHARDS)]
+
+_scatter_pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="db-scatter") if shards else None
+
+
+def shard_for(user_id: int) -> Optional[Shard]:
+    """The player's shard, or None without sharding."""
+    return shards[shard_index(user_id)] if shards else None
+
+
+def same_shard(user_id: int, other_user_id: int) -> bool:
+    """Whether both players' rows can be changed in one unit of work."""
+    return not shards or shard_index(user_id) == shard_index(other_user_id)
+
+
+def get_user_session(user_id: int) -> Session:
+    """A session for work on one player (their shard's, or the main database's)."""
+    shard = shard_for(user_id)
+    return shard.SessionLocal() if shard else SessionLocal()
+
+
+def get_user_read_session(user_id: int) -> Session:
+    """Like get_user_session, on a read-only connection."""
+    shard = shard_for(user_id)
+    return shard.ReadSessionLocal() if shard else ReadSessionLocal()
+
+
+def get_shard_sessions() -> List[Session]:
+    """One writable session per shard (one on the main database without sharding); close them all."""
+    return [shard.SessionLocal() for shard in shards] if shards else [SessionLocal()]
+
+
+def _read(session_factory: Callable[[], Session], fn: Callable, args: tuple, kwargs: dict) -> Any:
+    session = session_factory()
+    try:
+        return fn(session, *args, **kwargs)
+    finally:
+        session.close()
+
+
+def scatter(fn: Callable, *args, **kwargs) -> List[Any]:
+    """
+    fn(session, *args, **kwargs) on a read-only session of every shard, in
+    parallel; one result per shard. Without sharding, fn runs once on the main
+    database. ORM objects in the results are detached but keep loaded columns.
+    """
+    if not shards:
+        return scatter_on([ReadSessionLocal], fn, *args, **kwargs)
+    return scatter_on([shard.ReadSessionLocal for shard in shards], fn, *args, **kwargs)
+
+
+def scatter_on(session_factories: List[Callable[[], Session]], fn: Callable, *args, **kwargs) -> List[Any]:
+    """scatter() over other sessions (e.g. the analytics snapshot's), one factory per shard."""
+    if len(session_factories) == 1:
+        return [_read(session_factories[0], fn, args, kwargs)]
+    futures = [_scatter_pool.submit(_read, factory, fn, args, kwargs) for factory in session_factories]
+    return [future.result() for future in futures]
+
+
+def merge_sums(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-shard dicts of counts and sums, added up key by key (None counts as 0)."""
+    merged: Dict[str, Any] = {}
+    for result in results:
+        for key, value in result.items():
+            merged[key] = merged.get(key, 0) + (value or 0)
+    return merged
+
+
+def merge_top(results: Iterable[List[Any]], key: Callable[[Any], Any], limit: int) -> List[Any]:
+    """Per-shard top lists, each already sorted by `key` descending, merged into one of `limit`."""
+    return list(heapq.merge(*results, key=key, reverse=True))[:limit]
+
+
+def init_shards():
+    """Create the per-player tables (and added columns) in every shard file."""
+    for shard in shards:
+        open_ledger(shard.engine)
+        Base.metadata.create_all(bind=shard.engine, tables=SHARDED_TABLES)
+        add_missing_columns(shard.engine)
+
+
+def split_existing() -> Dict[str, int]:
+    """
+    Copy players from the main file's per-player tables (SHARDED_TABLES) into
+    the shards, each row to its player's shard. Only shards whose users table
+    is still empty are filled; the main file's rows are left in place.
+    """
+    copied = {table.name: 0 for table in SHARDED_TABLES}
+    for shard in shards:
+        with shard.engine.begin() as connection:
+            if connection.execute(select(User.user_id).limit(1)).first() is not None:
+                logger.info(f"Shard {shard.index} already has players, skipped")
+                continue
+            connection.connection.driver_connection.create_function(
+                "shard_of", 1, lambda user_id: shard_index(user_id), deterministic=True
+            )
+            for table in SHARDED_TABLES:
+                columns = ", ".join(column.name for column in table.columns)
+                result = connection.exec_driver_sql(
+                    f"INSERT INTO main.{table.name} ({columns}) "
+                    f"SELECT {columns} FROM shared.{table.name} WHERE shard_of(user_id) = ?",
+                    (shard.index,)
+                )
+                copied[table.name] += result.rowcount
+    return copied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["split"] or not shards:
+        print("usage: SQLITE_SHARDS=N python -m database.shards split")
+        sys.exit(2)
+    from database.connection import init_db
+    init_db()
+    for table, rows in split_existing().items():
+        print(f"{table}: {rows} rows copied")
@@ -0,0 +1,180 @@
+"""
+Read-only analytics copy of the database for heavy admin statistics and reports.
+
+Admin screens that add up whole tables (user and economy totals, item and join
+stats, reports) would otherwise run on the live database next to gameplay
+writes. They read through `analytics` instead:
+
+- SQLite: every ANALYTICS_SNAPSHOT_INTERVAL seconds a background thread copies
+  the main file and every shard (database/shards.py) with SQLite's online
+  backup API to <name>.analytics.db next to it. The backup only reads the live
+  file, and in WAL mode writers carry on meanwhile. Each copy replaces the
+  previous one atomically and is opened immutable, so queries on it take no
+  locks at all. Until the first copy exists, reads go to the live read-only
+  connections.
+- Other databases: ANALYTICS_DATABASE_URL (e.g. a read replica) if set, else
+  the live database, in read-only transactions (on PostgreSQL).
+
+analytics.age() is how old the data read is (None when it is live), for the
+screens to show.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from database.connection import DATABASE_FILE, engine, ReadSessionLocal, install_sqlite_pragmas, install_attached
+from database.metrics import install_query_metrics
+from database.shards import shards, scatter_on
+from utils.metrics import registry
+from config import ANALYTICS_SNAPSHOT_INTERVAL, ANALYTICS_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_SNAPSHOT_DURATION = registry.histogram(
+    "analytics_snapshot_duration_seconds", "Time taken to copy the database files into the analytics snapshot."
+)
+ANALYTICS_SNAPSHOT_TIME = registry.gauge(
+    "analytics_snapshot_timestamp_seconds", "Unix time the current analytics snapshot was started."
+)
+ANALYTICS_SNAPSHOT_FAILURES = registry.counter(
+    "analytics_snapshot_failures_total", "Analytics snapshot refreshes that failed."
+)
+
+
+def snapshot_path(database_file: str) -> str:
+    root, ext = os.path.splitext(database_file)
+    return f"{root}.analytics{ext or '.db'}"
+
+
+def backup_file(source: str, target: str):
+    """Copy the SQLite file `source` to `target` with the online backup API; `target` is replaced atomically."""
+    partial = f"{target}.{os.getpid()}.partial"
+    source_connection = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        target_connection = sqlite3.connect(partial)
+        try:
+            source_connection.backup(target_connection)
+            # The copy is only ever opened read-only, so it needs no WAL
+            target_connection.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target_connection.close()
+    finally:
+        source_connection.close()
+    os.replace(partial, target)
+
+
+class SnapshotFile:
+    """The copy of one live SQLite file, and a read-only engine on it."""
+
+    def __init__(self, source: str, attach: Optional[str] = None):
+        self.source = source
+        self.path = snapshot_path(source)
+        url = make_url(f"sqlite:///{self.path}")
+        self.engine = create_engine(
+            url.set(database=f"file:{self.path}", query={"mode": "ro", "immutable": "1", "uri": "true"})
+        )
+        install_sqlite_pragmas(self.engine, read_only=True)
+        if attach:
+            install_attached(self.engine, snapshot_path(attach), "shared", immutable=True)
+        install_query_metrics(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+
+def _read_only_engine():
+    """Where analytics read on a database other than SQLite."""
+    bind = engine
+    if ANALYTICS_DATABASE_URL:
+        bind = create_engine(ANALYTICS_DATABASE_URL)
+        install_query_metrics(bind)
+    if bind.dialect.name == "postgresql":
+        bind = bind.execution_options(postgresql_readonly=True)
+    return bind
+
+
+class AnalyticsSnapshot:
+    """The snapshot files and the thread refreshing them; started on first use."""
+
+    def __init__(self, interval: int = ANALYTICS_SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self.taken_at: Optional[float] = None
+        self.main: Optional[SnapshotFile] = None
+        self.shard_files: List[SnapshotFile] = []
+        self._SessionLocal = ReadSessionLocal
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        if DATABASE_FILE is None:
+            self._SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_read_only_engine())
+        elif interval > 0:
+            self.main = SnapshotFile(DATABASE_FILE)
+            self.shard_files = [SnapshotFile(shard.path, attach=DATABASE_FILE) for shard in shards]
+            # Copies left by the last run are used until the first refresh replaces them
+            if all(file.exists() for file in self.files):
+                self.taken_at = min(os.path.getmtime(file.path) for file in self.files)
+
+    @property
+    def files(self) -> List[SnapshotFile]:
+        return ([self.main] if self.main else []) + self.shard_files
+
+    def age(self) -> Optional[float]:
+        """Seconds since the data analytics read was copied; None if they read the live database."""
+        self.start()
+        return None if self.taken_at is None else max(0.0, time.time() - self.taken_at)
+
+    def session(self) -> Session:
+        """A read-only session on the main database's snapshot (catalog and admin tables, and players without sharding)."""
+        self.start()
+        if self.taken_at is None:
+            return self._SessionLocal()
+        return self.main.SessionLocal()
+
+    def scatter(self, fn: Callable, *args, **kwargs) -> List[Any]:
+        """shards.scatter() on the snapshot: fn(session, ...) once per shard, or once without sharding."""
+        self.start()
+        if self.taken_at is None:
+            factories = [shard.ReadSessionLocal for shard in shards] or [self._SessionLocal]
+        else:
+            factories = [file.SessionLocal for file in self.shard_files] or [self.main.SessionLocal]
+        return scatter_on(factories, fn, *args, **kwargs)
+
+    def refresh(self):
+        """Copy every live file now; new sessions read the new copies."""
+        started = time.time()
+        for file in self.files:
+            backup_file(file.source, file.path)
+        self.taken_at = started
+        # Pooled connections still have the replaced files open
+        for file in self.files:
+            file.engine.dispose()
+        ANALYTICS_SNAPSHOT_DURATION.observe(time.time() - started)
+        ANALYTICS_SNAPSHOT_TIME.set(started)
+
+    def start(self):
+        if self._thread is not None or not self.files:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        delay = 0.0 if self.taken_at is None else max(0.0, self.taken_at + self.interval - time.time())
+        while True:
+            time.sleep(delay)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Analytics snapshot failed: {e}")
+                ANALYTICS_SNAPSHOT_FAILURES.inc()
+            delay = self.interval
+
+
+analytics = AnalyticsSnapshot()
@@ -0,0 +1,130 @@
+"""
+Players' state_version kept in memory, so /api/user/sync can tell a client
+that nothing changed without reading the row.
+
+The version read from the database is remembered per player. Every UPDATE this
+process makes to a player also increments it here: the before_flush hook in
+database/models.py and change_balance() note each increment on the connection
+doing it, and they are added to the map once that connection has been returned
+to the pool, i.e. after its transaction committed (with the write queue, a
+unit's session.commit() only releases a SAVEPOINT; the batch commits later).
+Until then the player counts as changing and is read from the database, and a
+version read before an increment landed is never remembered over it.
+
+A rolled-back increment is still added, which only makes the next sync read the
+row again. Writes by other processes (the polling bot, other API workers) are
+not seen here, so a remembered version is trusted for at most
+STATE_VERSION_CHECK_SECONDS after it was read.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+from config import STATE_VERSION_CACHE_SIZE, STATE_VERSION_CHECK_SECONDS
+
+_PENDING = "state_version_bumps"
+
+
+class _Entry:
+    __slots__ = ("version", "read_at", "bumped_at", "pending")
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.read_at = 0.0
+        self.bumped_at = 0.0
+        self.pending = 0  # increments made but not committed yet
+
+
+class StateVersions:
+    """user_id -> state_version, least recently used players dropped past `max_entries`."""
+
+    def __init__(self, max_entries: int = STATE_VERSION_CACHE_SIZE,
+                 check_interval: float = STATE_VERSION_CHECK_SECONDS):
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._max_entries = max_entries
+        self._check_interval = check_interval
+        self._evicted_at = 0.0  # latest increment forgotten with an evicted entry
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clock() -> float:
+        return time.monotonic()
+
+    def get(self, user_id: int) -> Optional[int]:
+        """The player's current state_version, or None if it has to be read from the database."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.version is None or entry.pending:
+                return None
+            if self.clock() - entry.read_at >= self._check_interval:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry.version
+
+    def put(self, user_id: int, version: int, read_at: float):
+        """Remember a version read from the database by a query started at `read_at` (clock())."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                if read_at <= self._evicted_at:
+                    return
+                entry = self._entry(user_id)
+            elif entry.pending or read_at <= entry.bumped_at:
+                return
+            entry.version, entry.read_at = version, read_at
+            self._entries.move_to_end(user_id)
+
+    def begin(self, bumps: Dict[int, int]):
+        """Increments are about to be written: read these players from the database until end()."""
+        with self._lock:
+            for user_id in bumps:
+                entry = self._entries.get(user_id) or self._entry(user_id)
+                entry.pending += 1
+                self._entries.move_to_end(user_id)
+
+    def end(self, bumps: Dict[int, int]):
+        """The transaction writing begin()'s increments is over: add them."""
+        now = self.clock()
+        with self._lock:
+            for user_id, count in bumps.items():
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    self._evicted_at = max(self._evicted_at, now)
+                    continue
+                entry.pending = max(0, entry.pending - 1)
+                if entry.version is not None:
+                    entry.version += count
+                entry.bumped_at = now
+
+    def _entry(self, user_id: int) -> _Entry:
+        entry = self._entries[user_id] = _Entry()
+        while len(self._entries) > self._max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            # An uncommitted or recent increment is forgotten with it: refuse older reads
+            self._evicted_at = max(self._evicted_at, self.clock() if evicted.pending else evicted.bumped_at)
+        return entry
+
+
+state_versions = StateVersions()
+
+
+def note_bump(session: Session, user_id: int):
+    """Note that `session` incremented the player's state_version in SQL."""
+    info = session.connection().info
+    bumps = info.get(_PENDING)
+    if bumps is None:
+        bumps = info[_PENDING] = Counter()
+    if user_id not in bumps:
+        state_versions.begin({user_id: 1})
+    bumps[user_id] += 1
+
+
+@event.listens_for(Pool, "checkin")
+def _apply_bumps(dbapi_connection, connection_record):
+    # Back in the pool: the transaction that made them committed or rolled back
+    bumps = connection_record.info.pop(_PENDING, None) if connection_record is not None else None
+    if bumps:
+        state_versions.end(bumps)
@@ -0,0 +1,183 @@
+"""
+Single-writer group commit for SQLite.
+
+SQLite takes one writer at a time, and with many bot and API threads writing,
+most of their time goes to waiting for the lock and to one commit each. Here one
+thread owns the only write connection. Units of work (`fn(session, ...)`, as
+for run_db) are queued from any thread. The writer takes everything queued, up
+to SQLITE_WRITE_BATCH_SIZE units, and runs them one after another in a single
+transaction. Each unit gets its own session inside a SAVEPOINT, so a unit that
+raises or rolls back only undoes its own changes, and a unit calling
+session.commit() only releases its savepoint. The batch then commits once, and
+only after that does every unit's caller get its result.
+
+A shard writer (database/shards.py) locks the shared file it has attached only
+when a unit writes to it. If another connection holds that lock by then, or
+changed the file since the batch first read it, SQLite refuses the write
+instead of waiting for it (SQLITE_BUSY, SQLITE_BUSY_SNAPSHOT). The whole batch
+is then rolled back and run again, this time taking every file's write lock up
+front, where SQLite does wait for it.
+"""
+import atexit
+import contextvars
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+from sqlalchemy.exc import OperationalError
+from database.connection import SessionLocal, writer_engine
+from database.metrics import unit_of_work_stats
+from utils.metrics import registry
+from config import SQLITE_WRITE_BATCH_SIZE, SQLITE_WRITE_RETRIES
+
+logger = logging.getLogger(__name__)
+
+DB_WRITE_BATCH_SIZE = registry.histogram(
+    "db_write_batch_size", "Units of work committed together by the SQLite writer.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+DB_WRITE_COMMIT_DURATION = registry.histogram(
+    "db_write_batch_duration_seconds", "Time the SQLite writer spent on one batch, commit included."
+)
+DB_WRITE_QUEUE_WAIT = registry.histogram(
+    "db_write_queue_wait_seconds", "Time a unit of work waited in the SQLite write queue."
+)
+DB_WRITE_UNITS = registry.counter(
+    "db_write_units_total", "Units of work run by the SQLite writer, by outcome.", ("result",)
+)
+DB_WRITE_RETRIES = registry.counter(
+    "db_write_batch_retries_total", "SQLite write batches run again after losing an attached file's write lock."
+)
+
+_STOP = object()
+
+Job = Tuple[Future, contextvars.Context, float, Callable, tuple, dict]
+
+
+def _lock_refused(error: Exception) -> bool:
+    """Whether SQLite refused a write lock: another writer holds it, or the transaction read an older version of the file."""
+    orig = getattr(error, "orig", None) if isinstance(error, OperationalError) else None
+    return getattr(orig, "sqlite_errorcode", None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_BUSY_SNAPSHOT)
+
+
+class WriteQueue:
+    """The writer thread and its queue; started on the first submit."""
+
+    def __init__(self, engine, max_batch: int = SQLITE_WRITE_BATCH_SIZE):
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(session, *args, **kwargs); the future resolves once its batch is committed."""
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((future, contextvars.copy_context(), time.perf_counter(), fn, args, kwargs))
+        return future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Let the writer finish everything queued so far, then end the thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            batch: List[Job] = []
+            while job is not _STOP:
+                batch.append(job)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if job is _STOP:
+                return
+
+    def _write(self, batch: List[Job]):
+        started = time.perf_counter()
+        batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        for _, _, queued_at, *_ in batch:
+            DB_WRITE_QUEUE_WAIT.observe(started - queued_at)
+        try:
+            attempt = 1
+            while True:
+                try:
+                    outcomes = self._transaction(batch, lock_attached=attempt > 1)
+                    break
+                except OperationalError as e:
+                    if not _lock_refused(e) or attempt >= SQLITE_WRITE_RETRIES:
+                        raise
+                    DB_WRITE_RETRIES.inc()
+                    attempt += 1
+        except Exception as e:
+            logger.error(f"SQLite write batch of {len(batch)} failed: {e}")
+            DB_WRITE_UNITS.inc(("error",), amount=len(batch))
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            DB_WRITE_COMMIT_DURATION.observe(time.perf_counter() - started)
+
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        for (future, *_), (ok, value) in zip(batch, outcomes):
+            DB_WRITE_UNITS.inc(("ok" if ok else "error",))
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _transaction(self, batch: List[Job], lock_attached: bool = False) -> List[Tuple[bool, Any]]:
+        """Run the batch in one transaction; (True, result) or (False, error) per unit once committed."""
+        outcomes: List[Tuple[bool, Any]] = []
+        with self.engine.connect() as connection:
+            if lock_attached:
+                connection.execution_options(lock_attached=True)
+            transaction = connection.begin()
+            for _, context, _, fn, args, kwargs in batch:
+                try:
+                    outcomes.append((True, context.run(self._unit, connection, fn, args, kwargs)))
+                except Exception as e:
+                    # A refused lock spoils the whole transaction, not just this unit
+                    if _lock_refused(e):
+                        raise
+                    outcomes.append((False, e))
+            transaction.commit()
+        return outcomes
+
+    @staticmethod
+    def _unit(connection, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        with unit_of_work_stats(fn):
+            session = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+            try:
+                result = fn(session, *args, **kwargs)
+                session.commit()
+                return result
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+
+# None unless the database is a SQLite file and SQLITE_WRITE_QUEUE is on
+write_queue = WriteQueue(writer_engine) if writer_engine is not None else None
@@ -1,7 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.connection import get_session
-from database.models import GameItem, ItemType
+from database.executor import run_db, run_in_db_thread
+from database.models import GameItem, ItemType, User
+from database.snapshot import analytics
+from utils.settings_store import bump_catalog_version
+from utils.admin_helpers import format_data_age
 from config import ADMIN_IDS
 
 async def admin_add_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -17,12 +20,12 @@ async def admin_add_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
         itype = ItemType(args[2].upper())
         price = int(args[3])
         
-        session = get_session()
-        item = GameItem(name=name, item_code=code, item_type=itype, price_diamonds=price)
-        session.add(item)
-        session.commit()
+        def _add(session):
+            session.add(GameItem(name=name, item_code=code, item_type=itype, price_diamonds=price))
+            bump_catalog_version(session)
+
+        await run_db(_add)
         await update.message.reply_text(f"✅ آیتم {name} با موفقیت اضافه شد!")
-        session.close()
     except Exception as e:
         await update.message.reply_text(f"❌ خطا: {str(e)}")
 
@@ -31,8 +34,5 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id not in ADMIN_IDS:
         return
         
-    session = get_session()
-    from database.models import User
-    user_count = session.query(User).count()
-    await update.message.reply_text(f"📊 آمار کل بازیکنان: {user_count}")
-    session.close()
+    user_count = sum(await run_in_db_thread(analytics.scatter, lambda session: session.query(User).count()))
+    await update.message.reply_text(f"📊 آمار کل بازیکنان: {user_count}\n{format_data_age(analytics.age())}")
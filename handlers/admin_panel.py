@@ -1,13 +1,19 @@
+import io
+import json
 import logging
 import asyncio
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler, MessageHandler, filters
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, or_, case
 from database.connection import get_session
+from database.shards import scatter, merge_sums, merge_top, get_user_session, get_shard_sessions
+from database.snapshot import analytics
+from database import ledger
+from database.queries import change_balance, credit
 from database.models import User, GameItem, Inventory, MarketListing, Achievement, UserAchievement, UserQuest, PromoCode
 from database.admin_models import JoinRequirement, AdminLog, AdminSettings, BroadcastMessage, BannedUser, UserWarning
-from config import ADMIN_IDS
+from config import ADMIN_IDS, METRICS_URL, METRICS_TOKEN, SLOW_QUERY_MS, N_PLUS_ONE_THRESHOLD
 from utils.admin_keyboards import (
     admin_main_keyboard, admin_stats_keyboard, admin_users_keyboard,
     admin_items_keyboard, admin_broadcast_keyboard, admin_join_keyboard,
@@ -15,19 +21,162 @@ from utils.admin_keyboards import (
     admin_back_keyboard, admin_user_list_keyboard, admin_user_detail_keyboard,
     admin_item_list_keyboard, admin_item_detail_keyboard, admin_confirm_keyboard,
     admin_economy_keyboard, admin_join_list_keyboard, admin_join_detail_keyboard,
-    admin_broadcast_confirm_keyboard, admin_help_keyboard, admin_quests_keyboard
+    admin_broadcast_confirm_keyboard, admin_help_keyboard, admin_quests_keyboard,
+    admin_query_log_keyboard
 )
 from utils.admin_helpers import (
     is_admin, is_super_admin, get_admin_level, log_admin_action,
     get_admin_setting, set_admin_setting, format_number, format_coins,
-    format_diamonds, format_datetime, safe_int, safe_float, format_user_info,
+    format_diamonds, format_datetime, format_data_age, safe_int, safe_float, format_user_info,
     get_command_args, validate_user_id, get_user_display_name, truncate_text,
-    split_message
+    split_message, broadcast_message
 )
+from bot.rate_limiter import PRIORITY_ADMIN
+from handlers.lazy import ADMIN_PANEL_HANDLERS, add_handlers
+from utils.metrics import registry, load_api_metrics, summarize_http, summarize_histogram
+from database.query_log import load_query_log
+from utils.settings_store import bump_catalog_version
 
 logger = logging.getLogger(__name__)
 
 
+# ========== PLAYER DATA ACROSS SHARDS ==========
+# با SQLITE_SHARDS > 1 جداول کاربران، موجودی و ماموریت‌ها در چند فایل هستند (database/shards.py).
+# کار روی یک کاربر با get_user_session روی شارد همان کاربر انجام می‌شود و آمار کلی
+# روی همه شاردها اجرا و سپس جمع می‌شود. بدون شاردینگ همه این‌ها روی دیتابیس اصلی است.
+# آمار و گزارش‌های سنگین از نسخه تحلیلی دیتابیس (analytics، database/snapshot.py) خوانده
+# می‌شوند تا روی دیتابیس زنده قفلی نگیرند؛ سن داده‌ها در همان صفحه نمایش داده می‌شود.
+
+def _count_where(condition):
+    return func.count(case((condition, 1)))
+
+
+def _user_totals(session) -> dict:
+    """شمارش‌ها و مجموع‌های جدول کاربران در یک کوئری"""
+    now = datetime.now()
+    today = now.date()
+    row = session.query(
+        func.count(User.user_id).label("total"),
+        _count_where(User.coins > 0).label("with_coins"),
+        _count_where(User.diamonds > 0).label("with_diamonds"),
+        _count_where(User.coins > 10000).label("over_10k"),
+        _count_where(User.coins > 100000).label("over_100k"),
+        _count_where(User.coins < 1000).label("under_1k"),
+        _count_where(func.date(User.created_at) == today).label("new_today"),
+        _count_where(func.date(User.created_at) == today - timedelta(days=1)).label("new_yesterday"),
+        _count_where(func.date(User.created_at) >= today - timedelta(days=7)).label("new_week"),
+        _count_where(func.date(User.updated_at) == today).label("active_today"),
+        _count_where(User.updated_at >= now - timedelta(hours=24)).label("active_24h"),
+        _count_where(User.updated_at >= now - timedelta(days=7)).label("active_7d"),
+        func.coalesce(func.sum(User.coins), 0).label("coins"),
+        func.coalesce(func.sum(User.diamonds), 0).label("diamonds"),
+    ).one()
+    return row._asdict()
+
+
+def user_totals() -> dict:
+    """آمار جدول کاربران، جمع همه شاردها (از نسخه تحلیلی)"""
+    return merge_sums(analytics.scatter(_user_totals))
+
+
+def _user_count(session) -> int:
+    return session.query(User).count()
+
+
+def _users_by(session, column, limit: int, criteria: tuple) -> list:
+    return session.query(User).filter(*criteria).order_by(column.desc()).limit(limit).all()
+
+
+def users_by(column, limit: int, *criteria) -> list:
+    """`limit` کاربر با بیشترین مقدار ستون `column` از همه شاردها"""
+    def key(user):
+        value = getattr(user, column.key)
+        return value is not None, value
+    return merge_top(scatter(_users_by, column, limit, criteria), key=key, limit=limit)
+
+
+def _user_ids(session) -> list:
+    return [row[0] for row in session.query(User.user_id).all()]
+
+
+def all_user_ids() -> list:
+    """آیدی همه کاربران از همه شاردها"""
+    return [user_id for user_ids in scatter(_user_ids) for user_id in user_ids]
+
+
+def _find_user(session, **filters):
+    return session.query(User).filter_by(**filters).first()
+
+
+def _update_all_users(field: str, change, admin_id: int) -> int:
+    """
+    مقدار `field` (coins یا diamonds) همه کاربران را با change(مقدار فعلی) عوض می‌کند و تعداد کاربران را برمی‌گرداند.
+    هر تغییر به نام ادمین در دفتر اقتصادی ثبت می‌شود.
+    هر شارد جداگانه commit می‌شود؛ با خطا، شاردهایی که هنوز commit نشده‌اند برگردانده می‌شوند.
+    """
+    sessions = get_shard_sessions()
+    try:
+        count = 0
+        for session in sessions:
+            users = session.query(User).all()
+            for user in users:
+                old = getattr(user, field)
+                credit(session, user, reason=ledger.ADMIN, ref_id=admin_id, **{field: change(old) - old})
+            count += len(users)
+        for session in sessions:
+            session.commit()
+        return count
+    except Exception:
+        for session in sessions:
+            session.rollback()
+        raise
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def _inventory_totals(session) -> dict:
+    row = session.query(
+        func.count(Inventory.id).label("rows"),
+        func.coalesce(func.sum(Inventory.quantity), 0).label("quantity"),
+        func.count(func.distinct(Inventory.user_id)).label("owners"),
+    ).one()
+    return row._asdict()
+
+
+def _owned_by_item(session) -> dict:
+    """تعداد ردیف‌های موجودی هر آیتم، با نام آیتم"""
+    return dict(
+        session.query(GameItem.name, func.count(Inventory.id)).join(Inventory).group_by(GameItem.name).all()
+    )
+
+
+def _quest_counts(session) -> dict:
+    row = session.query(
+        _count_where(UserQuest.completed == False).label("active"),
+        _count_where(UserQuest.completed == True).label("completed"),
+    ).one()
+    return row._asdict()
+
+
+def _quests(session, limit: int) -> list:
+    return session.query(UserQuest).limit(limit).all()
+
+
+def _quest_with_user(session, quest_id: int):
+    quest = session.get(UserQuest, quest_id)
+    return (quest, session.get(User, quest.user_id)) if quest else None
+
+
+def _find_quest(sessions, quest_id: int):
+    """(session, quest) اولین شاردی که ماموریت `quest_id` را دارد، یا (None, None)"""
+    for session in sessions:
+        quest = session.get(UserQuest, quest_id)
+        if quest is not None:
+            return session, quest
+    return None, None
+
+
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """دستور اصلی پنل ادمین"""
     user_id = update.effective_user.id
@@ -155,6 +304,10 @@ async def admin_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         await show_monitor_errors(query)
     elif data == "admin_monitor_usage":
         await show_monitor_usage(query)
+    elif data == "admin_monitor_queries":
+        await show_monitor_queries(query)
+    elif data == "admin_monitor_queries_dump":
+        await send_query_log_dump(query, context)
     elif data == "admin_settings_general":
         await show_settings_general(query)
     elif data == "admin_settings_game":
@@ -248,15 +401,15 @@ async def show_admin_main(query):
 
 async def show_admin_stats(query):
     """نمایش آمار و تحلیل"""
-    session = get_session()
+    session = analytics.session()
     try:
-        total_users = session.query(User).count()
-        active_users = session.query(User).filter(User.coins > 0).count()
-        today = datetime.now().date()
-        new_users = session.query(User).filter(func.date(User.created_at) == today).count()
+        totals = user_totals()
+        total_users = totals["total"]
+        active_users = totals["with_coins"]
+        new_users = totals["new_today"]
         
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
+        total_coins = totals["coins"]
+        total_diamonds = totals["diamonds"]
         total_items = session.query(GameItem).count()
         
         text = f"""
@@ -274,6 +427,7 @@ async def show_admin_stats(query):
 🎮 **آیتم‌ها:**
 • تعداد آیتم‌ها: {total_items}
 """
+        text += f"\n{format_data_age(analytics.age())}"
         await query.edit_message_text(text, reply_markup=admin_stats_keyboard(), parse_mode="Markdown")
     finally:
         session.close()
@@ -291,28 +445,24 @@ async def show_admin_users(query):
 
 async def show_users_page(query, page: int = 1):
     """نمایش صفحه لیست کاربران"""
-    session = get_session()
-    try:
-        per_page = 10
-        total = session.query(User).count()
-        total_pages = (total + per_page - 1) // per_page
-        
-        users = session.query(User).order_by(User.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
-        
-        if not users:
-            text = "📋 هیچ کاربری یافت نشد."
-            await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_users"))
-            return
-        
-        text = f"👥 **لیست کاربران** (صفحه {page} از {total_pages})"
-        await query.edit_message_text(text, reply_markup=admin_user_list_keyboard(users, page, total_pages), parse_mode="Markdown")
-    finally:
-        session.close()
+    per_page = 10
+    total = sum(scatter(_user_count))
+    total_pages = (total + per_page - 1) // per_page
+    
+    users = users_by(User.created_at, page * per_page)[(page - 1) * per_page:]
+    
+    if not users:
+        text = "📋 هیچ کاربری یافت نشد."
+        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_users"))
+        return
+    
+    text = f"👥 **لیست کاربران** (صفحه {page} از {total_pages})"
+    await query.edit_message_text(text, reply_markup=admin_user_list_keyboard(users, page, total_pages), parse_mode="Markdown")
 
 
 async def show_user_detail(query, user_id: int):
     """نمایش جزئیات کاربر"""
-    session = get_session()
+    session = get_user_session(user_id)
     try:
         user = session.query(User).filter(User.user_id == user_id).first()
         if not user:
@@ -607,12 +757,13 @@ async def admin_stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         return
     
-    session = get_session()
+    session = analytics.session()
     try:
-        total_users = session.query(User).count()
-        active_users = session.query(User).filter(User.coins > 0).count()
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
+        totals = user_totals()
+        total_users = totals["total"]
+        active_users = totals["with_coins"]
+        total_coins = totals["coins"]
+        total_diamonds = totals["diamonds"]
         total_items = session.query(GameItem).count()
         total_listings = session.query(MarketListing).count()
         
@@ -633,6 +784,7 @@ async def admin_stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • تعداد آیتم‌ها: {total_items}
 • آگهی‌های بازار: {total_listings}
 """
+        text += f"\n{format_data_age(analytics.age())}"
         await update.message.reply_text(text, parse_mode="Markdown")
     finally:
         session.close()
@@ -644,18 +796,14 @@ async def admin_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         return
     
-    session = get_session()
-    try:
-        top_users = session.query(User).order_by(User.coins.desc()).limit(10).all()
-        
-        text = "🏆 **جدول برترین‌ها**\n\n"
-        for i, user in enumerate(top_users, 1):
-            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            text += f"{medal} {user.first_name[:15]}: {format_coins(user.coins)}\n"
-        
-        await update.message.reply_text(text, parse_mode="Markdown")
-    finally:
-        session.close()
+    top_users = users_by(User.coins, 10)
+    
+    text = "🏆 **جدول برترین‌ها**\n\n"
+    for i, user in enumerate(top_users, 1):
+        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+        text += f"{medal} {user.first_name[:15]}: {format_coins(user.coins)}\n"
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
 
 
 async def admin_search_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -670,31 +818,31 @@ async def admin_search_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     query_str = args[0]
-    session = get_session()
-    try:
-        user = None
-        if query_str.isdigit():
-            user = session.query(User).filter(User.user_id == int(query_str)).first()
-        else:
-            if query_str.startswith('@'):
-                query_str = query_str[1:]
-            user = session.query(User).filter(User.username == query_str).first()
-        
-        if not user:
-            await update.message.reply_text("❌ کاربر یافت نشد.")
-            return
-        
-        text = f"""
+    user = None
+    if query_str.isdigit():
+        session = get_user_session(int(query_str))
+        try:
+            user = _find_user(session, user_id=int(query_str))
+        finally:
+            session.close()
+    else:
+        if query_str.startswith('@'):
+            query_str = query_str[1:]
+        user = next((found for found in scatter(_find_user, username=query_str) if found), None)
+    
+    if not user:
+        await update.message.reply_text("❌ کاربر یافت نشد.")
+        return
+    
+    text = f"""
 👤 **کاربر یافت شد:**
 
 {format_user_info(user)}
 
 📅 عضویت: {format_datetime(user.created_at)}
 """
-        await update.message.reply_text(text, parse_mode="Markdown")
-        await log_admin_action(update, "search_user", "user", str(user.user_id), f"Searched for {query_str}")
-    finally:
-        session.close()
+    await update.message.reply_text(text, parse_mode="Markdown")
+    await log_admin_action(update, "search_user", "user", str(user.user_id), f"Searched for {query_str}")
 
 
 async def admin_give_coins(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -718,14 +866,14 @@ async def admin_give_coins(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
             await update.message.reply_text("❌ کاربر یافت نشد.")
             return
         
-        user.coins += amount
+        change_balance(session, target_id, coins=amount, reason=ledger.ADMIN, ref_id=user_id)
         session.commit()
         
         await update.message.reply_text(f"✅ {format_coins(amount)} به {user.first_name} داده شد.")
@@ -757,14 +905,14 @@ async def admin_give_diamonds(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
             await update.message.reply_text("❌ کاربر یافت نشد.")
             return
         
-        user.diamonds += amount
+        change_balance(session, target_id, diamonds=amount, reason=ledger.ADMIN, ref_id=user_id)
         session.commit()
         
         await update.message.reply_text(f"✅ {format_diamonds(amount)} به {user.first_name} داده شد.")
@@ -796,16 +944,17 @@ async def admin_remove_coins(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
             await update.message.reply_text("❌ کاربر یافت نشد.")
             return
         
-        old_coins = user.coins
-        user.coins = max(0, user.coins - amount)
-        removed = old_coins - user.coins
+        removed = min(amount, user.coins)
+        if change_balance(session, target_id, coins=-removed, reason=ledger.ADMIN, ref_id=user_id) is None:
+            await update.message.reply_text("❌ موجودی کاربر همزمان تغییر کرد، دوباره تلاش کنید.")
+            return
         session.commit()
         
         await update.message.reply_text(f"✅ {format_coins(removed)} از {user.first_name} کم شد.\n💰 موجودی جدید: {format_coins(user.coins)}")
@@ -837,16 +986,17 @@ async def admin_remove_diamonds(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
             await update.message.reply_text("❌ کاربر یافت نشد.")
             return
         
-        old_diamonds = user.diamonds
-        user.diamonds = max(0, user.diamonds - amount)
-        removed = old_diamonds - user.diamonds
+        removed = min(amount, user.diamonds)
+        if change_balance(session, target_id, diamonds=-removed, reason=ledger.ADMIN, ref_id=user_id) is None:
+            await update.message.reply_text("❌ موجودی کاربر همزمان تغییر کرد، دوباره تلاش کنید.")
+            return
         session.commit()
         
         await update.message.reply_text(f"✅ {format_diamonds(removed)} از {user.first_name} کم شد.\n💎 موجودی جدید: {format_diamonds(user.diamonds)}")
@@ -876,21 +1026,14 @@ async def admin_economy_add_coins(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
 
-    session = get_session()
     try:
-        users = session.query(User).all()
-        for user in users:
-            user.coins += amount
-        session.commit()
+        count = _update_all_users("coins", lambda coins: coins + amount, admin_id)
 
-        await update.message.reply_text(f"✅ به {len(users)} کاربر، {format_coins(amount)} اضافه شد.")
-        await log_admin_action(update, "economy_add_coins", "users", str(len(users)), f"Added {format_coins(amount)} to all")
+        await update.message.reply_text(f"✅ به {count} کاربر، {format_coins(amount)} اضافه شد.")
+        await log_admin_action(update, "economy_add_coins", "users", str(count), f"Added {format_coins(amount)} to all")
     except Exception as e:
-        session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "economy_add_coins", "users", None, "Failed", success=False, error_message=str(e))
-    finally:
-        session.close()
 
 
 async def admin_economy_remove_coins(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -910,21 +1053,14 @@ async def admin_economy_remove_coins(update: Update, context: ContextTypes.DEFAU
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
 
-    session = get_session()
     try:
-        users = session.query(User).all()
-        for user in users:
-            user.coins = max(0, user.coins - amount)
-        session.commit()
+        count = _update_all_users("coins", lambda coins: max(0, coins - amount), admin_id)
 
-        await update.message.reply_text(f"✅ از {len(users)} کاربر، {format_coins(amount)} کم شد (تا حد صفر).")
-        await log_admin_action(update, "economy_remove_coins", "users", str(len(users)), f"Removed {format_coins(amount)} from all")
+        await update.message.reply_text(f"✅ از {count} کاربر، {format_coins(amount)} کم شد (تا حد صفر).")
+        await log_admin_action(update, "economy_remove_coins", "users", str(count), f"Removed {format_coins(amount)} from all")
     except Exception as e:
-        session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "economy_remove_coins", "users", None, "Failed", success=False, error_message=str(e))
-    finally:
-        session.close()
 
 
 async def admin_economy_add_diamonds(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -944,21 +1080,14 @@ async def admin_economy_add_diamonds(update: Update, context: ContextTypes.DEFAU
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
 
-    session = get_session()
     try:
-        users = session.query(User).all()
-        for user in users:
-            user.diamonds += amount
-        session.commit()
+        count = _update_all_users("diamonds", lambda diamonds: diamonds + amount, admin_id)
 
-        await update.message.reply_text(f"✅ به {len(users)} کاربر، {format_diamonds(amount)} اضافه شد.")
-        await log_admin_action(update, "economy_add_diamonds", "users", str(len(users)), f"Added {format_diamonds(amount)} to all")
+        await update.message.reply_text(f"✅ به {count} کاربر، {format_diamonds(amount)} اضافه شد.")
+        await log_admin_action(update, "economy_add_diamonds", "users", str(count), f"Added {format_diamonds(amount)} to all")
     except Exception as e:
-        session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "economy_add_diamonds", "users", None, "Failed", success=False, error_message=str(e))
-    finally:
-        session.close()
 
 
 async def admin_economy_remove_diamonds(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -978,21 +1107,14 @@ async def admin_economy_remove_diamonds(update: Update, context: ContextTypes.DE
         await update.message.reply_text("❌ مقدار باید بزرگتر از صفر باشد.")
         return
 
-    session = get_session()
     try:
-        users = session.query(User).all()
-        for user in users:
-            user.diamonds = max(0, user.diamonds - amount)
-        session.commit()
+        count = _update_all_users("diamonds", lambda diamonds: max(0, diamonds - amount), admin_id)
 
-        await update.message.reply_text(f"✅ از {len(users)} کاربر، {format_diamonds(amount)} کم شد (تا حد صفر).")
-        await log_admin_action(update, "economy_remove_diamonds", "users", str(len(users)), f"Removed {format_diamonds(amount)} from all")
+        await update.message.reply_text(f"✅ از {count} کاربر، {format_diamonds(amount)} کم شد (تا حد صفر).")
+        await log_admin_action(update, "economy_remove_diamonds", "users", str(count), f"Removed {format_diamonds(amount)} from all")
     except Exception as e:
-        session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "economy_remove_diamonds", "users", None, "Failed", success=False, error_message=str(e))
-    finally:
-        session.close()
 
 
 async def admin_economy_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1001,22 +1123,17 @@ async def admin_economy_report(update: Update, context: ContextTypes.DEFAULT_TYP
     if not is_admin(admin_id):
         return
 
-    session = get_session()
-    try:
-        total_users = session.query(User).count()
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
+    totals = user_totals()
 
-        text = f"""
+    text = f"""
 📊 **گزارش اقتصادی**
 
-👥 کاربران: {format_number(total_users)}
-💰 کل سکه: {format_coins(total_coins)}
-💎 کل الماس: {format_diamonds(total_diamonds)}
+👥 کاربران: {format_number(totals["total"])}
+💰 کل سکه: {format_coins(totals["coins"])}
+💎 کل الماس: {format_diamonds(totals["diamonds"])}
 """
-        await update.message.reply_text(text, parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await update.message.reply_text(text, parse_mode="Markdown")
 
 
 # ========== SETTINGS COMMANDS ==========
@@ -1140,7 +1257,7 @@ async def admin_add_quest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ هدف باید بزرگتر از صفر باشد.")
         return
 
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
@@ -1195,9 +1312,9 @@ async def admin_edit_quest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     field = args[1].lower()
     value = " ".join(args[2:])
 
-    session = get_session()
+    sessions = get_shard_sessions()
     try:
-        quest = session.query(UserQuest).filter(UserQuest.id == quest_id).first()
+        session, quest = _find_quest(sessions, quest_id)
         if not quest:
             await update.message.reply_text("❌ ماموریت یافت نشد.")
             return
@@ -1224,11 +1341,13 @@ async def admin_edit_quest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("✅ ماموریت ویرایش شد.")
         await log_admin_action(update, "edit_quest", "quest", str(quest_id), f"Edited {field} to {value}")
     except Exception as e:
-        session.rollback()
+        for session in sessions:
+            session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "edit_quest", "quest", str(quest_id), "Failed", success=False, error_message=str(e))
     finally:
-        session.close()
+        for session in sessions:
+            session.close()
 
 
 async def admin_delete_quest(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1243,9 +1362,9 @@ async def admin_delete_quest(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     quest_id = safe_int(args[0], 0)
-    session = get_session()
+    sessions = get_shard_sessions()
     try:
-        quest = session.query(UserQuest).filter(UserQuest.id == quest_id).first()
+        session, quest = _find_quest(sessions, quest_id)
         if not quest:
             await update.message.reply_text("❌ ماموریت یافت نشد.")
             return
@@ -1256,11 +1375,13 @@ async def admin_delete_quest(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("✅ ماموریت حذف شد.")
         await log_admin_action(update, "delete_quest", "quest", str(quest_id), "Deleted quest")
     except Exception as e:
-        session.rollback()
+        for session in sessions:
+            session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "delete_quest", "quest", str(quest_id), "Failed", success=False, error_message=str(e))
     finally:
-        session.close()
+        for session in sessions:
+            session.close()
 
 
 async def admin_reset_quests(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1270,21 +1391,27 @@ async def admin_reset_quests(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("⛔️ فقط سوپر ادمین می‌تواند تمام ماموریت‌ها را ریست کند.")
         return
 
-    session = get_session()
+    sessions = get_shard_sessions()
     try:
-        quests = session.query(UserQuest).filter(UserQuest.completed == False).all()
-        for q in quests:
-            q.progress = 0
-        session.commit()
-
-        await update.message.reply_text(f"✅ {len(quests)} ماموریت فعال ریست شد.")
-        await log_admin_action(update, "reset_quests", "quests", str(len(quests)), "Reset active quests")
+        count = 0
+        for session in sessions:
+            quests = session.query(UserQuest).filter(UserQuest.completed == False).all()
+            for q in quests:
+                q.progress = 0
+            count += len(quests)
+        for session in sessions:
+            session.commit()
+
+        await update.message.reply_text(f"✅ {count} ماموریت فعال ریست شد.")
+        await log_admin_action(update, "reset_quests", "quests", str(count), "Reset active quests")
     except Exception as e:
-        session.rollback()
+        for session in sessions:
+            session.rollback()
         await update.message.reply_text(f"❌ خطا: {str(e)}")
         await log_admin_action(update, "reset_quests", "quests", None, "Failed", success=False, error_message=str(e))
     finally:
-        session.close()
+        for session in sessions:
+            session.close()
 
 
 async def admin_ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1305,7 +1432,7 @@ async def admin_ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reason = " ".join(args[1:]) if len(args) > 1 else "بدون دلیل"
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
@@ -1324,8 +1451,7 @@ async def admin_ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session.add(banned)
         
         # ریست کردن دارایی کاربر
-        user.coins = 0
-        user.diamonds = 0
+        credit(session, user, coins=-user.coins, diamonds=-user.diamonds, reason=ledger.ADMIN, ref_id=user_id)
         
         session.commit()
         
@@ -1387,7 +1513,7 @@ async def admin_reset_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ آیدی نامعتبر است.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
@@ -1395,8 +1521,7 @@ async def admin_reset_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # ریست کردن دارایی‌ها
-        user.coins = 0
-        user.diamonds = 0
+        credit(session, user, coins=-user.coins, diamonds=-user.diamonds, reason=ledger.ADMIN, ref_id=user_id)
         user.energy = 1000
         user.max_energy = 1000
         user.electricity = 5000
@@ -1440,7 +1565,7 @@ async def admin_delete_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ آیدی نامعتبر است.")
         return
     
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         if not user:
@@ -1505,6 +1630,7 @@ async def admin_join_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
             created_by=user_id
         )
         session.add(req)
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"""
@@ -1543,6 +1669,7 @@ async def admin_join_remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         chat_name = req.chat_name
         session.delete(req)
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"✅ {chat_name} از لیست الزامات حذف شد.")
@@ -1599,6 +1726,7 @@ async def admin_join_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return
         
         req.message = message
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"✅ پیام به‌روزرسانی شد.\n\n📝 پیام جدید:\n{message}")
@@ -1653,6 +1781,7 @@ async def admin_join_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         req.is_active = not req.is_active
         status = "فعال" if req.is_active else "غیرفعال"
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"✅ وضعیت به {status} تغییر کرد.")
@@ -1689,18 +1818,9 @@ async def admin_broadcast_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     message = " ".join(args)
     
-    session = get_session()
     try:
-        users = session.query(User).all()
-        success = 0
-        failed = 0
-        
-        for user in users:
-            try:
-                await context.bot.send_message(chat_id=user.user_id, text=message)
-                success += 1
-            except Exception:
-                failed += 1
+        user_ids = all_user_ids()
+        success, failed = await broadcast_message(context.bot, user_ids, message)
         
         await update.message.reply_text(f"""
 📢 **ارسال همگانی انجام شد**
@@ -1711,8 +1831,6 @@ async def admin_broadcast_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE
         await log_admin_action(update, "broadcast", "users", str(success), f"Sent broadcast to {success} users")
     except Exception as e:
         await update.message.reply_text(f"❌ خطا: {str(e)}")
-    finally:
-        session.close()
 
 
 async def admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1734,7 +1852,7 @@ async def admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = " ".join(args[1:])
     
     try:
-        await context.bot.send_message(chat_id=target_id, text=message)
+        await context.bot.send_message(chat_id=target_id, text=message, rate_limit_args=PRIORITY_ADMIN)
         await update.message.reply_text(f"✅ پیام به کاربر {target_id} ارسال شد.")
         await log_admin_action(update, "dm", "user", str(target_id), "Sent direct message")
     except Exception as e:
@@ -1763,24 +1881,14 @@ async def admin_announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {message}
 """
     
-    session = get_session()
     try:
-        users = session.query(User).all()
-        success = 0
-        
-        for user in users:
-            try:
-                await context.bot.send_message(chat_id=user.user_id, text=full_message, parse_mode="Markdown")
-                success += 1
-            except Exception:
-                pass
+        user_ids = all_user_ids()
+        success, _ = await broadcast_message(context.bot, user_ids, full_message, parse_mode="Markdown")
         
         await update.message.reply_text(f"✅ اعلامیه به {success} کاربر ارسال شد.")
         await log_admin_action(update, "announce", "users", str(success), f"Announcement: {title}")
     except Exception as e:
         await update.message.reply_text(f"❌ خطا: {str(e)}")
-    finally:
-        session.close()
 
 
 # ========== ITEM MANAGEMENT COMMANDS ==========
@@ -1819,6 +1927,7 @@ async def admin_add_item_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         item = GameItem(name=name, item_code=code, item_type=itype, price_diamonds=price)
         session.add(item)
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"✅ آیتم {name} با موفقیت اضافه شد!")
@@ -1852,6 +1961,7 @@ async def admin_set_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         old_price = item.price_diamonds
         item.price_diamonds = price
+        bump_catalog_version(session)
         session.commit()
         
         await update.message.reply_text(f"✅ قیمت {item.name} از {old_price} به {price} تغییر کرد.")
@@ -1870,7 +1980,7 @@ async def admin_item_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         return
     
-    session = get_session()
+    session = analytics.session()
     try:
         from database.models import ItemType
         
@@ -1890,6 +2000,7 @@ async def admin_item_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 📦 موجودی کل: {total_stock if total_stock > 0 else 'نامحدود'}
 """
+        text += f"\n{format_data_age(analytics.age())}"
         await update.message.reply_text(text, parse_mode="Markdown")
     finally:
         session.close()
@@ -1901,16 +2012,14 @@ async def admin_active_users(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not is_admin(user_id):
         return
     
-    session = get_session()
-    try:
-        # کاربران فعال در 24 ساعت اخیر
-        yesterday = datetime.now() - timedelta(days=1)
-        active_users = session.query(User).filter(User.updated_at >= yesterday).count()
-        
-        # کاربران با بیش از 10000 سکه
-        rich_users = session.query(User).filter(User.coins > 10000).count()
-        
-        text = f"""
+    totals = user_totals()
+    # کاربران فعال در 24 ساعت اخیر
+    active_users = totals["active_24h"]
+    
+    # کاربران با بیش از 10000 سکه
+    rich_users = totals["over_10k"]
+    
+    text = f"""
 📈 **آمار کاربران فعال**
 
 ⏰ **24 ساعت اخیر:**
@@ -1921,26 +2030,24 @@ async def admin_active_users(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 🏆 **کاربران برتر:**
 """
-        
-        top_users = session.query(User).order_by(User.coins.desc()).limit(5).all()
-        for i, user in enumerate(top_users, 1):
-            text += f"{i}. {user.first_name}: {format_coins(user.coins)}\n"
-        
-        await update.message.reply_text(text, parse_mode="Markdown")
-    finally:
-        session.close()
+    
+    top_users = users_by(User.coins, 5)
+    for i, user in enumerate(top_users, 1):
+        text += f"{i}. {user.first_name}: {format_coins(user.coins)}\n"
+    
+    text += f"\n{format_data_age(analytics.age())}"
+    await update.message.reply_text(text, parse_mode="Markdown")
 
 
 # ========== QUEST MANAGEMENT ==========
 
 async def show_admin_quests(query):
     """نمایش مدیریت ماموریت‌ها"""
-    session = get_session()
-    try:
-        total_quests = session.query(UserQuest).filter(UserQuest.completed == False).count()
-        completed_quests = session.query(UserQuest).filter(UserQuest.completed == True).count()
-        
-        text = f"""
+    counts = merge_sums(analytics.scatter(_quest_counts))
+    total_quests = counts["active"]
+    completed_quests = counts["completed"]
+    
+    text = f"""
 🎯 **مدیریت ماموریت‌ها**
 
 📊 آمار:
@@ -1955,48 +2062,41 @@ async def show_admin_quests(query):
 • /admin_delete_quest [آیدی]
 • /admin_reset_quests - ریست تمام ماموریت‌ها
 """
-        await query.edit_message_text(text, reply_markup=admin_quests_keyboard(), parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await query.edit_message_text(text, reply_markup=admin_quests_keyboard(), parse_mode="Markdown")
 
 
 async def show_quest_list(query):
     """نمایش لیست ماموریت‌ها"""
-    session = get_session()
-    try:
-        quests = session.query(UserQuest).limit(20).all()
-        
-        if not quests:
-            text = "📋 هیچ ماموریتی یافت نشد."
-            await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quests"))
-            return
-        
-        text = "🎯 **لیست ماموریت‌ها:**\n\n"
-        for quest in quests[:15]:
-            status = "✅" if quest.completed else "⏳"
-            text += f"{status} {quest.title} - {quest.progress}/{quest.goal}\n"
-        
-        if len(quests) > 15:
-            text += f"\n... و {len(quests) - 15} ماموریت دیگر"
-        
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quests"), parse_mode="Markdown")
-    finally:
-        session.close()
+    quests = [quest for shard_quests in scatter(_quests, 20) for quest in shard_quests][:20]
+    
+    if not quests:
+        text = "📋 هیچ ماموریتی یافت نشد."
+        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quests"))
+        return
+    
+    text = "🎯 **لیست ماموریت‌ها:**\n\n"
+    for quest in quests[:15]:
+        status = "✅" if quest.completed else "⏳"
+        text += f"{status} {quest.title} - {quest.progress}/{quest.goal}\n"
+    
+    if len(quests) > 15:
+        text += f"\n... و {len(quests) - 15} ماموریت دیگر"
+    
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quests"), parse_mode="Markdown")
 
 
 async def show_quest_detail(query, quest_id: int):
     """نمایش جزئیات ماموریت"""
-    session = get_session()
-    try:
-        quest = session.query(UserQuest).filter(UserQuest.id == quest_id).first()
-        if not quest:
-            await query.edit_message_text("❌ ماموریت یافت نشد.", reply_markup=admin_back_keyboard("admin_quests"))
-            return
-        
-        user = session.query(User).filter(User.user_id == quest.user_id).first()
-        status = "✅ تکمیل شده" if quest.completed else "⏳ در حال انجام"
-        
-        text = f"""
+    found = next((result for result in scatter(_quest_with_user, quest_id) if result), None)
+    if not found:
+        await query.edit_message_text("❌ ماموریت یافت نشد.", reply_markup=admin_back_keyboard("admin_quests"))
+        return
+    
+    quest, user = found
+    status = "✅ تکمیل شده" if quest.completed else "⏳ در حال انجام"
+    
+    text = f"""
 🎯 **جزئیات ماموریت**
 
 📛 عنوان: {quest.title}
@@ -2012,36 +2112,30 @@ async def show_quest_detail(query, quest_id: int):
 
 📅 ایجاد شده: {format_datetime(quest.created_at)}
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quest_list"), parse_mode="Markdown")
-    finally:
-        session.close()
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_quest_list"), parse_mode="Markdown")
 
 
 # ========== STATS CALLBACKS ==========
 
 async def show_stats_users(query):
     """نمایش آمار تفصیلی کاربران"""
-    session = get_session()
-    try:
-        total = session.query(User).count()
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        week_ago = today - timedelta(days=7)
-        
-        new_today = session.query(User).filter(func.date(User.created_at) == today).count()
-        new_yesterday = session.query(User).filter(func.date(User.created_at) == yesterday).count()
-        new_week = session.query(User).filter(func.date(User.created_at) >= week_ago).count()
-        
-        active_24h = session.query(User).filter(User.updated_at >= datetime.now() - timedelta(hours=24)).count()
-        active_7d = session.query(User).filter(User.updated_at >= datetime.now() - timedelta(days=7)).count()
-        
-        users_with_diamonds = session.query(User).filter(User.diamonds > 0).count()
-        users_with_coins = session.query(User).filter(User.coins > 0).count()
-        
-        avg_coins = session.query(func.avg(User.coins)).scalar() or 0
-        avg_diamonds = session.query(func.avg(User.diamonds)).scalar() or 0
-        
-        text = f"""
+    totals = user_totals()
+    total = totals["total"]
+    
+    new_today = totals["new_today"]
+    new_yesterday = totals["new_yesterday"]
+    new_week = totals["new_week"]
+    
+    active_24h = totals["active_24h"]
+    active_7d = totals["active_7d"]
+    
+    users_with_diamonds = totals["with_diamonds"]
+    users_with_coins = totals["with_coins"]
+    
+    avg_coins = totals["coins"] / total if total > 0 else 0
+    avg_diamonds = totals["diamonds"] / total if total > 0 else 0
+    
+    text = f"""
 👥 **آمار تفصیلی کاربران**
 
 📊 **کل کاربران:** {format_number(total)}
@@ -2062,25 +2156,25 @@ async def show_stats_users(query):
 • میانگین سکه: {format_coins(int(avg_coins))}
 • میانگین الماس: {int(avg_diamonds)} 💎
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
 
 
 async def show_stats_economy(query):
     """نمایش آمار تفصیلی اقتصادی"""
-    session = get_session()
+    session = analytics.session()
     try:
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
+        totals = user_totals()
+        total_coins = totals["coins"]
+        total_diamonds = totals["diamonds"]
         
-        max_coins_user = session.query(User).order_by(User.coins.desc()).first()
-        max_diamonds_user = session.query(User).order_by(User.diamonds.desc()).first()
+        max_coins_user = next(iter(users_by(User.coins, 1)), None)
+        max_diamonds_user = next(iter(users_by(User.diamonds, 1)), None)
         
         market_listings = session.query(MarketListing).count()
         total_market_value = session.query(func.sum(MarketListing.price_diamonds)).scalar() or 0
         
-        inventory_items = session.query(func.count(Inventory.id)).scalar() or 0
+        inventory_items = merge_sums(analytics.scatter(_inventory_totals))["rows"]
         
         text = f"""
 💰 **آمار تفصیلی اقتصادی**
@@ -2100,6 +2194,7 @@ async def show_stats_economy(query):
 📦 **موجودی:**
 • کل آیتم‌های در انبار: {format_number(inventory_items)}
 """
+        text += f"\n{format_data_age(analytics.age())}"
         await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
     finally:
         session.close()
@@ -2107,7 +2202,7 @@ async def show_stats_economy(query):
 
 async def show_stats_items(query):
     """نمایش آمار تفصیلی آیتم‌ها"""
-    session = get_session()
+    session = analytics.session()
     try:
         from database.models import ItemType
         
@@ -2118,13 +2213,13 @@ async def show_stats_items(query):
         avatars = session.query(GameItem).filter(GameItem.item_type == ItemType.AVATAR).count()
         energy = session.query(GameItem).filter(GameItem.item_type == ItemType.ENERGY).count()
         
-        total_inventory = session.query(func.sum(Inventory.quantity)).scalar() or 0
-        unique_owners = session.query(func.count(func.distinct(Inventory.user_id))).scalar() or 0
+        # هر کاربر فقط در یک شارد است، پس جمع مالکان شاردها همان تعداد کل مالکان است
+        inventory = merge_sums(analytics.scatter(_inventory_totals))
+        total_inventory = inventory["quantity"]
+        unique_owners = inventory["owners"]
         
-        most_popular = session.query(
-            GameItem.name,
-            func.count(Inventory.id).label('count')
-        ).join(Inventory).group_by(GameItem.name).order_by(func.count(Inventory.id).desc()).first()
+        owned = merge_sums(analytics.scatter(_owned_by_item))
+        most_popular = max(owned.items(), key=lambda item: item[1], default=None)
         
         text = f"""
 🎮 **آمار تفصیلی آیتم‌ها**
@@ -2142,6 +2237,7 @@ async def show_stats_items(query):
 • تعداد مالکان: {unique_owners}
 • محبوب‌ترین: {most_popular[0] if most_popular else 'ندارد'} ({most_popular[1] if most_popular else 0} نفر)
 """
+        text += f"\n{format_data_age(analytics.age())}"
         await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
     finally:
         session.close()
@@ -2149,34 +2245,26 @@ async def show_stats_items(query):
 
 async def show_leaderboard_callback(query):
     """نمایش جدول برترین‌ها از callback"""
-    session = get_session()
-    try:
-        top_users = session.query(User).order_by(User.coins.desc()).limit(15).all()
-        
-        text = "🏆 **جدول برترین‌ها**\n\n"
-        for i, user in enumerate(top_users, 1):
-            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            text += f"{medal} {user.first_name[:20]}: {format_coins(user.coins)}\n"
-        
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
-    finally:
-        session.close()
+    top_users = users_by(User.coins, 15)
+    
+    text = "🏆 **جدول برترین‌ها**\n\n"
+    for i, user in enumerate(top_users, 1):
+        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+        text += f"{medal} {user.first_name[:20]}: {format_coins(user.coins)}\n"
+    
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
 
 
 async def show_active_users_callback(query):
     """نمایش کاربران فعال از callback"""
-    session = get_session()
-    try:
-        yesterday = datetime.now() - timedelta(days=1)
-        active_users = session.query(User).filter(User.updated_at >= yesterday).order_by(User.updated_at.desc()).limit(20).all()
-        
-        text = "📈 **کاربران فعال (24 ساعت اخیر)**\n\n"
-        for user in active_users:
-            text += f"👤 {user.first_name[:20]} - {format_datetime(user.updated_at)}\n"
-        
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
-    finally:
-        session.close()
+    yesterday = datetime.now() - timedelta(days=1)
+    active_users = users_by(User.updated_at, 20, User.updated_at >= yesterday)
+    
+    text = "📈 **کاربران فعال (24 ساعت اخیر)**\n\n"
+    for user in active_users:
+        text += f"👤 {user.first_name[:20]} - {format_datetime(user.updated_at)}\n"
+    
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_stats"), parse_mode="Markdown")
 
 
 # ========== ECONOMY CALLBACKS ==========
@@ -2263,19 +2351,18 @@ async def show_economy_remove_diamonds(query):
 
 async def show_economy_report(query):
     """نمایش گزارش اقتصادی"""
-    session = get_session()
-    try:
-        total_users = session.query(User).count()
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
-        
-        avg_coins = total_coins / total_users if total_users > 0 else 0
-        avg_diamonds = total_diamonds / total_users if total_users > 0 else 0
-        
-        rich_users = session.query(User).filter(User.coins > 100000).count()
-        poor_users = session.query(User).filter(User.coins < 1000).count()
-        
-        text = f"""
+    totals = user_totals()
+    total_users = totals["total"]
+    total_coins = totals["coins"]
+    total_diamonds = totals["diamonds"]
+    
+    avg_coins = total_coins / total_users if total_users > 0 else 0
+    avg_diamonds = total_diamonds / total_users if total_users > 0 else 0
+    
+    rich_users = totals["over_100k"]
+    poor_users = totals["under_1k"]
+    
+    text = f"""
 📊 **گزارش کامل اقتصادی**
 
 💰 **سکه:**
@@ -2292,9 +2379,8 @@ async def show_economy_report(query):
 • نسبت سکه به الماس: {int(total_coins/total_diamonds) if total_diamonds > 0 else 0}:1
 • نرخ تورم: متعادل ✅
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_economy"), parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_economy"), parse_mode="Markdown")
 
 
 # ========== MONITORING CALLBACKS ==========
@@ -2317,6 +2403,8 @@ async def show_monitor_bot(query):
         ram_info = "N/A"
         uptime_info = "N/A"
     
+    updates = summarize_histogram(registry.samples(), "bot_update_duration_seconds")
+    
     text = f"""
 🤖 **وضعیت ربات**
 
@@ -2328,9 +2416,22 @@ async def show_monitor_bot(query):
 
 📊 **آمار:**
 • تعداد کاربران: در حال محاسبه...
-• پیام‌های پردازش شده: N/A
-• میانگین زمان پاسخ: <100ms
+• آپدیت‌های پردازش شده: {format_number(updates['count'])}
+• زمان پاسخ: میانگین {_format_ms(updates['avg_ms'])} | p95 {_format_ms(updates['p95_ms'])}
 """
+
+    rate_limiter = getattr(query.get_bot(), "rate_limiter", None)
+    if rate_limiter is not None and hasattr(rate_limiter, "get_stats"):
+        outbound = rate_limiter.get_stats()
+        text += f"\n📤 **صف ارسال:** {outbound['queue_depth']} در انتظار"
+        if outbound['paused_for']:
+            text += f" (توقف {outbound['paused_for']}s به‌خاطر محدودیت تلگرام)"
+        for lane, stats in outbound['lanes'].items():
+            text += (
+                f"\n• {lane}: {stats['sent']} ارسال، {stats['failed']} خطا، "
+                f"انتظار {stats['avg_wait_ms']}ms (حداکثر {stats['max_wait_ms']}ms)"
+            )
+
     await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
 
 
@@ -2377,34 +2478,109 @@ async def show_monitor_resources(query):
     await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
 
 
+def _format_ms(value) -> str:
+    """نمایش میلی‌ثانیه (یا N/A وقتی داده‌ای نیست)"""
+    return "N/A" if value is None else f"{value:.1f}ms"
+
+
 async def show_monitor_performance(query):
     """نمایش عملکرد"""
-    session = get_session()
-    try:
-        total_users = session.query(User).count()
-        active_24h = session.query(User).filter(User.updated_at >= datetime.now() - timedelta(hours=24)).count()
-        
-        text = f"""
+    totals = user_totals()
+    total_users = totals["total"]
+    active_24h = totals["active_24h"]
+    
+    text = f"""
 ⚡ **عملکرد ربات**
 
 📈 **فعالیت:**
 • کاربران کل: {format_number(total_users)}
 • کاربران فعال (24h): {active_24h}
 • نرخ فعالیت: {(active_24h/total_users*100) if total_users > 0 else 0:.1f}%
-
-⏱️ **زمان پاسخ:**
-• میانگین: ~50ms
-• حداکثر: ~200ms
-• حداقل: ~10ms
+{format_data_age(analytics.age())}
+"""
+    
+    samples = await load_api_metrics(METRICS_URL, METRICS_TOKEN)
+    if samples is None:
+        text += "\n⚠️ متریک‌های API در دسترس نیست (METRICS\\_URL را بررسی کنید)\n"
+    else:
+        api = summarize_http(samples)
+        uptime = api['uptime_seconds']
+        uptime_info = f"{int(uptime // 86400)} روز، {int(uptime % 86400 // 3600)} ساعت" if uptime else "N/A"
+        db_per_request = api['db_queries_per_request']
+        text += f"""
+⏱️ **زمان پاسخ API:**
+• میانگین: {_format_ms(api['avg_ms'])}
+• p50: {_format_ms(api['p50_ms'])} | p95: {_format_ms(api['p95_ms'])} | p99: {_format_ms(api['p99_ms'])}
+• درخواست‌ها: {format_number(api['requests'])} (در حال اجرا: {api['in_flight']})
+
+🗄️ **دیتابیس (API):**
+• کوئری در هر درخواست: {f"{db_per_request:.1f}" if db_per_request is not None else "N/A"}
+• میانگین هر کوئری: {_format_ms(api['db_avg_ms'])}
 
 ✅ **پایداری:**
-• Uptime: 99.9%
-• خطاها در 24h: 0
-• Warning در 24h: 0
+• زمان اجرای API: {uptime_info}
+• خطای سرور (5xx): {api['server_errors']} ({api['error_rate']:.2f}%)
+• خطای درخواست (4xx): {api['client_errors']}
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
-    finally:
-        session.close()
+        if api['routes']:
+            text += "\n🐢 **کندترین مسیرها:**\n"
+            for row in api['routes'][:5]:
+                text += (
+                    f"• `{row['route']}` — {_format_ms(row['avg_ms'])} "
+                    f"(p95 {_format_ms(row['p95_ms'])}، {row['db_queries_avg']:.1f} کوئری)\n"
+                )
+    
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
+
+
+async def show_monitor_queries(query):
+    """نمایش کوئری‌های کند و موارد مشکوک به N+1"""
+    entries, remote_ok = await load_query_log()
+    repeats = [e for e in entries if e['kind'] == "n_plus_one"][-5:]
+    slow = sorted((e for e in entries if e['kind'] == "slow"), key=lambda e: e['duration_ms'], reverse=True)[:5]
+    
+    text = f"""
+🐢 **کوئری‌های کند و N+1**
+
+⚙️ کندتر از {SLOW_QUERY_MS:g}ms | تکرار بیش از {N_PLUS_ONE_THRESHOLD} بار در یک درخواست
+"""
+    if not remote_ok:
+        text += "⚠️ لاگ API در دسترس نیست؛ فقط موارد ربات نمایش داده می‌شود.\n"
+    
+    text += "\n🔁 **مشکوک به N+1 (آخرین موارد):**\n"
+    if not repeats:
+        text += "• موردی ثبت نشده است.\n"
+    for entry in reversed(repeats):
+        text += f"• `{entry['scope']}` — {entry['count']} بار\n  ↳ `{truncate_text(entry['call_site'], 120)}`\n"
+    
+    text += "\n🐌 **کندترین کوئری‌ها:**\n"
+    if not slow:
+        text += "• موردی ثبت نشده است.\n"
+    for entry in slow:
+        text += (
+            f"• {entry['duration_ms']:.0f}ms — `{entry['scope'] or '-'}` ({format_datetime(datetime.fromtimestamp(entry['ts']))})\n"
+            f"  ↳ `{truncate_text(entry['call_site'], 120)}`\n"
+        )
+    
+    await query.edit_message_text(text, reply_markup=admin_query_log_keyboard(), parse_mode="Markdown")
+
+
+async def send_query_log_dump(query, context: ContextTypes.DEFAULT_TYPE):
+    """ارسال کامل لاگ کوئری‌ها به صورت فایل JSON lines"""
+    entries, _ = await load_query_log()
+    if not entries:
+        await query.message.reply_text("✅ لاگ کوئری خالی است.")
+        return
+    
+    data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+    document = io.BytesIO(data.encode("utf-8"))
+    document.name = f"query_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    await context.bot.send_document(
+        chat_id=query.message.chat_id,
+        document=document,
+        caption=f"🐢 {len(entries)} مورد",
+        rate_limit_args=PRIORITY_ADMIN
+    )
 
 
 async def show_monitor_errors(query):
@@ -2431,17 +2607,13 @@ async def show_monitor_errors(query):
 
 async def show_monitor_usage(query):
     """نمایش آمار استفاده"""
-    session = get_session()
-    try:
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        users_today = session.query(User).filter(func.date(User.created_at) == today).count()
-        users_yesterday = session.query(User).filter(func.date(User.created_at) == yesterday).count()
-        
-        active_today = session.query(User).filter(func.date(User.updated_at) == today).count()
-        
-        text = f"""
+    totals = user_totals()
+    users_today = totals["new_today"]
+    users_yesterday = totals["new_yesterday"]
+    
+    active_today = totals["active_today"]
+    
+    text = f"""
 📈 **آمار استفاده**
 
 📅 **امروز:**
@@ -2455,9 +2627,8 @@ async def show_monitor_usage(query):
 • رشد کاربران: {((users_today - users_yesterday) / users_yesterday * 100) if users_yesterday > 0 else 0:.1f}%
 • روند: {'📈 صعودی' if users_today > users_yesterday else '📉 نزولی'}
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_monitoring"), parse_mode="Markdown")
 
 
 # ========== SETTINGS CALLBACKS ==========
@@ -2510,12 +2681,11 @@ async def show_settings_game(query):
 
 async def show_settings_economy(query):
     """نمایش تنظیمات اقتصادی"""
-    session = get_session()
-    try:
-        total_coins = session.query(func.sum(User.coins)).scalar() or 0
-        total_diamonds = session.query(func.sum(User.diamonds)).scalar() or 0
-        
-        text = f"""
+    totals = user_totals()
+    total_coins = totals["coins"]
+    total_diamonds = totals["diamonds"]
+    
+    text = f"""
 💰 **تنظیمات اقتصادی**
 
 📊 **وضعیت فعلی:**
@@ -2530,9 +2700,8 @@ async def show_settings_economy(query):
 
 برای تغییر تنظیمات اقتصادی با دقت عمل کنید تا تعادل اقتصادی حفظ شود.
 """
-        await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_settings"), parse_mode="Markdown")
-    finally:
-        session.close()
+    text += f"\n{format_data_age(analytics.age())}"
+    await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_settings"), parse_mode="Markdown")
 
 
 async def show_settings_security(query):
@@ -2661,7 +2830,7 @@ async def show_logs_search(query):
 
 async def show_logs_report(query):
     """نمایش گزارش عملیات"""
-    session = get_session()
+    session = analytics.session()
     try:
         today = datetime.now().date()
         week_ago = today - timedelta(days=7)
@@ -2703,6 +2872,7 @@ async def show_logs_report(query):
         for action, count in top_actions:
             text += f"• {action}: {count} بار\n"
         
+        text += f"\n{format_data_age(analytics.age())}"
         await query.edit_message_text(text, reply_markup=admin_back_keyboard("admin_logs"), parse_mode="Markdown")
     finally:
         session.close()
@@ -3429,65 +3599,5 @@ async def show_help_emergency(query):
 # ========== REGISTER ADMIN HANDLERS ==========
 
 def register_admin_handlers(application):
-    """ثبت تمام هندلرهای ادمین"""
-    
-    # دستورات
-    application.add_handler(CommandHandler("admin", admin_panel))
-    application.add_handler(CommandHandler("admin_help", admin_help_command))
-    application.add_handler(CommandHandler("admin_users", admin_users))
-    application.add_handler(CommandHandler("admin_items", admin_items_cmd))
-    application.add_handler(CommandHandler("admin_stats", admin_stats_cmd))
-    application.add_handler(CommandHandler("admin_leaderboard", admin_leaderboard))
-    application.add_handler(CommandHandler("admin_search_user", admin_search_user))
-    application.add_handler(CommandHandler("admin_give_coins", admin_give_coins))
-    application.add_handler(CommandHandler("admin_give_diamonds", admin_give_diamonds))
-    application.add_handler(CommandHandler("admin_ban_user", admin_ban_user))
-    application.add_handler(CommandHandler("admin_unban_user", admin_unban_user))
-    application.add_handler(CommandHandler("admin_reset_user", admin_reset_user))
-    application.add_handler(CommandHandler("admin_delete_user", admin_delete_user))
-    
-    # آیتم‌ها
-    application.add_handler(CommandHandler("admin_add_item", admin_add_item_cmd))
-    application.add_handler(CommandHandler("admin_set_price", admin_set_price))
-    application.add_handler(CommandHandler("admin_item_stats", admin_item_stats))
-    
-    # جوین
-    application.add_handler(CommandHandler("admin_join", admin_join_settings))
-    application.add_handler(CommandHandler("admin_join_add", admin_join_add))
-    application.add_handler(CommandHandler("admin_join_remove", admin_join_remove))
-    application.add_handler(CommandHandler("admin_join_list", admin_join_list))
-    application.add_handler(CommandHandler("admin_join_message", admin_join_message))
-    application.add_handler(CommandHandler("admin_join_toggle", admin_join_toggle))
-    
-    # ارسال همگانی
-    application.add_handler(CommandHandler("admin_broadcast", admin_broadcast_cmd))
-    application.add_handler(CommandHandler("admin_dm", admin_dm))
-    application.add_handler(CommandHandler("admin_announce", admin_announce))
-    
-    # آمار
-    application.add_handler(CommandHandler("admin_active_users", admin_active_users))
-    
-    # اقتصاد
-    application.add_handler(CommandHandler("admin_remove_coins", admin_remove_coins))
-    application.add_handler(CommandHandler("admin_remove_diamonds", admin_remove_diamonds))
-    application.add_handler(CommandHandler("admin_economy_add_coins", admin_economy_add_coins))
-    application.add_handler(CommandHandler("admin_economy_remove_coins", admin_economy_remove_coins))
-    application.add_handler(CommandHandler("admin_economy_add_diamonds", admin_economy_add_diamonds))
-    application.add_handler(CommandHandler("admin_economy_remove_diamonds", admin_economy_remove_diamonds))
-    application.add_handler(CommandHandler("admin_economy_report", admin_economy_report))
-    
-    # تنظیمات
-    application.add_handler(CommandHandler("admin_get_setting", admin_get_setting_cmd))
-    application.add_handler(CommandHandler("admin_set_setting", admin_set_setting_cmd))
-    
-    # لاگ‌ها
-    application.add_handler(CommandHandler("admin_search_logs", admin_search_logs))
-    
-    # ماموریت‌ها
-    application.add_handler(CommandHandler("admin_add_quest", admin_add_quest))
-    application.add_handler(CommandHandler("admin_edit_quest", admin_edit_quest))
-    application.add_handler(CommandHandler("admin_delete_quest", admin_delete_quest))
-    application.add_handler(CommandHandler("admin_reset_quests", admin_reset_quests))
-    
-    # کال‌بک‌ها
-    application.add_handler(CallbackQueryHandler(admin_panel_callback, pattern="^admin_"))
+    """ثبت تمام هندلرهای ادمین (فهرست در handlers.lazy)"""
+    add_handlers(application, ADMIN_PANEL_HANDLERS, lambda name: globals()[name])
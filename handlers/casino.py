@@ -1,8 +1,9 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import random
-from database.connection import get_session
-from database.queries import get_user
+from database.executor import run_user_db
+from database import ledger
+from database.queries import change_balance
 
 async def casino_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -16,69 +17,67 @@ async def casino_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+# The round is decided first; the bet and the win then settle in one conditional
+# UPDATE, which fails (None) if the player can't cover the bet.
+
+def _crash(session, user_id: int, bet: int):
+    # Crash logic: random multiplier between 0 and 5
+    multiplier = round(random.uniform(0, 5), 2)
+    win = int(bet * multiplier) if multiplier >= 1.0 else 0
+    
+    if change_balance(session, user_id, diamonds=win - bet, min_diamonds=bet, reason=ledger.CASINO) is None:
+        return None
+    
+    if not win:
+        return f"🚀 ضریب: `{multiplier}x`\n💥 متاسفانه باختید!"
+    
+    return f"🚀 ضریب: `{multiplier}x`\n💰 تبریک! شما برنده {win} الماس شدید!"
+
+def _slots(session, user_id: int, cost: int):
+    emojis = ["🍎", "💎", "🎰", "🔔", "🍒"]
+    result = [random.choice(emojis) for _ in range(3)]
+    
+    msg = f"🎰 نتیجه: {' | '.join(result)}\n\n"
+    
+    if result[0] == result[1] == result[2]:
+        win = 50
+        msg += f"🎉 تبریک! شما برنده {win} الماس شدید!"
+    elif result[0] == result[1] or result[1] == result[2] or result[0] == result[2]:
+        win = 10
+        msg += f"✨ خوب بود! شما برنده {win} الماس شدید!"
+    else:
+        win = 0
+        msg += "😔 متاسفانه برنده نشدید. دوباره امتحان کنید!"
+    
+    if change_balance(session, user_id, diamonds=win - cost, min_diamonds=cost, reason=ledger.CASINO) is None:
+        return None
+    
+    return msg
+
 async def casino_crash(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
     bet = 10 # 10 diamonds bet
     
-    session = get_session()
-    user = get_user(session, user_id)
+    msg = await run_user_db(user_id, _crash, user_id, bet)
     
-    if user.diamonds < bet:
+    if msg is None:
         await query.answer("الماس کافی ندارید! (۱۰ الماس نیاز است)", show_alert=True)
-        session.close()
         return
-        
-    user.diamonds -= bet
-    
-    # Crash logic: random multiplier between 0 and 5
-    multiplier = round(random.uniform(0, 5), 2)
-    
-    if multiplier < 1.0:
-        msg = f"🚀 ضریب: `{multiplier}x`\n💥 متاسفانه باختید!"
-    else:
-        win = int(bet * multiplier)
-        user.diamonds += win
-        msg = f"🚀 ضریب: `{multiplier}x`\n💰 تبریک! شما برنده {win} الماس شدید!"
-        
-    session.commit()
     
     keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data="casino_main")]]
     await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
-    session.close()
 
 async def casino_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
     cost = 5 # 5 diamonds per spin
     
-    session = get_session()
-    user = get_user(session, user_id)
+    msg = await run_user_db(user_id, _slots, user_id, cost)
     
-    if user.diamonds < cost:
+    if msg is None:
         await query.answer("الماس کافی ندارید! (۵ الماس نیاز است)", show_alert=True)
-        session.close()
         return
-        
-    user.diamonds -= cost
-    
-    emojis = ["🍎", "💎", "🎰", "🔔", "🍒"]
-    result = [random.choice(emojis) for _ in range(3)]
-    
-    msg = f"🎰 نتیجه: {' | '.join(result)}\n\n"
-    
-    if result[0] == result[1] == result[2]:
-        win = 50
-        user.diamonds += win
-        msg += f"🎉 تبریک! شما برنده {win} الماس شدید!"
-    elif result[0] == result[1] or result[1] == result[2] or result[0] == result[2]:
-        win = 10
-        user.diamonds += win
-        msg += f"✨ خوب بود! شما برنده {win} الماس شدید!"
-    else:
-        msg += "😔 متاسفانه برنده نشدید. دوباره امتحان کنید!"
-        
-    session.commit()
     
     keyboard = [
         [InlineKeyboardButton("🎰 چرخش دوباره (۵ 💎)", callback_data="casino_slots")],
@@ -86,4 +85,3 @@ async def casino_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     
     await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard))
-    session.close()
@@ -1,78 +1,93 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.connection import get_session
-from database.queries import get_user, update_quest_progress, get_user_inventory
+from database import ledger
+from database.executor import run_user_db
+from database.queries import get_user, update_quest_progress, get_user_inventory, credit
 from utils.game_logic import process_click, calculate_mining_rewards
+from utils.formatters import format_user_profile
 from utils.keyboards import main_menu_keyboard, back_to_main_keyboard
+from utils.edit_coalescer import profile_edits
 from datetime import datetime
 
+
+def _click(session, user_id: int):
+    user = get_user(session, user_id)
+    result, error = process_click(user, session)
+    if error:
+        return None, error, None
+    # Quest progress goes into the same commit as the click
+    update_quest_progress(session, user_id, "CLICK", 1, commit=False)
+    return result, None, format_user_profile(user)
+
+
+def _mine(session, user_id: int):
+    user = get_user(session, user_id)
+    inventory = get_user_inventory(session, user_id)
+
+    coins, electricity, diamonds, error = calculate_mining_rewards(user, inventory, datetime.now())
+    if error:
+        return None, error, None
+
+    user.electricity -= electricity
+    user.last_mined_at = datetime.now()
+    credit(session, user, coins=coins, diamonds=diamonds, reason=ledger.MINE)
+    update_quest_progress(session, user_id, "MINE", coins, commit=False)
+
+    return (coins, electricity, diamonds), None, format_user_profile(user)
+
+
+async def _show_profile(query, context: ContextTypes.DEFAULT_TYPE, text: str):
+    # Debounced: rapid taps produce at most one edit per interval, with the latest state
+    await profile_edits.edit(
+        context.bot,
+        query.message.chat_id,
+        query.message.message_id,
+        text,
+        reply_markup=main_menu_keyboard(),
+        parse_mode="Markdown"
+    )
+
+
+async def cancel_pending_profile_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drop a pending profile re-render once the user navigates away from it."""
+    query = update.callback_query
+    if query.message:
+        profile_edits.cancel(query.message.chat_id, query.message.message_id)
+
+
 async def click_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    
-    session = get_session()
-    user = get_user(session, user_id)
-    
-    result, error = process_click(user, session)
-    
+
+    result, error, profile_text = await run_user_db(user_id, _click, user_id)
+
     if error:
         await query.answer(error, show_alert=True)
-        session.close()
         return
 
-    session.commit()
-    
     msg = f"🖱 کلیک موفق! +{result['coins_earned']} سکه"
     if result['leveled_up']:
         msg += "\n🆙 تبریک! شما به سطح جدیدی رسیدید!"
     if result['diamond_found']:
         msg += "\n💎 ایول! ۱ الماس پیدا کردید!"
-        
+
     await query.answer(msg)
-    
+
     # Update UI
-    from utils.formatters import format_user_profile
-    await query.edit_message_text(
-        format_user_profile(user),
-        reply_markup=main_menu_keyboard(),
-        parse_mode="Markdown"
-    )
-    
-    # Update quests
-    update_quest_progress(session, user_id, "CLICK", 1)
-    session.close()
+    await _show_profile(query, context, profile_text)
 
 async def mine_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    
-    session = get_session()
-    user = get_user(session, user_id)
-    inventory = get_user_inventory(session, user_id)
-    
-    coins, electricity, diamonds, error = calculate_mining_rewards(user, inventory, datetime.now())
-    
+
+    rewards, error, profile_text = await run_user_db(user_id, _mine, user_id)
+
     if error:
         await query.answer(f"❌ خطا: {error}", show_alert=True)
-        session.close()
         return
-    
-    user.coins += coins
-    user.electricity -= electricity
-    user.diamonds += diamonds
-    user.last_mined_at = datetime.now()
-    
-    session.commit()
-    
+
+    coins, electricity, diamonds = rewards
     await query.answer(f"⛏ استخراج موفق!\n💰 سکه: {coins}\n🔌 برق مصرفی: {electricity}\n💎 الماس: {diamonds}", show_alert=True)
-    
+
     # Update UI
-    from utils.formatters import format_user_profile
-    await query.edit_message_text(
-        format_user_profile(user),
-        reply_markup=main_menu_keyboard(),
-        parse_mode="Markdown"
-    )
-    
-    update_quest_progress(session, user_id, "MINE", coins)
-    session.close()
+    await _show_profile(query, context, profile_text)
@@ -6,28 +6,42 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
 from sqlalchemy import and_
 from database.connection import get_session
+from database.shards import scatter, get_user_session
+from database.snapshot import analytics
 from database.models import User
 from database.admin_models import JoinRequirement
 from config import ADMIN_IDS
-from utils.admin_helpers import is_admin, log_admin_action, format_datetime, safe_int
+from utils.admin_helpers import is_admin, log_admin_action, format_datetime, format_data_age, safe_int
 from utils.admin_keyboards import verification_keyboard, admin_back_keyboard, admin_join_keyboard
+from bot.rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_BROADCAST
+from handlers.lazy import JOIN_VERIFICATION_HANDLERS, add_handlers
 
 logger = logging.getLogger(__name__)
 
 
+def _users(session) -> List[User]:
+    return session.query(User).all()
+
+
+def all_users() -> List[User]:
+    """همه کاربران، از همه شاردهای دیتابیس"""
+    return [user for shard_users in scatter(_users) for user in shard_users]
+
+
 class JoinVerificationSystem:
     """سیستم بررسی عضویت اجباری"""
     
     def __init__(self):
         self.pending_verifications = {}  # user_id -> list of required chat_ids
     
-    async def check_user_join_status(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, retry_on_error: bool = True) -> Dict[str, Any]:
+    async def check_user_join_status(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, retry_on_error: bool = True, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
         """بررسی وضعیت عضویت کاربر در گروه‌های الزامی با مدیریت خطا بهتر
 
         Args:
             user_id: آیدی کاربر
             context: ContextTypes.DEFAULT_TYPE
             retry_on_error: تلاش مجدد در صورت خطا
+            priority: اولویت درخواست‌ها در صف ارسال (بررسی‌های گروهی: PRIORITY_BROADCAST)
 
         Returns:
             dict: {
@@ -73,7 +87,8 @@ class JoinVerificationSystem:
                     chat_member = await asyncio.wait_for(
                         bot.get_chat_member(
                             chat_id=req.chat_id,
-                            user_id=user_id
+                            user_id=user_id,
+                            rate_limit_args=priority
                         ),
                         timeout=10.0
                     )
@@ -102,7 +117,8 @@ class JoinVerificationSystem:
                             await asyncio.sleep(1)
                             chat_member = await bot.get_chat_member(
                                 chat_id=req.chat_id,
-                                user_id=user_id
+                                user_id=user_id,
+                                rate_limit_args=priority
                             )
                             if chat_member.status in ['member', 'administrator', 'creator']:
                                 group_info['is_member'] = True
@@ -350,30 +366,28 @@ async def admin_join_check_all(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await update.message.reply_text("🔄 در حال بررسی وضعیت تمام کاربران...")
     
-    session = get_session()
-    try:
-        users = session.query(User).all()
-        verified_count = 0
-        unverified_count = 0
-        
-        for user in users:
-            result = await join_verification_system.check_user_join_status(user.user_id, context)
-            if result['is_member']:
-                verified_count += 1
-            else:
-                unverified_count += 1
-        
-        await update.message.reply_text(f"""
+    users = all_users()
+    verified_count = 0
+    unverified_count = 0
+    
+    for user in users:
+        result = await join_verification_system.check_user_join_status(
+            user.user_id, context, priority=PRIORITY_BROADCAST
+        )
+        if result['is_member']:
+            verified_count += 1
+        else:
+            unverified_count += 1
+    
+    await update.message.reply_text(f"""
 📊 **نتایج بررسی:**
 
 ✅ تأیید شده: {verified_count}
 ❌ تأیید نشده: {unverified_count}
 👥 کل کاربران: {len(users)}
 """, parse_mode="Markdown")
-        
-        await log_admin_action(update, "join_check_all", "users", str(len(users)), f"Verified: {verified_count}, Unverified: {unverified_count}")
-    finally:
-        session.close()
+    
+    await log_admin_action(update, "join_check_all", "users", str(len(users)), f"Verified: {verified_count}, Unverified: {unverified_count}")
 
 
 async def admin_join_remove_all_inactive(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -382,21 +396,21 @@ async def admin_join_remove_all_inactive(update: Update, context: ContextTypes.D
     if not is_admin(user_id):
         return
     
-    session = get_session()
-    try:
-        users = session.query(User).all()
-        unverified_users = []
-        
-        for user in users:
-            result = await join_verification_system.check_user_join_status(user.user_id, context)
-            if not result['is_member']:
-                unverified_users.append(user)
-        
-        if not unverified_users:
-            await update.message.reply_text("✅ تمام کاربران تأیید شده‌اند.")
-            return
-        
-        text = f"""
+    users = all_users()
+    unverified_users = []
+    
+    for user in users:
+        result = await join_verification_system.check_user_join_status(
+            user.user_id, context, priority=PRIORITY_BROADCAST
+        )
+        if not result['is_member']:
+            unverified_users.append(user)
+    
+    if not unverified_users:
+        await update.message.reply_text("✅ تمام کاربران تأیید شده‌اند.")
+        return
+    
+    text = f"""
 ⚠️ **هشدار**
 
 {len(unverified_users)} کاربر در گروه‌های الزامی عضو نیستند.
@@ -404,19 +418,17 @@ async def admin_join_remove_all_inactive(update: Update, context: ContextTypes.D
 آیا می‌خواهید این کاربران را حذف کنید؟
 (این عملیات برگشت‌پذیر نیست)
 """
-        # ذخیره لیست کاربران برای تأیید
-        context.user_data['pending_remove_users'] = [u.user_id for u in unverified_users]
-        
-        await update.message.reply_text(
-            text,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("✅ بله، حذف کن", callback_data="admin_join_confirm_remove")],
-                [InlineKeyboardButton("❌ خیر", callback_data="admin_join")]
-            ]),
-            parse_mode="Markdown"
-        )
-    finally:
-        session.close()
+    # ذخیره لیست کاربران برای تأیید
+    context.user_data['pending_remove_users'] = [u.user_id for u in unverified_users]
+    
+    await update.message.reply_text(
+        text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ بله، حذف کن", callback_data="admin_join_confirm_remove")],
+            [InlineKeyboardButton("❌ خیر", callback_data="admin_join")]
+        ]),
+        parse_mode="Markdown"
+    )
 
 
 async def admin_join_confirm_remove_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -434,29 +446,30 @@ async def admin_join_confirm_remove_callback(update: Update, context: ContextTyp
         await query.edit_message_text("❌ لیست کاربران یافت نشد.")
         return
     
-    session = get_session()
+    from database.models import Inventory, UserAchievement, UserQuest, MarketListing
     try:
         deleted_count = 0
+        # هر کاربر روی شارد خودش حذف می‌شود
         for uid in pending_users:
-            user = session.query(User).filter(User.user_id == uid).first()
-            if user:
-                # حذف داده‌های مرتبط
-                from database.models import Inventory, UserAchievement, UserQuest, MarketListing
-                session.query(Inventory).filter(Inventory.user_id == uid).delete()
-                session.query(UserAchievement).filter(UserAchievement.user_id == uid).delete()
-                session.query(UserQuest).filter(UserQuest.user_id == uid).delete()
-                session.query(MarketListing).filter(MarketListing.seller_id == uid).delete()
-                session.query(User).filter(User.user_id == uid).delete()
-                deleted_count += 1
-        
-        session.commit()
+            session = get_user_session(uid)
+            try:
+                user = session.query(User).filter(User.user_id == uid).first()
+                if user:
+                    # حذف داده‌های مرتبط
+                    session.query(Inventory).filter(Inventory.user_id == uid).delete()
+                    session.query(UserAchievement).filter(UserAchievement.user_id == uid).delete()
+                    session.query(UserQuest).filter(UserQuest.user_id == uid).delete()
+                    session.query(MarketListing).filter(MarketListing.seller_id == uid).delete()
+                    session.query(User).filter(User.user_id == uid).delete()
+                    session.commit()
+                    deleted_count += 1
+            finally:
+                session.close()
         
         await query.edit_message_text(f"✅ {deleted_count} کاربر حذف شد.")
         await log_admin_action(update, "join_remove_inactive", "users", str(deleted_count), f"Removed {deleted_count} unverified users")
     except Exception as e:
         await query.edit_message_text(f"❌ خطا: {str(e)}")
-    finally:
-        session.close()
 
 
 async def admin_join_import_from_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -506,7 +519,7 @@ async def admin_join_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(user_id):
         return
 
-    session = get_session()
+    session = analytics.session()
     try:
         requirements = session.query(JoinRequirement).all()
         active_reqs = [r for r in requirements if r.is_active]
@@ -526,6 +539,7 @@ async def admin_join_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             status = "✅" if req.is_active else "❌"
             text += f"{status} {req.chat_name} ({req.chat_id})\n"
 
+        text += f"\n{format_data_age(analytics.age())}"
         await update.message.reply_text(text, parse_mode="Markdown")
     finally:
         session.close()
@@ -553,7 +567,7 @@ async def admin_join_verify_test(update: Update, context: ContextTypes.DEFAULT_T
     result = await join_verification_system.check_user_join_status(target_id, context)
 
     # دریافت اطلاعات کاربر
-    session = get_session()
+    session = get_user_session(target_id)
     try:
         user = session.query(User).filter(User.user_id == target_id).first()
         user_info = ""
@@ -623,34 +637,34 @@ async def admin_join_verify_all(update: Update, context: ContextTypes.DEFAULT_TY
 
     await update.message.reply_text("🔄 در حال بررسی وضعیت تمام کاربران... این ممکن است چند لحظه طول بکشد.")
 
-    session = get_session()
-    try:
-        users = session.query(User).all()
-        verified_count = 0
-        unverified_count = 0
-        unverified_users = []
+    users = all_users()
+    verified_count = 0
+    unverified_count = 0
+    unverified_users = []
 
-        total = len(users)
-        processed = 0
+    total = len(users)
+    processed = 0
 
-        for user in users:
-            result = await join_verification_system.check_user_join_status(user.user_id, context)
-            processed += 1
+    for user in users:
+        result = await join_verification_system.check_user_join_status(
+            user.user_id, context, priority=PRIORITY_BROADCAST
+        )
+        processed += 1
 
-            if result['is_member']:
-                verified_count += 1
-            else:
-                unverified_count += 1
-                unverified_users.append(user)
+        if result['is_member']:
+            verified_count += 1
+        else:
+            unverified_count += 1
+            unverified_users.append(user)
 
-            # نمایش پیشرفت هر 10 کاربر
-            if processed % 10 == 0:
-                logger.info(f"Processed {processed}/{total} users")
+        # نمایش پیشرفت هر 10 کاربر
+        if processed % 10 == 0:
+            logger.info(f"Processed {processed}/{total} users")
 
-        # ساخت گزارش آماری
-        percentage = (verified_count / total * 100) if total > 0 else 0
+    # ساخت گزارش آماری
+    percentage = (verified_count / total * 100) if total > 0 else 0
 
-        report = f"""
+    report = f"""
 📊 **گزارش کامل بررسی کاربران**
 
 📈 **آمار کلی:**
@@ -661,36 +675,33 @@ async def admin_join_verify_all(update: Update, context: ContextTypes.DEFAULT_TY
 📋 **کاربران تأیید نشده:**
 """
 
-        if unverified_users:
-            for user in unverified_users[:20]:  # فقط 20 نفر اول
-                user_name = user.first_name or 'نامشخص'
-                username = f"(@{user.username})" if user.username else ""
-                report += f"• {user_name} {username} - {user.user_id}\n"
+    if unverified_users:
+        for user in unverified_users[:20]:  # فقط 20 نفر اول
+            user_name = user.first_name or 'نامشخص'
+            username = f"(@{user.username})" if user.username else ""
+            report += f"• {user_name} {username} - {user.user_id}\n"
 
-            if len(unverified_users) > 20:
-                report += f"\n... و {len(unverified_users) - 20} کاربر دیگر"
+        if len(unverified_users) > 20:
+            report += f"\n... و {len(unverified_users) - 20} کاربر دیگر"
 
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🗑 حذف کاربران تأیید نشده", callback_data="admin_join_remove_all_inactive")],
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
-            ])
-        else:
-            report += "• همه کاربران تأیید شده‌اند! 🎉"
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
-            ])
-
-        await update.message.reply_text(report, reply_markup=keyboard, parse_mode="Markdown")
-        await log_admin_action(
-            update,
-            "join_verify_all",
-            "users",
-            str(total),
-            f"Verified: {verified_count}, Unverified: {unverified_count}"
-        )
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑 حذف کاربران تأیید نشده", callback_data="admin_join_remove_all_inactive")],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
+        ])
+    else:
+        report += "• همه کاربران تأیید شده‌اند! 🎉"
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
+        ])
 
-    finally:
-        session.close()
+    await update.message.reply_text(report, reply_markup=keyboard, parse_mode="Markdown")
+    await log_admin_action(
+        update,
+        "join_verify_all",
+        "users",
+        str(total),
+        f"Verified: {verified_count}, Unverified: {unverified_count}"
+    )
 
 
 async def admin_join_debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -781,32 +792,32 @@ async def admin_join_verify_all_callback(update: Update, context: ContextTypes.D
     # اما بهتر است پیام را جداگانه ارسال کنیم
     await query.edit_message_text("🔄 در حال بررسی وضعیت تمام کاربران... این ممکن است چند لحظه طول بکشد.")
 
-    session = get_session()
-    try:
-        users = session.query(User).all()
-        verified_count = 0
-        unverified_count = 0
-        unverified_users = []
+    users = all_users()
+    verified_count = 0
+    unverified_count = 0
+    unverified_users = []
 
-        total = len(users)
-        processed = 0
+    total = len(users)
+    processed = 0
 
-        for user in users:
-            result = await join_verification_system.check_user_join_status(user.user_id, context)
-            processed += 1
+    for user in users:
+        result = await join_verification_system.check_user_join_status(
+            user.user_id, context, priority=PRIORITY_BROADCAST
+        )
+        processed += 1
 
-            if result['is_member']:
-                verified_count += 1
-            else:
-                unverified_count += 1
-                unverified_users.append(user)
+        if result['is_member']:
+            verified_count += 1
+        else:
+            unverified_count += 1
+            unverified_users.append(user)
 
-            if processed % 10 == 0:
-                logger.info(f"Processed {processed}/{total} users")
+        if processed % 10 == 0:
+            logger.info(f"Processed {processed}/{total} users")
 
-        percentage = (verified_count / total * 100) if total > 0 else 0
+    percentage = (verified_count / total * 100) if total > 0 else 0
 
-        report = f"""
+    report = f"""
 📊 **گزارش کامل بررسی کاربران**
 
 📈 **آمار کلی:**
@@ -817,36 +828,33 @@ async def admin_join_verify_all_callback(update: Update, context: ContextTypes.D
 📋 **کاربران تأیید نشده:**
 """
 
-        if unverified_users:
-            for user in unverified_users[:20]:
-                user_name = user.first_name or 'نامشخص'
-                username = f"(@{user.username})" if user.username else ""
-                report += f"• {user_name} {username} - {user.user_id}\n"
+    if unverified_users:
+        for user in unverified_users[:20]:
+            user_name = user.first_name or 'نامشخص'
+            username = f"(@{user.username})" if user.username else ""
+            report += f"• {user_name} {username} - {user.user_id}\n"
 
-            if len(unverified_users) > 20:
-                report += f"\n... و {len(unverified_users) - 20} کاربر دیگر"
+        if len(unverified_users) > 20:
+            report += f"\n... و {len(unverified_users) - 20} کاربر دیگر"
 
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🗑 حذف کاربران تأیید نشده", callback_data="admin_join_confirm_remove")],
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
-            ])
-        else:
-            report += "• همه کاربران تأیید شده‌اند! 🎉"
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
-            ])
-
-        await query.edit_message_text(report, reply_markup=keyboard, parse_mode="Markdown")
-        await log_admin_action(
-            update,
-            "join_verify_all",
-            "users",
-            str(total),
-            f"Verified: {verified_count}, Unverified: {unverified_count}"
-        )
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑 حذف کاربران تأیید نشده", callback_data="admin_join_confirm_remove")],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
+        ])
+    else:
+        report += "• همه کاربران تأیید شده‌اند! 🎉"
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_join")]
+        ])
 
-    finally:
-        session.close()
+    await query.edit_message_text(report, reply_markup=keyboard, parse_mode="Markdown")
+    await log_admin_action(
+        update,
+        "join_verify_all",
+        "users",
+        str(total),
+        f"Verified: {verified_count}, Unverified: {unverified_count}"
+    )
 
 
 async def admin_join_debug_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -940,30 +948,8 @@ async def check_verification_on_start(user_id: int, context: ContextTypes.DEFAUL
 # ========== REGISTER HANDLERS ==========
 
 def register_join_verification_handlers(application):
-    """ثبت هندلرهای سیستم جوین"""
-
-    # کال‌بک‌های بررسی
-    application.add_handler(CallbackQueryHandler(verify_join_callback, pattern="^verify_join$"))
-    application.add_handler(CallbackQueryHandler(verify_join_check_callback, pattern="^verify_join_check_"))
-
-    # کال‌بک تأیید حذف
-    application.add_handler(CallbackQueryHandler(admin_join_confirm_remove_callback, pattern="^admin_join_confirm_remove$"))
-
-    # کال‌بک‌های جدید
-    application.add_handler(CallbackQueryHandler(admin_join_verify_all_callback, pattern="^admin_join_verify_all$"))
-    application.add_handler(CallbackQueryHandler(admin_join_debug_callback, pattern="^admin_join_debug$"))
-
-    # دستورات ادمین
-    application.add_handler(CommandHandler("admin_join_test", admin_join_test))
-    application.add_handler(CommandHandler("admin_join_check_all", admin_join_check_all))
-    application.add_handler(CommandHandler("admin_join_remove_all_inactive", admin_join_remove_all_inactive))
-    application.add_handler(CommandHandler("admin_join_import", admin_join_import_from_group))
-    application.add_handler(CommandHandler("admin_join_stats", admin_join_stats))
-
-    # دستورات جدید تست و دیباگ
-    application.add_handler(CommandHandler("admin_join_verify_test", admin_join_verify_test))
-    application.add_handler(CommandHandler("admin_join_verify_all", admin_join_verify_all))
-    application.add_handler(CommandHandler("admin_join_debug", admin_join_debug))
+    """ثبت هندلرهای سیستم جوین (فهرست در handlers.lazy)"""
+    add_handlers(application, JOIN_VERIFICATION_HANDLERS, lambda name: globals()[name])
 
 
 # ========== HELPER FUNCTIONS ==========
@@ -0,0 +1,144 @@
+import importlib
+import logging
+import sys
+import time
+from typing import List, Tuple
+from telegram.ext import CallbackQueryHandler, CommandHandler
+
+logger = logging.getLogger(__name__)
+
+# (kind, command or callback pattern, function name) in registration order
+HandlerSpec = Tuple[str, str, str]
+
+ADMIN_PANEL_MODULE = "handlers.admin_panel"
+JOIN_VERIFICATION_MODULE = "handlers.join_verification"
+
+ADMIN_PANEL_HANDLERS: List[HandlerSpec] = [
+    # دستورات
+    ("command", "admin", "admin_panel"),
+    ("command", "admin_help", "admin_help_command"),
+    ("command", "admin_users", "admin_users"),
+    ("command", "admin_items", "admin_items_cmd"),
+    ("command", "admin_stats", "admin_stats_cmd"),
+    ("command", "admin_leaderboard", "admin_leaderboard"),
+    ("command", "admin_search_user", "admin_search_user"),
+    ("command", "admin_give_coins", "admin_give_coins"),
+    ("command", "admin_give_diamonds", "admin_give_diamonds"),
+    ("command", "admin_ban_user", "admin_ban_user"),
+    ("command", "admin_unban_user", "admin_unban_user"),
+    ("command", "admin_reset_user", "admin_reset_user"),
+    ("command", "admin_delete_user", "admin_delete_user"),
+
+    # آیتم‌ها
+    ("command", "admin_add_item", "admin_add_item_cmd"),
+    ("command", "admin_set_price", "admin_set_price"),
+    ("command", "admin_item_stats", "admin_item_stats"),
+
+    # جوین
+    ("command", "admin_join", "admin_join_settings"),
+    ("command", "admin_join_add", "admin_join_add"),
+    ("command", "admin_join_remove", "admin_join_remove"),
+    ("command", "admin_join_list", "admin_join_list"),
+    ("command", "admin_join_message", "admin_join_message"),
+    ("command", "admin_join_toggle", "admin_join_toggle"),
+
+    # ارسال همگانی
+    ("command", "admin_broadcast", "admin_broadcast_cmd"),
+    ("command", "admin_dm", "admin_dm"),
+    ("command", "admin_announce", "admin_announce"),
+
+    # آمار
+    ("command", "admin_active_users", "admin_active_users"),
+
+    # اقتصاد
+    ("command", "admin_remove_coins", "admin_remove_coins"),
+    ("command", "admin_remove_diamonds", "admin_remove_diamonds"),
+    ("command", "admin_economy_add_coins", "admin_economy_add_coins"),
+    ("command", "admin_economy_remove_coins", "admin_economy_remove_coins"),
+    ("command", "admin_economy_add_diamonds", "admin_economy_add_diamonds"),
+    ("command", "admin_economy_remove_diamonds", "admin_economy_remove_diamonds"),
+    ("command", "admin_economy_report", "admin_economy_report"),
+
+    # تنظیمات
+    ("command", "admin_get_setting", "admin_get_setting_cmd"),
+    ("command", "admin_set_setting", "admin_set_setting_cmd"),
+
+    # لاگ‌ها
+    ("command", "admin_search_logs", "admin_search_logs"),
+
+    # ماموریت‌ها
+    ("command", "admin_add_quest", "admin_add_quest"),
+    ("command", "admin_edit_quest", "admin_edit_quest"),
+    ("command", "admin_delete_quest", "admin_delete_quest"),
+    ("command", "admin_reset_quests", "admin_reset_quests"),
+
+    # کال‌بک‌ها
+    ("callback", "^admin_", "admin_panel_callback"),
+]
+
+JOIN_VERIFICATION_HANDLERS: List[HandlerSpec] = [
+    # کال‌بک‌های بررسی
+    ("callback", "^verify_join$", "verify_join_callback"),
+    ("callback", "^verify_join_check_", "verify_join_check_callback"),
+
+    # کال‌بک تأیید حذف
+    ("callback", "^admin_join_confirm_remove$", "admin_join_confirm_remove_callback"),
+
+    # کال‌بک‌های جدید
+    ("callback", "^admin_join_verify_all$", "admin_join_verify_all_callback"),
+    ("callback", "^admin_join_debug$", "admin_join_debug_callback"),
+
+    # دستورات ادمین
+    ("command", "admin_join_test", "admin_join_test"),
+    ("command", "admin_join_check_all", "admin_join_check_all"),
+    ("command", "admin_join_remove_all_inactive", "admin_join_remove_all_inactive"),
+    ("command", "admin_join_import", "admin_join_import_from_group"),
+    ("command", "admin_join_stats", "admin_join_stats"),
+
+    # دستورات جدید تست و دیباگ
+    ("command", "admin_join_verify_test", "admin_join_verify_test"),
+    ("command", "admin_join_verify_all", "admin_join_verify_all"),
+    ("command", "admin_join_debug", "admin_join_debug"),
+]
+
+LAZY_MODULES = {
+    ADMIN_PANEL_MODULE: ADMIN_PANEL_HANDLERS,
+    JOIN_VERIFICATION_MODULE: JOIN_VERIFICATION_HANDLERS,
+}
+
+
+def lazy_callback(module_name: str, func_name: str):
+    """Handler callback that imports `module_name` the first time it is called."""
+    resolved = None
+
+    async def callback(update, context):
+        nonlocal resolved
+        if resolved is None:
+            if module_name not in sys.modules:
+                started = time.perf_counter()
+                importlib.import_module(module_name)
+                logger.info(f"Loaded {module_name} on first use in {(time.perf_counter() - started) * 1000:.1f}ms")
+            resolved = getattr(sys.modules[module_name], func_name)
+        return await resolved(update, context)
+
+    callback.__name__ = callback.__qualname__ = func_name
+    return callback
+
+
+def add_handlers(application, specs: List[HandlerSpec], resolve):
+    """Register a handler table; `resolve(func_name)` returns the callback to use."""
+    for kind, key, func_name in specs:
+        callback = resolve(func_name)
+        if kind == "command":
+            application.add_handler(CommandHandler(key, callback))
+        else:
+            application.add_handler(CallbackQueryHandler(callback, pattern=key))
+
+
+def register_lazy_handlers(application, module_name: str):
+    """Register a module's handlers through stubs, without importing the module."""
+    add_handlers(
+        application,
+        LAZY_MODULES[module_name],
+        lambda func_name: lazy_callback(module_name, func_name)
+    )
@@ -1,66 +1,84 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database.connection import get_session
-from database.queries import get_user, get_market_listings, get_listing_by_id, delete_listing, add_to_inventory
+from database import ledger
+from database.executor import run_db, run_user_db
+from database.queries import (
+    get_market_listings, get_listing_by_id, change_balance, claim_listing, add_inventory_quantity
+)
+from database.shards import same_shard
 from config import MSG_MARKET_WELCOME, MARKET_TAX_PERCENT
 
-async def market_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    session = get_session()
+
+def _market_keyboard(session):
     listings = get_market_listings(session)
-    
+
     keyboard = []
     for listing in listings:
         keyboard.append([InlineKeyboardButton(
-            f"{listing.item.emoji} {listing.item.name} - {listing.price_diamonds}💎", 
+            f"{listing.item.emoji} {listing.item.name} - {listing.price_diamonds}💎",
             callback_data=f"market_buy_{listing.id}"
         )])
     keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")])
-    
+    return InlineKeyboardMarkup(keyboard)
+
+
+def _buy_listing(session, user_id: int, listing_id: int):
+    """Returns (message, show_alert, bought, seller payment still to make or None)."""
+    listing = get_listing_by_id(session, listing_id)
+
+    if not listing:
+        return "این پیشنهاد دیگر موجود نیست!", False, False, None
+
+    if user_id == listing.seller_id:
+        return "شما نمی‌توانید از خودتان خرید کنید!", False, False, None
+
+    price, seller_id, item_id, quantity = listing.price_diamonds, listing.seller_id, listing.item_id, listing.quantity
+
+    # Process transaction: each step is one conditional statement, so two buyers
+    # can't both get the listing and nobody pays with diamonds they no longer have
+    if change_balance(session, user_id, diamonds=-price, reason=ledger.MARKET_BUY, ref_id=listing_id) is None:
+        return "الماس کافی ندارید! 💎", True, False, None
+
+    if not claim_listing(session, listing_id):
+        change_balance(session, user_id, diamonds=price, reason=ledger.MARKET_REFUND, ref_id=listing_id)  # someone else bought it first
+        return "این پیشنهاد دیگر موجود نیست!", False, False, None
+
+    tax = int(price * (MARKET_TAX_PERCENT / 100))
+    add_inventory_quantity(session, user_id, item_id, quantity)
+
+    # A seller on another shard is paid in a unit of work of their own
+    if not same_shard(user_id, seller_id):
+        return "✅ خرید موفقیت‌آمیز بود!", False, True, (seller_id, price - tax)
+
+    _pay_seller(session, seller_id, price - tax, listing_id)
+    return "✅ خرید موفقیت‌آمیز بود!", False, True, None
+
+
+def _pay_seller(session, seller_id: int, amount: int, listing_id: int):
+    change_balance(session, seller_id, diamonds=amount, reason=ledger.MARKET_SALE, ref_id=listing_id)
+
+
+async def market_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = await run_db(_market_keyboard)
+
     await query.edit_message_text(
         MSG_MARKET_WELCOME,
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=keyboard,
         parse_mode="Markdown"
     )
-    session.close()
 
 async def market_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     listing_id = int(query.data.split("_")[2])
     user_id = query.from_user.id
-    
-    session = get_session()
-    user = get_user(session, user_id)
-    listing = get_listing_by_id(session, listing_id)
-    
-    if not listing:
-        await query.answer("این پیشنهاد دیگر موجود نیست!")
-        session.close()
-        return
-        
-    if user.user_id == listing.seller_id:
-        await query.answer("شما نمی‌توانید از خودتان خرید کنید!")
-        session.close()
-        return
-        
-    if user.diamonds < listing.price_diamonds:
-        await query.answer("الماس کافی ندارید! 💎", show_alert=True)
-        session.close()
-        return
-    
-    seller = get_user(session, listing.seller_id)
-    
-    # Process transaction
-    user.diamonds -= listing.price_diamonds
-    tax = int(listing.price_diamonds * (MARKET_TAX_PERCENT / 100))
-    seller.diamonds += (listing.price_diamonds - tax)
-    
-    add_to_inventory(session, user_id, listing.item_id, listing.quantity)
-    delete_listing(session, listing.id)
-    
-    session.commit()
-    await query.answer(f"✅ خرید موفقیت‌آمیز بود!")
-    
-    # Refresh market
-    await market_main(update, context)
-    session.close()
+
+    message, show_alert, bought, payment = await run_user_db(user_id, _buy_listing, user_id, listing_id)
+    if payment:
+        seller_id, amount = payment
+        await run_user_db(seller_id, _pay_seller, seller_id, amount, listing_id)
+    await query.answer(message, show_alert=show_alert)
+
+    if bought:
+        # Refresh market
+        await market_main(update, context)
@@ -1,62 +1,43 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database.connection import get_session
+from operator import attrgetter
+from database.executor import run_in_db_thread, run_user_db
+from database.models import Inventory
 from database.queries import get_user, get_top_players, get_user_inventory
+from database.shards import scatter, merge_top
 from utils.formatters import format_user_profile, format_inventory, format_leaderboard
 from utils.keyboards import profile_keyboard, back_to_main_keyboard
 
-async def profile_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    user_id = query.from_user.id
-    
-    session = get_session()
-    user = get_user(session, user_id)
-    
-    await query.edit_message_text(
-        format_user_profile(user),
-        reply_markup=profile_keyboard(),
-        parse_mode="Markdown"
-    )
-    session.close()
 
-async def inventory_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    user_id = query.from_user.id
-    
-    session = get_session()
+def _profile_text(session, user_id: int):
+    return format_user_profile(get_user(session, user_id))
+
+
+def _inventory_view(session, user_id: int):
     inventory = get_user_inventory(session, user_id)
-    
+
     keyboard = []
     for inv in inventory:
         status = "✅" if inv.is_active else "❌"
         btn_text = f"{inv.item.emoji} {inv.item.name} {status}"
         keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"inv_toggle_{inv.id}")])
-    
+
     keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data="profile_main")])
-    
-    await query.edit_message_text(
-        format_inventory(inventory),
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-    session.close()
 
-async def inventory_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    inv_id = int(query.data.split("_")[2])
-    user_id = query.from_user.id
-    
-    session = get_session()
+    return format_inventory(inventory), InlineKeyboardMarkup(keyboard)
+
+
+def _toggle(session, user_id: int, inv_id: int):
+    """Returns (found, slots_full)."""
     inv_item = session.query(Inventory).filter(Inventory.id == inv_id, Inventory.user_id == user_id).first()
-    
+
     if not inv_item:
-        await query.answer("آیتم یافت نشد!")
-        session.close()
-        return
-        
+        return False, False
+
     # Simple toggle logic
     inv_item.is_active = not inv_item.is_active
-    
+    slots_full = False
+
     # If it's an artifact, update user slots (simplified: just put it in the first empty slot)
     user = get_user(session, user_id)
     if inv_item.item.item_type.value == "BUFF":
@@ -66,25 +47,67 @@ async def inventory_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
             elif not user.slot_3_id: user.slot_3_id = inv_item.item_id
             else:
                 inv_item.is_active = False
-                await query.answer("اسلات‌های شما پر است!", show_alert=True)
+                slots_full = True
         else:
             if user.slot_1_id == inv_item.item_id: user.slot_1_id = None
             elif user.slot_2_id == inv_item.item_id: user.slot_2_id = None
             elif user.slot_3_id == inv_item.item_id: user.slot_3_id = None
 
-    session.commit()
+    return True, slots_full
+
+
+def _leaderboard_text(limit: int = 10):
+    # Top players of every shard, merged
+    return format_leaderboard(merge_top(scatter(get_top_players, limit), key=attrgetter("coins"), limit=limit))
+
+
+async def profile_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
+
+    text = await run_user_db(user_id, _profile_text, user_id)
+
+    await query.edit_message_text(
+        text,
+        reply_markup=profile_keyboard(),
+        parse_mode="Markdown"
+    )
+
+async def inventory_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
+
+    text, keyboard = await run_user_db(user_id, _inventory_view, user_id)
+
+    await query.edit_message_text(
+        text,
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+
+async def inventory_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    inv_id = int(query.data.split("_")[2])
+    user_id = query.from_user.id
+
+    found, slots_full = await run_user_db(user_id, _toggle, user_id, inv_id)
+
+    if not found:
+        await query.answer("آیتم یافت نشد!")
+        return
+
+    if slots_full:
+        await query.answer("اسلات‌های شما پر است!", show_alert=True)
+
     await query.answer("وضعیت تغییر کرد!")
     await inventory_main(update, context)
-    session.close()
 
 async def leaderboard_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    session = get_session()
-    top_players = get_top_players(session)
-    
+    text = await run_in_db_thread(_leaderboard_text)
+
     await query.edit_message_text(
-        format_leaderboard(top_players),
+        text,
         reply_markup=back_to_main_keyboard(),
         parse_mode="Markdown"
     )
-    session.close()
@@ -1,53 +1,56 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.connection import get_session
-from database.queries import get_user, get_all_items, get_item_by_id, add_to_inventory
+from database.executor import run_db, run_user_db
+from database import ledger
+from database.queries import get_all_items, get_item_by_id, change_balance, add_inventory_quantity
 from utils.keyboards import shop_keyboard, back_to_main_keyboard
 from utils.formatters import format_item_details
 from config import MSG_SHOP_WELCOME
 
+
+def _shop_keyboard(session):
+    return shop_keyboard(get_all_items(session))
+
+
+def _buy(session, user_id: int, item_id: int):
+    item = get_item_by_id(session, item_id)
+
+    if not item:
+        return "آیتم یافت نشد!", False, None
+
+    # One conditional UPDATE: concurrent buys can't spend the same diamonds
+    if change_balance(session, user_id, diamonds=-item.price_diamonds, reason=ledger.SHOP_BUY, ref_id=item.id) is None:
+        return "الماس کافی ندارید! 💎", True, None
+
+    add_inventory_quantity(session, user_id, item.id)
+
+    return f"✅ {item.name} با موفقیت خریداری شد!", False, _shop_keyboard(session)
+
+
 async def shop_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    session = get_session()
-    items = get_all_items(session)
-    
+    keyboard = await run_db(_shop_keyboard)
+
     await query.edit_message_text(
         MSG_SHOP_WELCOME,
-        reply_markup=shop_keyboard(items),
+        reply_markup=keyboard,
         parse_mode="Markdown"
     )
-    session.close()
 
 async def shop_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     item_id = int(query.data.split("_")[2])
     user_id = query.from_user.id
-    
-    session = get_session()
-    user = get_user(session, user_id)
-    item = get_item_by_id(session, item_id)
-    
-    if not item:
-        await query.answer("آیتم یافت نشد!")
-        session.close()
-        return
-        
-    if user.diamonds < item.price_diamonds:
-        await query.answer("الماس کافی ندارید! 💎", show_alert=True)
-        session.close()
+
+    message, show_alert, keyboard = await run_user_db(user_id, _buy, user_id, item_id)
+    await query.answer(message, show_alert=show_alert)
+
+    if keyboard is None:
         return
-    
-    user.diamonds -= item.price_diamonds
-    add_to_inventory(session, user_id, item.id)
-    
-    session.commit()
-    await query.answer(f"✅ {item.name} با موفقیت خریداری شد!")
-    
+
     # Refresh shop
-    items = get_all_items(session)
     await query.edit_message_text(
         MSG_SHOP_WELCOME,
-        reply_markup=shop_keyboard(items),
+        reply_markup=keyboard,
         parse_mode="Markdown"
     )
-    session.close()
@@ -1,10 +1,12 @@
 import logging
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes
-from config import BOT_TOKEN, DATABASE_URL
+from config import BOT_TOKEN, DATABASE_URL, BOT_MAX_CONCURRENT_UPDATES, BOT_CONNECTION_POOL_SIZE, BOT_WEBHOOK_MODE
+from bot.update_processor import PerUserOrderedApplication
+from bot.rate_limiter import PriorityRateLimiter
 from database.connection import init_db
 from handlers.start import start, main_menu_callback
-from handlers.game import click_handler, mine_handler
+from handlers.game import click_handler, mine_handler, cancel_pending_profile_edit
 from handlers.shop import shop_main, shop_buy
 from handlers.market import market_main, market_buy
 from handlers.casino import casino_main, casino_slots, casino_crash
@@ -12,22 +14,8 @@ from handlers.profile import profile_main, inventory_main, inventory_toggle, lea
 from handlers.quests import quests_main
 from handlers.achievements import achievements_main
 from handlers.admin import admin_add_item, admin_stats
-from handlers.admin_panel import (
-    admin_panel, admin_users, admin_items_cmd, admin_stats_cmd, admin_leaderboard,
-    admin_search_user, admin_give_coins, admin_give_diamonds, admin_ban_user,
-    admin_unban_user, admin_reset_user, admin_delete_user, admin_add_item_cmd,
-    admin_set_price, admin_item_stats, admin_join_settings, admin_join_add,
-    admin_join_remove, admin_join_list, admin_join_message, admin_join_toggle,
-    admin_broadcast_cmd, admin_dm, admin_announce, admin_active_users,
-    admin_panel_callback, register_admin_handlers
-)
-from handlers.join_verification import (
-    verify_join_callback, verify_join_check_callback,
-    admin_join_test, admin_join_check_all, admin_join_remove_all_inactive,
-    admin_join_confirm_remove_callback, admin_join_import_from_group, admin_join_stats,
-    admin_join_verify_test, admin_join_verify_all, admin_join_debug,
-    register_join_verification_handlers
-)
+# Admin panel and join verification are large; their modules load on first use
+from handlers.lazy import register_lazy_handlers, ADMIN_PANEL_MODULE, JOIN_VERIFICATION_MODULE
 from jobs.background_jobs import setup_jobs
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
@@ -40,23 +28,29 @@ logging.basicConfig(
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logging.error(f"Exception while handling an update: {context.error}")
 
-def main():
-    # Initialize Database
-    init_db()
-
-    # Scheduler
-    scheduler = AsyncIOScheduler()
-    setup_jobs(scheduler)
-    scheduler.start()
-
-    # Application
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+def build_application(builder: ApplicationBuilder = None):
+    """Create the full bot Application (polling here, or webhook via backend.main)."""
+    if builder is None:
+        builder = ApplicationBuilder().token(BOT_TOKEN).connection_pool_size(BOT_CONNECTION_POOL_SIZE)
+    # Different users' updates run concurrently, each user's stay in order
+    builder = builder.application_class(
+        PerUserOrderedApplication, kwargs={"max_concurrency": BOT_MAX_CONCURRENT_UPDATES}
+    )
+    # Every outgoing request shares one rate-limited, prioritized budget
+    builder = builder.rate_limiter(PriorityRateLimiter())
+    application = builder.build()
 
     # Basic Handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("additem", admin_add_item))
     application.add_handler(CommandHandler("stats", admin_stats))
 
+    # Any other button on a message cancels its pending debounced profile edit
+    application.add_handler(
+        CallbackQueryHandler(cancel_pending_profile_edit, pattern="^(?!game_click$|game_mine$)"),
+        group=-1
+    )
+
     # Menu Callback Handlers
     application.add_handler(CallbackQueryHandler(main_menu_callback, pattern="^main_menu$"))
     application.add_handler(CallbackQueryHandler(click_handler, pattern="^game_click$"))
@@ -76,14 +70,32 @@ def main():
     application.add_handler(CallbackQueryHandler(achievements_main, pattern="^achievements_main$"))
 
     # Admin Panel Handlers
-    register_admin_handlers(application)
+    register_lazy_handlers(application, ADMIN_PANEL_MODULE)
 
     # Join Verification Handlers
-    register_join_verification_handlers(application)
+    register_lazy_handlers(application, JOIN_VERIFICATION_MODULE)
 
     # Error Handler
     application.add_error_handler(error_handler)
 
+    return application
+
+def main():
+    if BOT_WEBHOOK_MODE:
+        logging.info("BOT_WEBHOOK_MODE is enabled - updates are served by backend.main, not polling")
+        return
+
+    # Initialize Database
+    init_db()
+
+    # Scheduler
+    scheduler = AsyncIOScheduler()
+    setup_jobs(scheduler)
+    scheduler.start()
+
+    # Application
+    application = build_application()
+
     # Run
     logging.info("Bot started...")
     application.run_polling()
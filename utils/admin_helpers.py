@@ -1,10 +1,13 @@
+import asyncio
 import logging
 import json
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
 from telegram import Update
 from database.connection import get_session
 from database.admin_models import AdminLog, AdminSettings
+from utils.settings_store import settings_store, bump_settings_version
+from bot.rate_limiter import PRIORITY_ADMIN, PRIORITY_BROADCAST
 from config import ADMIN_IDS
 
 logger = logging.getLogger(__name__)
@@ -64,24 +67,12 @@ async def log_admin_action(
 
 
 def get_admin_setting(key: str, default: Any = None) -> Any:
-    """دریافت مقدار یک تنظیم ادمین"""
-    session = get_session()
+    """دریافت مقدار یک تنظیم ادمین (از کش حافظه)"""
     try:
-        setting = session.query(AdminSettings).filter(AdminSettings.setting_key == key).first()
-        if setting:
-            if setting.setting_type == 'int':
-                return int(setting.setting_value)
-            elif setting.setting_type == 'bool':
-                return setting.setting_value.lower() == 'true'
-            elif setting.setting_type == 'json':
-                return json.loads(setting.setting_value)
-            return setting.setting_value
-        return default
+        return settings_store.get(key, default)
     except Exception as e:
         logger.error(f"Error getting admin setting {key}: {e}")
         return default
-    finally:
-        session.close()
 
 
 def set_admin_setting(key: str, value: Any, setting_type: str = 'string', description: str = None):
@@ -89,7 +80,10 @@ def set_admin_setting(key: str, value: Any, setting_type: str = 'string', descri
     session = get_session()
     try:
         setting = session.query(AdminSettings).filter(AdminSettings.setting_key == key).first()
-        str_value = str(value)
+        if setting_type == 'json' and not isinstance(value, str):
+            str_value = json.dumps(value, ensure_ascii=False)
+        else:
+            str_value = str(value)
         
         if setting:
             setting.setting_value = str_value
@@ -105,7 +99,9 @@ def set_admin_setting(key: str, value: Any, setting_type: str = 'string', descri
             )
             session.add(setting)
         
+        bump_settings_version(session)
         session.commit()
+        settings_store.invalidate()
         logger.info(f"Admin setting updated: {key} = {value}")
         return True
     except Exception as e:
@@ -151,6 +147,17 @@ def format_datetime(dt: datetime) -> str:
     return dt.strftime("%Y/%m/%d - %H:%M")
 
 
+def format_data_age(age: Optional[float]) -> str:
+    """تازگی آمار: سن نسخه تحلیلی دیتابیس به ثانیه (database/snapshot.py)، یا None برای داده لحظه‌ای"""
+    if age is None:
+        return "🕒 داده‌ها: لحظه‌ای"
+    if age < 60:
+        return f"🕒 داده‌ها: {int(age)} ثانیه پیش"
+    if age < 3600:
+        return f"🕒 داده‌ها: {int(age // 60)} دقیقه پیش"
+    return f"🕒 داده‌ها: {int(age // 3600)} ساعت پیش"
+
+
 def parse_duration(duration_str: str) -> Optional[int]:
     """تبدیل رشته مدت زمان به ثانیه
     پشتیبانی از: 1h, 30m, 7d, 30d
@@ -231,11 +238,44 @@ async def send_to_admins(
         if exclude_user_id and admin_id == exclude_user_id:
             continue
         try:
-            await context.bot.send_message(chat_id=admin_id, text=message)
+            await context.bot.send_message(chat_id=admin_id, text=message, rate_limit_args=PRIORITY_ADMIN)
         except Exception as e:
             logger.error(f"Failed to send message to admin {admin_id}: {e}")
 
 
+async def broadcast_message(
+    bot,
+    chat_ids: Iterable[int],
+    text: str,
+    batch_size: int = 100,
+    **kwargs
+) -> Tuple[int, int]:
+    """ارسال پیام همگانی با کمترین اولویت در صف ارسال
+
+    پیام‌ها دسته‌ای و هم‌زمان ارسال می‌شوند؛ سرعت را صف مشترک تعیین می‌کند و
+    پاسخ‌های کاربران همیشه جلوتر از همگانی‌ها ارسال می‌شوند.
+
+    Returns:
+        (تعداد موفق، تعداد ناموفق)
+    """
+    chat_ids = list(chat_ids)
+    success = 0
+    failed = 0
+
+    for start in range(0, len(chat_ids), batch_size):
+        results = await asyncio.gather(*(
+            bot.send_message(chat_id=chat_id, text=text, rate_limit_args=PRIORITY_BROADCAST, **kwargs)
+            for chat_id in chat_ids[start:start + batch_size]
+        ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                failed += 1
+            else:
+                success += 1
+
+    return success, failed
+
+
 def get_command_args(context) -> list:
     """دریافت آرگومان‌های دستور"""
     if context.args:
@@ -179,11 +179,22 @@ def admin_monitoring_keyboard():
         [InlineKeyboardButton("⚡ عملکرد", callback_data="admin_monitor_performance")],
         [InlineKeyboardButton("🚨 خطاهای اخیر", callback_data="admin_monitor_errors")],
         [InlineKeyboardButton("📈 آمار استفاده", callback_data="admin_monitor_usage")],
+        [InlineKeyboardButton("🐢 کوئری‌های کند و N+1", callback_data="admin_monitor_queries")],
         [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_main")],
     ]
     return InlineKeyboardMarkup(keyboard)
 
 
+def admin_query_log_keyboard():
+    """کیبورد لاگ کوئری‌های کند"""
+    keyboard = [
+        [InlineKeyboardButton("🔄 بروزرسانی", callback_data="admin_monitor_queries")],
+        [InlineKeyboardButton("📥 دریافت فایل JSONL", callback_data="admin_monitor_queries_dump")],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data="admin_monitoring")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
 def admin_logs_keyboard():
     """کیبورد لاگ‌ها"""
     keyboard = [
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from telegram.error import BadRequest, TelegramError
+from config import BOT_PROFILE_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+MessageKey = Tuple[int, int]
+
+
+class _EditState:
+    __slots__ = ("last_text", "last_sent_at", "pending", "task")
+
+    def __init__(self):
+        self.last_text: Optional[str] = None
+        self.last_sent_at = 0.0
+        self.pending: Optional[Tuple[Any, str, Dict[str, Any]]] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class MessageEditCoalescer:
+    """ادغام ویرایش‌های پیاپی یک پیام
+
+    برای هر پیام حداکثر یک ویرایش در هر `interval` ثانیه ارسال می‌شود و همیشه
+    آخرین متن ارسال می‌شود. اگر متن تغییری نکرده باشد ویرایشی انجام نمی‌شود.
+    """
+
+    def __init__(self, interval: float = BOT_PROFILE_EDIT_INTERVAL, max_messages: int = 10000):
+        self.interval = interval
+        self.max_messages = max_messages
+        self._states: "OrderedDict[MessageKey, _EditState]" = OrderedDict()
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped_unchanged = 0
+
+    def _state(self, key: MessageKey) -> _EditState:
+        state = self._states.get(key)
+        if state is None:
+            state = _EditState()
+            self._states[key] = state
+            while len(self._states) > self.max_messages:
+                _, old = self._states.popitem(last=False)
+                if old.task:
+                    old.task.cancel()
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    async def edit(self, bot, chat_id: int, message_id: int, text: str, **kwargs):
+        """درخواست ویرایش پیام؛ در صورت نیاز تا پایان بازه تأخیر می‌افتد"""
+        key = (chat_id, message_id)
+        state = self._state(key)
+
+        if state.pending is None and text == state.last_text:
+            self.skipped_unchanged += 1
+            return
+
+        if state.pending is not None:
+            self.coalesced += 1
+        state.pending = (bot, text, kwargs)
+
+        if state.task is not None:
+            return  # the scheduled flush will pick up the latest text
+
+        delay = state.last_sent_at + self.interval - time.monotonic()
+        if delay <= 0:
+            await self._flush(key, state)
+        else:
+            state.task = asyncio.create_task(self._flush_later(key, state, delay))
+
+    def cancel(self, chat_id: int, message_id: int):
+        """لغو ویرایش معلق (مثلاً وقتی کاربر به صفحه دیگری رفته است)"""
+        state = self._states.pop((chat_id, message_id), None)
+        if state and state.task:
+            state.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked_messages": len(self._states),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "skipped_unchanged": self.skipped_unchanged,
+        }
+
+    async def _flush_later(self, key: MessageKey, state: _EditState, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            await self._flush(key, state)
+        except Exception as e:
+            # Nobody awaits this task: report here instead of "Task exception was never retrieved"
+            logger.exception(f"Scheduled edit of message {key} failed: {e}")
+        finally:
+            state.task = None
+
+    async def _flush(self, key: MessageKey, state: _EditState):
+        bot, text, kwargs = state.pending
+        state.pending = None
+        state.last_sent_at = time.monotonic()
+
+        if text == state.last_text:
+            self.skipped_unchanged += 1
+            return
+
+        chat_id, message_id = key
+        try:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+            state.last_text = text
+            self.sent += 1
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                state.last_text = text
+            else:
+                logger.error(f"Failed to edit message {key}: {e}")
+        except TelegramError as e:
+            # Network errors, timeouts, flood limits left after retries; last_text is unchanged,
+            # so the next edit of this message sends the latest text again
+            logger.warning(f"Failed to edit message {key}: {e}")
+
+
+# ویرایش‌های صفحه پروفایل (کلیک و استخراج)
+profile_edits = MessageEditCoalescer()
@@ -5,6 +5,8 @@ from config import (
     MAX_ENERGY, MAX_ELECTRICITY, DIAMOND_DROP_CHANCE
 )
 from database.models import User, GameItem, ItemType
+from database import ledger
+from database.queries import credit
 
 def calculate_click_reward(user: User, session):
     # Base reward based on level
@@ -30,7 +32,6 @@ def process_click(user: User, session):
         return None, "Low energy"
     
     reward = calculate_click_reward(user, session)
-    user.coins += reward
     user.energy -= 1
     user.click_xp += XP_PER_CLICK
     
@@ -43,10 +44,8 @@ def process_click(user: User, session):
         leveled_up = True
     
     # Diamond drop
-    diamond_found = 0
-    if random.random() < DIAMOND_DROP_CHANCE:
-        diamond_found = 1
-        user.diamonds += 1
+    diamond_found = 1 if random.random() < DIAMOND_DROP_CHANCE else 0
+    credit(session, user, coins=reward, diamonds=diamond_found, reason=ledger.CLICK)
         
     return {
         "coins_earned": reward,
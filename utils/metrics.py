@@ -0,0 +1,333 @@
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+# ثانیه؛ از ۵ میلی‌ثانیه تا ۱۰ ثانیه
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _label_dict(self, values: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labels, values))
+
+
+class Counter(_Metric):
+    """شمارنده افزایشی"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._label_dict(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    """مقدار لحظه‌ای (قابل افزایش و کاهش)"""
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """توزیع مقادیر در بازه‌های ثابت (مثل زمان پاسخ)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+
+        result = []
+        for key, state in items:
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            result.append((f"{self.name}_sum", labels, state[-1]))
+            result.append((f"{self.name}_count", labels, cumulative))
+        return result
+
+
+class MetricsRegistry:
+    """مجموعه متریک‌های پروسه و خروجی به فرمت متنی Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [sample for metric in metrics for sample in metric.samples()]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+_LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus_text(text: str) -> List[Sample]:
+    """خواندن خروجی متنی Prometheus (برای متریک‌های پروسه دیگر، مثل API)"""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line)
+        if not match:
+            continue
+        name, raw_labels, value = match.groups()
+        labels = {
+            k: v.replace('\\"', '"').replace("\\n", "\n").replace("\\\\", "\\")
+            for k, v in _LABEL_RE.findall(raw_labels or "")
+        }
+        samples.append((name, labels, float(value)))
+    return samples
+
+
+def _quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """تخمین چندک از باکت‌های تجمعی هیستوگرام (درون‌یابی خطی)"""
+    bounds = sorted(buckets)
+    if not bounds or not buckets[bounds[-1]]:
+        return None
+    rank = q * buckets[bounds[-1]]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == math.inf:
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def summarize_http(samples: List[Sample]) -> Dict[str, Any]:
+    """خلاصه متریک‌های HTTP و دیتابیس برای صفحات نظارت ادمین"""
+    total = errors = client_errors = 0.0
+    in_flight = 0.0
+    started_at = None
+    latency_buckets: Dict[float, float] = defaultdict(float)
+    latency_sum = 0.0
+    routes: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(
+        lambda: {"count": 0.0, "sum": 0.0, "buckets": defaultdict(float), "db_queries": 0.0}
+    )
+    db_queries = db_seconds = 0.0
+    request_db_queries = request_db_count = 0.0
+
+    for name, labels, value in samples:
+        if name == "http_requests_total":
+            total += value
+            status = labels.get("status", "")
+            if status.startswith("5"):
+                errors += value
+            elif status.startswith("4"):
+                client_errors += value
+        elif name == "http_requests_in_flight":
+            in_flight += value
+        elif name == "process_start_time_seconds":
+            started_at = value
+        elif name.startswith("http_request_duration_seconds_"):
+            route = routes[(labels.get("method", ""), labels.get("route", ""))]
+            if name.endswith("_bucket"):
+                bound = float(labels["le"])
+                latency_buckets[bound] += value
+                route["buckets"][bound] += value
+            elif name.endswith("_sum"):
+                latency_sum += value
+                route["sum"] += value
+            elif name.endswith("_count"):
+                route["count"] += value
+        elif name == "http_request_db_queries_sum":
+            request_db_queries += value
+            routes[(labels.get("method", ""), labels.get("route", ""))]["db_queries"] += value
+        elif name == "http_request_db_queries_count":
+            request_db_count += value
+        elif name == "db_queries_total":
+            db_queries += value
+        elif name == "db_query_duration_seconds_sum":
+            db_seconds += value
+
+    route_rows = []
+    for (method, path), route in routes.items():
+        if not route["count"]:
+            continue
+        p95 = _quantile(route["buckets"], 0.95)
+        route_rows.append({
+            "route": f"{method} {path}",
+            "count": int(route["count"]),
+            "avg_ms": route["sum"] / route["count"] * 1000,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "db_queries_avg": route["db_queries"] / route["count"],
+        })
+    route_rows.sort(key=lambda row: row["avg_ms"], reverse=True)
+
+    def ms(q):
+        value = _quantile(latency_buckets, q)
+        return value * 1000 if value is not None else None
+
+    return {
+        "requests": int(total),
+        "server_errors": int(errors),
+        "client_errors": int(client_errors),
+        "error_rate": errors / total * 100 if total else 0.0,
+        "in_flight": int(in_flight),
+        "uptime_seconds": time.time() - started_at if started_at else None,
+        "avg_ms": latency_sum / total * 1000 if total else None,
+        "p50_ms": ms(0.50),
+        "p95_ms": ms(0.95),
+        "p99_ms": ms(0.99),
+        "db_queries": int(db_queries),
+        "db_avg_ms": db_seconds / db_queries * 1000 if db_queries else None,
+        "db_queries_per_request": request_db_queries / request_db_count if request_db_count else None,
+        "routes": route_rows,
+    }
+
+
+def summarize_histogram(samples: List[Sample], name: str) -> Dict[str, Any]:
+    """تعداد، میانگین و چندک‌های یک هیستوگرام (مجموع همه برچسب‌ها، بر حسب میلی‌ثانیه)"""
+    buckets: Dict[float, float] = defaultdict(float)
+    total = count = 0.0
+    for sample_name, labels, value in samples:
+        if sample_name == f"{name}_bucket":
+            buckets[float(labels["le"])] += value
+        elif sample_name == f"{name}_sum":
+            total += value
+        elif sample_name == f"{name}_count":
+            count += value
+
+    def ms(q):
+        value = _quantile(buckets, q)
+        return value * 1000 if value is not None else None
+
+    return {
+        "count": int(count),
+        "avg_ms": total / count * 1000 if count else None,
+        "p50_ms": ms(0.50),
+        "p95_ms": ms(0.95),
+    }
+
+
+def has_local_http_metrics() -> bool:
+    """آیا API در همین پروسه اجرا می‌شود (حالت وب‌هوک)؟"""
+    metric = registry._metrics.get("http_requests_total")
+    return metric is not None and bool(metric.samples())
+
+
+async def load_api_metrics(url: str, token: str = "", timeout: float = 3.0) -> Optional[List[Sample]]:
+    """متریک‌های API: از همین پروسه (حالت وب‌هوک) یا از آدرس /metrics بک‌اند"""
+    if has_local_http_metrics():
+        return registry.samples()
+    if not url:
+        return None
+
+    import httpx
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(url, headers=headers)
+            response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not load API metrics from {url}: {e}")
+        return None
+    return parse_prometheus_text(response.text)
+
+
+# متریک‌های این پروسه
+registry = MetricsRegistry()
+
+PROCESS_START_TIME = registry.gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.")
+PROCESS_START_TIME.set(time.time())
@@ -0,0 +1,193 @@
+import copy
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from database.connection import ReadSessionLocal
+from database.admin_models import AdminSettings
+from config import SETTINGS_VERSION_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ردیف ویژه‌ای که با هر تغییر تنظیمات یک واحد افزایش می‌یابد
+VERSION_KEY = "_settings_version"
+# نسخه کاتالوگ: آیتم‌های فروشگاه، دستاوردها و الزامات جوین (برای ETag در API)
+CATALOG_VERSION_KEY = "_catalog_version"
+
+_MISSING = object()
+
+
+def parse_setting_value(value: Optional[str], setting_type: str) -> Any:
+    """تبدیل مقدار متنی تنظیم به نوع واقعی آن"""
+    if value is None:
+        return None
+    if setting_type == 'int':
+        return int(value)
+    elif setting_type == 'bool':
+        return value.lower() == 'true'
+    elif setting_type == 'json':
+        return json.loads(value)
+    return value
+
+
+def _bump_version(session, key: str, description: str) -> int:
+    row = session.query(AdminSettings).filter(AdminSettings.setting_key == key).first()
+    if row:
+        version = int(row.setting_value or 0) + 1
+        row.setting_value = str(version)
+    else:
+        version = 1
+        session.add(AdminSettings(
+            setting_key=key,
+            setting_value=str(version),
+            setting_type='int',
+            description=description
+        ))
+    return version
+
+
+def bump_settings_version(session) -> int:
+    """افزایش نسخه تنظیمات در همان تراکنش تغییر"""
+    return _bump_version(session, VERSION_KEY, "Settings cache version")
+
+
+def bump_catalog_version(session) -> int:
+    """افزایش نسخه کاتالوگ در همان تراکنش تغییر آیتم، دستاورد یا الزام جوین"""
+    return _bump_version(session, CATALOG_VERSION_KEY, "Catalog cache version")
+
+
+def read_version(session, key: str) -> int:
+    """خواندن یک شمارنده نسخه (۰ اگر هنوز ساخته نشده)"""
+    value = session.query(AdminSettings.setting_value).filter(
+        AdminSettings.setting_key == key
+    ).scalar()
+    return int(value) if value else 0
+
+
+class SettingsStore:
+    """کش حافظه تنظیمات ادمین با مقادیر از پیش تبدیل شده
+
+    همه ردیف‌های AdminSettings یک بار خوانده می‌شوند و خواندن‌ها از حافظه انجام
+    می‌شود. حداکثر هر `check_interval` ثانیه فقط ردیف نسخه بررسی می‌شود تا
+    تغییرات پروسه‌های دیگر هم دریافت شود.
+    """
+
+    def __init__(self, check_interval: float = SETTINGS_VERSION_CHECK_SECONDS):
+        self._values: Dict[str, Any] = {}
+        self._version: Optional[int] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._check_interval = check_interval
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Set[str]], None]] = []
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """دریافت مقدار یک تنظیم از حافظه"""
+        self._ensure_fresh()
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def all(self) -> Dict[str, Any]:
+        """دریافت کپی تمام تنظیمات"""
+        self._ensure_fresh()
+        return copy.deepcopy(self._values)
+
+    def subscribe(self, listener: Callable[[Set[str]], None]):
+        """ثبت تابعی که با مجموعه کلیدهای تغییر کرده صدا زده می‌شود"""
+        self._listeners.append(listener)
+
+    def invalidate(self):
+        """باطل کردن کش؛ خواندن بعدی از دیتابیس بارگذاری می‌کند"""
+        with self._lock:
+            self._loaded = False
+
+    def refresh(self):
+        """بارگذاری فوری تنظیمات از دیتابیس"""
+        with self._lock:
+            self._reload()
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self._check_interval:
+            return
+
+        with self._lock:
+            if not self._loaded:
+                self._reload()
+                return
+            if now - self._checked_at < self._check_interval:
+                return
+            try:
+                version = self._read_version()
+            except Exception as e:
+                logger.error(f"Error checking settings version: {e}")
+                self._checked_at = now
+                return
+            self._checked_at = now
+            if version != self._version:
+                self._reload()
+
+    def _read_version(self) -> int:
+        session = ReadSessionLocal()
+        try:
+            return read_version(session, VERSION_KEY)
+        finally:
+            session.close()
+
+    def _reload(self):
+        session = ReadSessionLocal()
+        try:
+            rows = session.query(
+                AdminSettings.setting_key,
+                AdminSettings.setting_value,
+                AdminSettings.setting_type
+            ).all()
+        finally:
+            session.close()
+
+        values = {}
+        version = 0
+        for key, value, setting_type in rows:
+            if key == VERSION_KEY:
+                version = int(value or 0)
+                continue
+            if key.startswith("_"):
+                continue  # شمارنده‌های داخلی دیگر، مثل نسخه کاتالوگ
+            try:
+                values[key] = parse_setting_value(value, setting_type)
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.error(f"Error parsing admin setting {key}: {e}")
+
+        changed = set()
+        if self._version is not None:
+            for key in set(values) | set(self._values):
+                if values.get(key, _MISSING) != self._values.get(key, _MISSING):
+                    changed.add(key)
+
+        self._values = values
+        self._version = version
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, changed: Set[str]):
+        for listener in list(self._listeners):
+            try:
+                listener(changed)
+            except Exception as e:
+                logger.error(f"Settings listener failed: {e}")
+
+
+# نمونه سراسری
+settings_store = SettingsStore()
@@ -5,6 +5,12 @@ class APIClient {
         // Get base URL from current location or default to localhost
         this.baseURL = window.location.origin;
         this.initData = null;
+        // endpoint -> { etag, data } for responses served with an ETag
+        this.etagCache = new Map();
+        // endpoint -> { data, expires } handed out once, filled by bootstrap()
+        this.prefetched = new Map();
+        // times a POST is retried after a network error
+        this.maxRetries = 2;
     }
 
     // Initialize with Telegram WebApp data
@@ -33,6 +39,17 @@ class APIClient {
 
     // Generic API call
     async call(endpoint, method = 'GET', data = null) {
+        if (method === 'GET') {
+            const prefetched = this.prefetched.get(endpoint);
+            this.prefetched.delete(endpoint);
+            if (prefetched && prefetched.expires > Date.now()) {
+                return prefetched.data;
+            }
+        } else {
+            // Any change may make the bootstrap snapshot stale
+            this.prefetched.clear();
+        }
+
         const options = {
             method,
             headers: this.getHeaders()
@@ -42,21 +59,75 @@ class APIClient {
             options.body = JSON.stringify(data);
         }
 
+        // One key per action, reused by its retries: the server runs it at most once
+        const retries = method === 'POST' ? this.maxRetries : 0;
+        if (method === 'POST') {
+            options.headers['Idempotency-Key'] = this.newIdempotencyKey();
+        }
+
+        // Revalidate cached catalog-style responses; 304 means our copy is current
+        const cached = method === 'GET' ? this.etagCache.get(endpoint) : null;
+        if (cached) {
+            options.headers['If-None-Match'] = cached.etag;
+        }
+
         try {
-            const response = await fetch(`${this.baseURL}${endpoint}`, options);
+            const response = await this.fetchWithRetry(`${this.baseURL}${endpoint}`, options, retries);
+
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
             
             if (!response.ok) {
                 const error = await response.json();
                 throw new Error(error.detail || 'خطای سرور');
             }
 
-            return await response.json();
+            const result = await response.json();
+            const etag = method === 'GET' ? response.headers.get('ETag') : null;
+            if (etag) {
+                this.etagCache.set(endpoint, { etag, data: result });
+            }
+            return result;
         } catch (error) {
             console.error('API Error:', error);
             throw error;
         }
     }
 
+    // Retry network failures and gateway errors; safe for POSTs thanks to the Idempotency-Key
+    async fetchWithRetry(url, options, retries) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, options);
+                if (attempt >= retries || ![502, 503, 504].includes(response.status)) {
+                    return response;
+                }
+            } catch (error) {
+                if (attempt >= retries) throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 300 * 2 ** attempt));
+        }
+    }
+
+    newIdempotencyKey() {
+        if (window.crypto?.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+    }
+
+    // Startup: everything in one request; the first screen loads then need no round trip
+    async bootstrap(leaderboardLimit = 100) {
+        const data = await this.call(`/api/bootstrap?leaderboard_limit=${leaderboardLimit}`);
+        const expires = Date.now() + 60000;
+        this.prefetched.set('/api/shop/inventory', { data: data.inventory, expires });
+        this.prefetched.set(`/api/user/leaderboard?limit=${leaderboardLimit}`, { data: data.leaderboard, expires });
+        this.etagCache.set('/api/shop/items', { etag: data.shop_items_etag, data: data.shop_items });
+        this.prefetched.set('/api/shop/items', { data: data.shop_items, expires });
+        return data;
+    }
+
     // User APIs
     async getUserProfile() {
         return this.call('/api/user/profile');
@@ -66,8 +137,13 @@ class APIClient {
         return this.call(`/api/user/leaderboard?limit=${limit}`);
     }
 
-    async syncUser() {
-        return this.call('/api/user/sync', 'POST');
+    async getJoinRequirements() {
+        return this.call('/api/user/join-requirements');
+    }
+
+    // Changes since stateVersion: { state_version, unchanged } or { state_version, changes, full }
+    async syncUser(stateVersion = null) {
+        return this.call('/api/user/sync', 'POST', { state_version: stateVersion });
     }
 
     // Game APIs
@@ -91,6 +167,10 @@ class APIClient {
         return this.call('/api/game/daily-reward', 'POST');
     }
 
+    async getAchievements() {
+        return this.call('/api/game/achievements');
+    }
+
     // Shop APIs
     async getShopItems() {
         return this.call('/api/shop/items');
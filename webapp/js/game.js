@@ -3,6 +3,7 @@
 class GameManager {
     constructor() {
         this.userData = null;
+        this.quests = [];
         this.clickThrottle = throttle(this.handleClick.bind(this), 100);
         this.isLoading = false;
     }
@@ -10,12 +11,17 @@ class GameManager {
     // Initialize game
     async init() {
         try {
-            // Load user profile
-            this.userData = await api.getUserProfile();
+            // Load profile (and prefetch the other screens) in one request
+            const data = await api.bootstrap();
+            this.userData = data.profile;
+            this.quests = data.quests;
             this.updateUI();
             
             // Setup event listeners
             this.setupEventListeners();
+
+            // Taps and actions go over a WebSocket when it's up; HTTP otherwise
+            this.connectSocket();
             
             // Start auto-sync
             this.startAutoSync();
@@ -26,6 +32,44 @@ class GameManager {
         }
     }
 
+    // Open the game socket; the server pushes every state change back to us
+    connectSocket() {
+        gameSocket.connect(api.initData, {
+            onHello: (state) => {
+                this.userData = state;
+                this.updateUI();
+            },
+            onDelta: (state, events) => {
+                Object.assign(this.userData, state);
+                this.showTapEvents(events);
+                if (events.boost_expired) {
+                    showToast('⏱ بوست به پایان رسید', 'warning');
+                }
+                this.updateUI();
+            },
+            onError: (message) => {
+                showToast(message, 'error');
+            }
+        });
+    }
+
+    // Feedback for a batch of taps confirmed by the server
+    showTapEvents(events) {
+        if (!events.taps) return;
+
+        showCoinPopup(document.getElementById('click-btn'), events.coins_earned);
+
+        if (events.level_up) {
+            hapticFeedback('heavy');
+            showToast(`🎉 تبریک! شما به سطح ${events.level_up} رسیدید!`, 'success');
+        }
+
+        if (events.diamonds_found) {
+            hapticFeedback('medium');
+            showToast('💎 شما یک الماس پیدا کردید!', 'success');
+        }
+    }
+
     // Update UI with user data
     updateUI() {
         if (!this.userData) return;
@@ -62,7 +106,11 @@ class GameManager {
     setupEventListeners() {
         // Click button
         document.getElementById('click-btn').addEventListener('click', () => {
-            this.clickThrottle();
+            if (gameSocket.isOpen()) {
+                this.handleSocketTap();
+            } else {
+                this.clickThrottle();
+            }
         });
 
         // Mining claim
@@ -86,6 +134,21 @@ class GameManager {
         });
     }
 
+    // Tap over the socket: batched, the result arrives as a delta
+    handleSocketTap() {
+        if (this.userData.energy <= 0) {
+            showToast('انرژی شما تمام شده است!', 'warning');
+            return;
+        }
+
+        hapticFeedback('light');
+        gameSocket.tap();
+
+        // The server's delta replaces this guess
+        this.userData.energy -= 1;
+        this.updateUI();
+    }
+
     // Handle click action
     async handleClick() {
         if (this.isLoading) return;
@@ -136,12 +199,17 @@ class GameManager {
         this.isLoading = true;
 
         try {
-            const result = await api.claimMining();
+            let result;
+            if (gameSocket.isOpen()) {
+                result = (await gameSocket.request('mine')).ev;
+            } else {
+                result = await api.claimMining();
 
-            // Update local data
-            this.userData.coins = result.new_coins;
-            this.userData.diamonds = result.new_diamonds;
-            this.userData.electricity = result.new_electricity;
+                // Update local data
+                this.userData.coins = result.new_coins;
+                this.userData.diamonds = result.new_diamonds;
+                this.userData.electricity = result.new_electricity;
+            }
 
             hapticFeedback('medium');
             showToast(
@@ -165,7 +233,10 @@ class GameManager {
         this.isLoading = true;
 
         try {
-            const result = await api.claimDailyReward();
+            const viaSocket = gameSocket.isOpen();
+            const result = viaSocket
+                ? (await gameSocket.request('daily')).ev.daily_reward
+                : await api.claimDailyReward();
 
             hapticFeedback('heavy');
             showToast(
@@ -173,8 +244,10 @@ class GameManager {
                 'success'
             );
 
-            // Refresh profile
-            this.userData = await api.getUserProfile();
+            // Refresh profile (the socket has already pushed the new balances)
+            if (!viaSocket) {
+                this.userData = await api.getUserProfile();
+            }
             this.updateUI();
 
         } catch (error) {
@@ -191,10 +264,14 @@ class GameManager {
         this.isLoading = true;
 
         try {
-            const result = await api.refillEnergy();
+            if (gameSocket.isOpen()) {
+                await gameSocket.request('refill');
+            } else {
+                const result = await api.refillEnergy();
 
-            this.userData.energy = result.new_energy;
-            this.userData.diamonds = result.new_diamonds;
+                this.userData.energy = result.new_energy;
+                this.userData.diamonds = result.new_diamonds;
+            }
 
             hapticFeedback('medium');
             showToast('⚡️ انرژی شارژ شد!', 'success');
@@ -215,9 +292,13 @@ class GameManager {
         this.isLoading = true;
 
         try {
-            const result = await api.activateBoost();
+            if (gameSocket.isOpen()) {
+                await gameSocket.request('boost');
+            } else {
+                const result = await api.activateBoost();
 
-            this.userData.diamonds = result.new_diamonds;
+                this.userData.diamonds = result.new_diamonds;
+            }
 
             hapticFeedback('heavy');
             showToast('🚀 بوست ۲x فعال شد!', 'success');
@@ -232,22 +313,32 @@ class GameManager {
         }
     }
 
-    // Auto-sync user data periodically
+    // Auto-sync user data periodically, only while the page is visible
     startAutoSync() {
-        setInterval(async () => {
-            try {
-                const syncData = await api.syncUser();
-                
-                // Update local data
-                if (syncData.energy !== undefined) {
-                    this.userData.energy = syncData.energy;
-                    this.userData.electricity = syncData.electricity;
-                    this.updateUI();
-                }
-            } catch (error) {
-                console.error('Auto-sync error:', error);
-            }
+        setInterval(() => {
+            if (!document.hidden) this.syncState();
         }, 30000); // Every 30 seconds
+
+        // Catch up as soon as the player comes back
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) this.syncState();
+        });
+    }
+
+    async syncState() {
+        // The socket pushes every change; polling is only the fallback
+        if (gameSocket.isOpen() || !this.userData) return;
+
+        try {
+            const syncData = await api.syncUser(this.userData.state_version);
+            this.userData.state_version = syncData.state_version;
+            if (!syncData.unchanged) {
+                Object.assign(this.userData, syncData.changes);
+                this.updateUI();
+            }
+        } catch (error) {
+            console.error('Auto-sync error:', error);
+        }
     }
 }
 
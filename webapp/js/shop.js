@@ -72,7 +72,9 @@ class ShopManager {
     // Load inventory
     async loadInventory() {
         try {
-            this.inventoryItems = await api.getInventory();
+            // Rows carry item_id; each owned item is sent once in `items`
+            const { items, inventory } = await api.getInventory();
+            this.inventoryItems = inventory.map(invItem => ({ ...invItem, item: items[invItem.item_id] }));
             this.renderInventory();
         } catch (error) {
             console.error('Failed to load inventory:', error);
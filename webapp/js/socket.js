@@ -0,0 +1,120 @@
+// Persistent game connection: batched taps and actions, state pushed back as deltas
+
+class GameSocket {
+    constructor() {
+        this.ws = null;
+        this.initData = null;
+        this.handlers = {};
+        this.pendingTaps = 0;
+        this.flushTimer = null;
+        this.flushDelay = 80;   // ms of taps sent as one message
+        this.maxTaps = 50;      // server caps a message at WS_MAX_TAPS_PER_MESSAGE
+        this.nextId = 1;
+        this.requests = new Map();  // id -> { resolve, reject }
+        this.retryDelay = 1000;
+        this.closed = false;
+    }
+
+    // handlers: { onHello(state), onDelta(state, events), onError(message) }
+    connect(initData, handlers = {}) {
+        this.initData = initData;
+        this.handlers = handlers;
+        this.closed = false;
+        this.open();
+    }
+
+    open() {
+        if (!this.initData || !('WebSocket' in window)) return;
+
+        const url = `${api.baseURL.replace(/^http/, 'ws')}/api/game/ws`;
+        const ws = new WebSocket(url);
+        this.ws = ws;
+
+        ws.onopen = () => {
+            ws.send(JSON.stringify({ t: 'auth', d: this.initData }));
+        };
+
+        ws.onmessage = (event) => {
+            this.retryDelay = 1000;
+            this.dispatch(JSON.parse(event.data));
+        };
+
+        ws.onclose = (event) => {
+            if (this.ws === ws) this.ws = null;
+            this.pendingTaps = 0;
+            this.failPending('اتصال قطع شد');
+            // 4401: bad initData, retrying won't help; the HTTP API is still used
+            if (this.closed || event.code === 4401) return;
+            setTimeout(() => this.open(), this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+        };
+    }
+
+    close() {
+        this.closed = true;
+        if (this.ws) this.ws.close();
+    }
+
+    isOpen() {
+        return this.ws !== null && this.ws.readyState === WebSocket.OPEN;
+    }
+
+    dispatch(message) {
+        const request = message.id !== undefined ? this.requests.get(message.id) : null;
+        if (request) this.requests.delete(message.id);
+
+        if (message.t === 'hello') {
+            this.handlers.onHello?.(message.s);
+        } else if (message.t === 'delta') {
+            this.handlers.onDelta?.(message.s, message.ev || {});
+            request?.resolve(message);
+        } else if (message.t === 'err') {
+            if (request) {
+                request.reject(new Error(message.m));
+            } else {
+                this.handlers.onError?.(message.m);
+            }
+        }
+    }
+
+    // Count a tap; taps are sent together every flushDelay ms
+    tap() {
+        this.pendingTaps++;
+        if (this.pendingTaps >= this.maxTaps) {
+            this.flush();
+        } else if (!this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.flush(), this.flushDelay);
+        }
+    }
+
+    flush() {
+        clearTimeout(this.flushTimer);
+        this.flushTimer = null;
+        if (!this.pendingTaps || !this.isOpen()) return;
+        this.ws.send(JSON.stringify({ t: 'tap', n: this.pendingTaps }));
+        this.pendingTaps = 0;
+    }
+
+    // Send an action (mine, refill, boost, daily); resolves with its delta
+    request(type) {
+        if (!this.isOpen()) {
+            return Promise.reject(new Error('اتصال برقرار نیست'));
+        }
+        this.flush();
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            this.requests.set(id, { resolve, reject });
+            this.ws.send(JSON.stringify({ t: type, id }));
+        });
+    }
+
+    failPending(message) {
+        for (const request of this.requests.values()) {
+            request.reject(new Error(message));
+        }
+        this.requests.clear();
+    }
+}
+
+// Create global game socket instance
+const gameSocket = new GameSocket();